@@ -8,6 +8,8 @@ from .drivers import router as drivers_router
 from .executive_api import router as executive_router
 from .auth_api import router as auth_router
 from .energy import router as energy_router
+from .refresh_api import router as refresh_router
+from .export_api import router as export_router
 
 router = APIRouter()
 router.include_router(core_router)
@@ -18,3 +20,5 @@ router.include_router(drivers_router)
 router.include_router(executive_router)
 router.include_router(auth_router)
 router.include_router(energy_router)
+router.include_router(refresh_router)
+router.include_router(export_router)
@@ -1,18 +1,26 @@
 from fastapi import APIRouter
 from datetime import datetime, timedelta
 from typing import List, Dict, Any
-from collections import defaultdict
+import os
 
-from app.services.station_stats import STATION_COLLECTIONS
+from app.database.database import aggregate_sessions
+from app.services import station_registry
+from app.services.first_seen import cohort_retention, count_new_users
 
 router = APIRouter()
 
+# Zona horaria para hora del día / día de la semana (nombre IANA u offset "+HH:MM")
+STATS_TIMEZONE = os.getenv("STATS_TIMEZONE", "UTC")
 
-def _collections_for(station: str):
-    if station.lower() in ("all", "todas"):
-        return [STATION_COLLECTIONS["Portobelo"], STATION_COLLECTIONS["Salvio"]]
-    col = STATION_COLLECTIONS.get(station)
-    return [col] if col is not None else []
+# session_start_at es ISO string; inválidos/ausentes → null (no suman al histograma)
+_START_DATE = {"$dateFromString": {"dateString": "$session_start_at", "onError": None, "onNull": None}}
+_HOUR = {"$hour": {"date": "$d", "timezone": STATS_TIMEZONE}}
+_ISO_DOW = {"$isoDayOfWeek": {"date": "$d", "timezone": STATS_TIMEZONE}}  # 1=lunes … 7=domingo
+
+
+def _scope_for(station: str):
+    """Filtro de sesiones de la estación (o de todas); None si no está registrada."""
+    return station_registry.session_match(station)
 
 
 def _range_for(filter: str):
@@ -30,200 +38,162 @@ def _range_for(filter: str):
 
 @router.get("/drivers/ranking", tags=["drivers"])  # /api/stats/drivers/ranking
 def drivers_ranking(station: str = "all", filter: str = "total", limit: int = 10):
-    cols = _collections_for(station)
-    if not cols:
+    scope = _scope_for(station)
+    if scope is None or limit <= 0:
         return {"items": []}
 
     start, end = _range_for(filter)
-    query: Dict[str, Any] = {}
+    match: Dict[str, Any] = dict(scope)
     if start and end:
-        query = {"session_start_at": {"$gte": start.isoformat(), "$lt": end.isoformat()}}
-
-    agg = []
-    for c in cols:
-        agg.extend(list(c.aggregate([
-            {"$match": query},
-            {"$group": {
-                "_id": "$user_code",
-                "user_name": {"$first": "$user_name"},
-                "total_cargas": {"$sum": 1},
-                "total_energy_Wh": {"$sum": {"$toInt": "$energy_Wh"}},
-                "total_ingresos": {"$sum": {"$toDouble": {"$ifNull": ["$amount", 0]}}}
-            }}
-        ])))
-
-    merged: Dict[str, Dict[str, Any]] = {}
-    for u in agg:
-        key = u.get("_id")
-        if not key:
-            continue
-        m = merged.setdefault(key, {
-            "user_code": key,
+        match["session_start_at"] = {"$gte": start.isoformat(), "$lt": end.isoformat()}
+
+    items = []
+    for u in aggregate_sessions(match, [
+        {"$match": {"user_code": {"$nin": [None, ""]}}},
+        {"$group": {
+            "_id": "$user_code",
+            "user_name": {"$first": "$user_name"},
+            "total_cargas": {"$sum": 1},
+            "total_energy_Wh": {"$sum": {"$toInt": "$energy_Wh"}},
+            "total_ingresos": {"$sum": {"$toDouble": {"$ifNull": ["$amount", 0]}}}
+        }},
+        {"$sort": {"total_cargas": -1, "_id": 1}},
+        {"$limit": int(limit)},
+    ]):
+        items.append({
+            "user_code": u["_id"],
             "user_name": u.get("user_name"),
-            "total_cargas": 0,
-            "total_energy_Wh": 0,
-            "total_ingresos": 0.0,
+            "total_cargas": u.get("total_cargas", 0),
+            "total_energy_Wh": u.get("total_energy_Wh", 0),
+            "total_ingresos": float(u.get("total_ingresos", 0.0)),
         })
-        m["total_cargas"] += u.get("total_cargas", 0)
-        m["total_energy_Wh"] += u.get("total_energy_Wh", 0)
-        m["total_ingresos"] += float(u.get("total_ingresos", 0.0))
-
-    items = sorted(merged.values(), key=lambda x: x.get("total_cargas", 0), reverse=True)[:limit]
     return {"items": items}
 
 
 @router.get("/drivers/habits", tags=["drivers"])  # legacy (no usado en UI)
 def drivers_habits(station: str = "all", filter: str = "total", top: int = 5):
-    cols = _collections_for(station)
-    if not cols:
+    scope = _scope_for(station)
+    if scope is None or top <= 0:
         return {"items": []}
 
     start, end = _range_for(filter)
-    match: Dict[str, Any] = {}
+    match: Dict[str, Any] = dict(scope)
     if start and end:
-        match = {"session_start_at": {"$gte": start.isoformat(), "$lt": end.isoformat()}}
-
-    totals: Dict[str, Dict[str, Any]] = {}
-    for c in cols:
-        for u in c.aggregate([
-            {"$match": match},
-            {"$group": {"_id": "$user_code", "user_name": {"$first": "$user_name"}, "total": {"$sum": 1}}}
-        ]):
-            uid = u.get("_id");
-            if not uid: continue
-            m = totals.setdefault(uid, {"user_name": u.get("user_name"), "total": 0})
-            m["total"] += u.get("total", 0)
-
-    top_users = sorted(totals.items(), key=lambda kv: kv[1]["total"], reverse=True)[:top]
-    top_set = {uid for uid, _ in top_users}
-
-    hist_map: Dict[str, List[int]] = {uid: [0]*24 for uid in top_set}
-    name_map: Dict[str, str] = {uid: meta["user_name"] for uid, meta in top_users}
-
-    for c in cols:
-        for s in c.find(match, {"user_code": 1, "user_name": 1, "session_start_at": 1}):
-            uid = s.get("user_code")
-            if uid not in top_set: continue
-            try:
-                dt = datetime.fromisoformat(s.get("session_start_at").replace("Z","+00:00"))
-                hist_map[uid][dt.hour] += 1
-                if not name_map.get(uid) and s.get("user_name"):
-                    name_map[uid] = s.get("user_name")
-            except Exception:
-                continue
-
-    items = [{"user_code": uid, "user_name": name_map.get(uid), "histogram": hist_map[uid]} for uid in top_set]
-    items.sort(key=lambda it: totals[it["user_code"]]["total"], reverse=True)
+        match["session_start_at"] = {"$gte": start.isoformat(), "$lt": end.isoformat()}
+
+    # Una sola pasada: (usuario, hora) → usuario con su histograma; top-N en el servidor
+    rows = aggregate_sessions(match, [
+        {"$match": {"user_code": {"$nin": [None, ""]}}},
+        {"$project": {"user_code": 1, "user_name": 1, "d": _START_DATE}},
+        {"$group": {
+            "_id": {"u": "$user_code", "h": {"$cond": [{"$eq": ["$d", None]}, None, _HOUR]}},
+            "n": {"$sum": 1},
+            "user_name": {"$max": "$user_name"},
+        }},
+        {"$group": {
+            "_id": "$_id.u",
+            "total": {"$sum": "$n"},
+            "user_name": {"$max": "$user_name"},
+            "hours": {"$push": {"h": "$_id.h", "n": "$n"}},
+        }},
+        {"$sort": {"total": -1, "_id": 1}},
+        {"$limit": int(top)},
+    ])
+
+    items = []
+    for r in rows:
+        hist = [0]*24
+        for b in r.get("hours", []):
+            if b.get("h") is not None:
+                hist[int(b["h"])] += b.get("n", 0)
+        items.append({"user_code": r["_id"], "user_name": r.get("user_name"), "histogram": hist})
     return {"items": items}
 
 
+def _scope_station(station: str):
+    return None if station_registry.is_all(station) else station
+
+
 @router.get("/drivers/loyalty", tags=["drivers"])  # /api/stats/drivers/loyalty
 def drivers_loyalty(station: str = "all", filter: str = "mes"):
-    cols = _collections_for(station)
-    if not cols:
+    match_scope = _scope_for(station)
+    if match_scope is None:
         return {"nuevos": 0, "recurrentes": 0}
 
+    fs_scope = _scope_station(station)  # alcance de user_first_seen (None = todas)
     start, end = _range_for(filter)
     if not start or not end:
-        users = set()
-        for c in cols:
-            users.update({s.get("user_code") for s in c.find({}, {"user_code": 1}) if s.get("user_code")})
-        return {"nuevos": len(users), "recurrentes": 0}
-
-    first_seen: Dict[str, datetime] = {}
-    for c in cols:
-        for s in c.aggregate([
-            {"$addFields": {"dt": {"$dateFromString": {"dateString": "$session_start_at"}}}},
-            {"$group": {"_id": "$user_code", "first": {"$min": "$dt"}}}
-        ]):
-            uid = s.get("_id"); f = s.get("first")
-            if uid and isinstance(f, datetime):
-                if uid not in first_seen or f < first_seen[uid]:
-                    first_seen[uid] = f
-
-    match = {"session_start_at": {"$gte": start.isoformat(), "$lt": end.isoformat()}}
-    active = set()
-    for c in cols:
-        active.update({s.get("user_code") for s in c.find(match, {"user_code": 1}) if s.get("user_code")})
-
-    nuevos = sum(1 for uid in active if first_seen.get(uid) and first_seen[uid] >= start)
-    recurrentes = max(0, len(active) - nuevos)
+        return {"nuevos": count_new_users(fs_scope, None, None), "recurrentes": 0}
+
+    # nuevos: primera carga (en el alcance) dentro del rango → consulta indexada en user_first_seen
+    nuevos = count_new_users(fs_scope, start, end)
+    match = {**match_scope, "session_start_at": {"$gte": start.isoformat(), "$lt": end.isoformat()}}
+    active = 0
+    for r in aggregate_sessions(match, [
+        {"$group": {"_id": "$user_code"}},
+        {"$match": {"_id": {"$nin": [None, ""]}}},
+        {"$count": "n"},
+    ]):
+        active = r["n"]
+    recurrentes = max(0, active - nuevos)
     return {"nuevos": nuevos, "recurrentes": recurrentes}
 
 
+@router.get("/drivers/cohorts", tags=["drivers"])  # /api/stats/drivers/cohorts
+def drivers_cohorts(station: str = "all", months: int = 12):
+    """
+    Retención por cohortes mensuales (mes de primera carga × meses transcurridos).
+    - active[k]: usuarios de la cohorte que cargaron k meses después del alta
+    """
+    if _scope_for(station) is None:
+        return {"cohorts": []}
+    months = max(1, min(int(months), 60))
+    return {"months": months, "cohorts": cohort_retention(_scope_station(station), months)}
+
+
 @router.get("/drivers/alerts", tags=["drivers"])  # legacy (no usado en UI)
 def drivers_alerts(station: str = "all", filter: str = "mes", threshold: float = 2.5):
-    cols = _collections_for(station)
-    if not cols:
+    """
+    Usuarios con sesiones de energía anómala: |z| > threshold respecto a su
+    media/desviación histórica (``energy_z_abs``, calculado al sincronizar).
+    """
+    scope = _scope_for(station)
+    if scope is None:
         return {"items": []}
 
     start, end = _range_for(filter)
-    match: Dict[str, Any] = {}
+    match: Dict[str, Any] = {**scope, "energy_z_abs": {"$gt": float(threshold)}}
     if start and end:
-        match = {"session_start_at": {"$gte": start.isoformat(), "$lt": end.isoformat()}}
-
-    per_user: Dict[str, List[int]] = defaultdict(list)
-    name_map: Dict[str, str] = {}
-    for c in cols:
-        for s in c.find(match, {"user_code":1, "user_name":1, "energy_Wh":1}):
-            uid = s.get("user_code")
-            if not uid: continue
-            try:
-                val = int(s.get("energy_Wh") or 0)
-            except Exception:
-                continue
-            per_user[uid].append(val)
-            if s.get("user_name"):
-                name_map[uid] = s.get("user_name")
-
-    def z_anomalies(vals: List[int]):
-        if not vals: return 0
-        n = len(vals); mean = sum(vals)/n
-        var = sum((x-mean)**2 for x in vals)/n if n>0 else 0
-        std = var ** 0.5
-        if std == 0: return 0
-        return sum(1 for x in vals if abs((x-mean)/std) > float(threshold))
+        match["session_start_at"] = {"$gte": start.isoformat(), "$lt": end.isoformat()}
 
     items = []
-    for uid, vals in per_user.items():
-        count = z_anomalies(vals)
-        if count > 0:
-            items.append({"user_code": uid, "user_name": name_map.get(uid), "anomaly_sessions": count})
-
-    items.sort(key=lambda x: x["anomaly_sessions"], reverse=True)
+    for u in aggregate_sessions(match, [
+        {"$match": {"user_code": {"$nin": [None, ""]}}},
+        {"$group": {"_id": "$user_code", "user_name": {"$max": "$user_name"}, "anomaly_sessions": {"$sum": 1}}},
+        {"$sort": {"anomaly_sessions": -1, "_id": 1}},
+    ]):
+        items.append({"user_code": u["_id"], "user_name": u.get("user_name"), "anomaly_sessions": u["anomaly_sessions"]})
     return {"items": items}
 
 
 @router.get("/drivers/summary", tags=["drivers"])  # /api/stats/drivers/summary
 def drivers_summary(station: str = "all", filter: str = "total"):
-    cols = _collections_for(station)
-    if not cols:
+    scope = _scope_for(station)
+    if scope is None:
         return {"total_drivers": 0, "total_charges": 0, "avg_charges_per_driver": 0.0}
 
     start, end = _range_for(filter)
-    match: Dict[str, Any] = {}
+    match: Dict[str, Any] = dict(scope)
     if start and end:
-        match = {"session_start_at": {"$gte": start.isoformat(), "$lt": end.isoformat()}}
-
-    merged: Dict[str, Dict[str, Any]] = {}
-    total_charges = 0
-    for c in cols:
-        for u in c.aggregate([
-            {"$match": match},
-            {"$group": {
-                "_id": "$user_code",
-                "user_name": {"$first": "$user_name"},
-                "total_cargas": {"$sum": 1},
-                "total_energy_Wh": {"$sum": {"$toInt": "$energy_Wh"}}
-            }}
-        ]):
-            uid = u.get("_id");
-            if not uid: continue
-            m = merged.setdefault(uid, {"user_name": u.get("user_name"), "total_cargas": 0})
-            m["total_cargas"] += u.get("total_cargas", 0)
-            total_charges += u.get("total_cargas", 0)
-
-    total_drivers = len(merged)
+        match["session_start_at"] = {"$gte": start.isoformat(), "$lt": end.isoformat()}
+
+    total_drivers = total_charges = 0
+    for r in aggregate_sessions(match, [
+        {"$match": {"user_code": {"$nin": [None, ""]}}},
+        {"$group": {"_id": "$user_code", "n": {"$sum": 1}}},
+        {"$group": {"_id": None, "drivers": {"$sum": 1}, "charges": {"$sum": "$n"}}},
+    ]):
+        total_drivers, total_charges = r["drivers"], r["charges"]
     avg = (total_charges / total_drivers) if total_drivers else 0.0
 
     return {
@@ -233,24 +203,51 @@ def drivers_summary(station: str = "all", filter: str = "total"):
     }
 
 
+def _hour_buckets(match: Dict[str, Any], by_weekday: bool):
+    key: Dict[str, Any] = {"h": _HOUR}
+    if by_weekday:
+        key["dow"] = _ISO_DOW
+    return aggregate_sessions(match, [
+        {"$project": {"d": _START_DATE}},
+        {"$match": {"d": {"$ne": None}}},
+        {"$group": {"_id": key, "n": {"$sum": 1}}},
+    ])
+
+
 @router.get("/habits/general", tags=["drivers"])  # /api/stats/habits/general
 def habits_general(station: str = "all", filter: str = "total"):
-    cols = _collections_for(station)
-    if not cols:
+    scope = _scope_for(station)
+    if scope is None:
         return {"histogram": [0]*24}
 
     start, end = _range_for(filter)
-    match: Dict[str, Any] = {}
+    match: Dict[str, Any] = dict(scope)
     if start and end:
-        match = {"session_start_at": {"$gte": start.isoformat(), "$lt": end.isoformat()}}
+        match["session_start_at"] = {"$gte": start.isoformat(), "$lt": end.isoformat()}
 
     hist = [0]*24
-    for c in cols:
-        for s in c.find(match, {"session_start_at": 1}):
-            try:
-                dt = datetime.fromisoformat(s.get("session_start_at").replace("Z","+00:00"))
-                hist[dt.hour] += 1
-            except Exception:
-                continue
+    for b in _hour_buckets(match, by_weekday=False):
+        hist[int(b["_id"]["h"])] += b["n"]
     return {"histogram": hist}
 
+
+@router.get("/habits/heatmap", tags=["drivers"])  # /api/stats/habits/heatmap
+def habits_heatmap(station: str = "all", filter: str = "total"):
+    """
+    Cargas por día de la semana × hora del día (zona STATS_TIMEZONE).
+    - matrix[0] = lunes … matrix[6] = domingo; cada fila tiene 24 horas.
+    """
+    days = ["lunes", "martes", "miércoles", "jueves", "viernes", "sábado", "domingo"]
+    scope = _scope_for(station)
+    matrix = [[0]*24 for _ in range(7)]
+    if scope is None:
+        return {"days": days, "matrix": matrix, "timezone": STATS_TIMEZONE}
+
+    start, end = _range_for(filter)
+    match: Dict[str, Any] = dict(scope)
+    if start and end:
+        match["session_start_at"] = {"$gte": start.isoformat(), "$lt": end.isoformat()}
+
+    for b in _hour_buckets(match, by_weekday=True):
+        matrix[int(b["_id"]["dow"]) - 1][int(b["_id"]["h"])] += b["n"]
+    return {"days": days, "matrix": matrix, "timezone": STATS_TIMEZONE}
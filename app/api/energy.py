@@ -1,7 +1,12 @@
+from typing import Literal
+
 from fastapi import APIRouter
 
+from app.responses import FastJSONResponse
+
 from app.services.sustainability import (
     get_energy_series,
+    get_energy_summaries,
     get_energy_summary,
 )
 
@@ -9,14 +14,20 @@ router = APIRouter()
 
 
 @router.get("/energy/series", tags=["energy"])  # /api/stats/energy/series
-def energy_series(station: str = "all", filter: str = "total", period: str | None = None):
+def energy_series(
+    station: str = "all",
+    filter: str = "total",
+    period: str | None = None,
+    format: Literal["rows", "columnar"] = "rows",
+):
     """
-    Serie temporal de energía consumida por periodo.
+    Serie temporal de energía consumida por periodo (buckets vacíos incluidos, con 0).
     - station: nombre de estación o 'all'
     - filter: total | mes | diario
     - period: mes | dia | hora (opcional; si no, se infiere del filtro)
+    - format: rows (lista de objetos) | columnar (``timestamps[]`` + ``values[]``)
     """
-    return get_energy_series(station=station, filter=filter, period=period)
+    return FastJSONResponse(get_energy_series(station=station, filter=filter, period=period, format=format))
 
 
 @router.get("/energy/summary", tags=["energy"])  # /api/stats/energy/summary
@@ -26,3 +37,12 @@ def energy_summary(station: str = "all", filter: str = "total"):
     """
     return get_energy_summary(station=station, filter=filter)
 
+
+
+@router.get("/energy/summary/all", tags=["energy"])  # /api/stats/energy/summary/all
+def energy_summary_all():
+    """
+    Resúmenes de energía/CO2 de todas las estaciones ('all' incluida) × filtros (total, mes, diario).
+    - ``generation`` cambia cuando se recalculan los rollups.
+    """
+    return FastJSONResponse(get_energy_summaries())
@@ -1,4 +1,5 @@
 from fastapi import APIRouter
+from app.responses import FastJSONResponse
 from typing import Optional
 
 from app.services.executive import (
@@ -20,7 +21,7 @@ def executive_summary(
         doc = latest_executive_summary(st)
         if doc:
             doc.pop("_id", None)
-            return doc
+            return FastJSONResponse(doc)
         # fallback a cálculo en vivo si no hay materializado
     return compute_executive_summary(station=st, month=month)
 
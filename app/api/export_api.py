@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+from typing import Literal, Optional
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+
+from app.services import station_registry
+from app.services.export import FORMATS, STREAMERS, parquet_available, parse_fields
+from app.services.station_stats import _date_filter
+
+router = APIRouter()
+
+
+def _parse_day(value: str, name: str) -> datetime:
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} debe ser una fecha ISO (YYYY-MM-DD[THH:MM:SS])")
+
+
+@router.get("/export/sessions", tags=["export"])  # /api/stats/export/sessions
+def export_sessions(
+    station: str = "all",
+    format: Literal["csv", "ndjson", "parquet"] = "csv",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    filter: str = "total",
+    fields: Optional[str] = None,
+):
+    """
+    Descarga de sesiones en streaming directo desde el cursor de Mongo.
+    - station: nombre de estación o 'all'
+    - start/end: rango [start, end) de session_start_at (fecha ISO); si no, se usa `filter`
+    - filter: total | mes | diario (cuando no hay start/end)
+    - fields: columnas separadas por coma (por defecto todas)
+    - format: csv | ndjson | parquet (este último requiere pyarrow)
+    """
+    scope = station_registry.session_match(station)
+    if scope is None:
+        raise HTTPException(status_code=404, detail=f"Estación {station} no registrada")
+    try:
+        cols = parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if format == "parquet" and not parquet_available():
+        raise HTTPException(status_code=501, detail="Exportación Parquet no disponible: instale pyarrow")
+
+    match = dict(scope)
+    if start or end:
+        lo = _parse_day(start, "start") if start else datetime.min
+        hi = _parse_day(end, "end") if end else datetime.utcnow() + timedelta(days=1)
+        match["session_start_at"] = {"$gte": lo.isoformat(), "$lt": hi.isoformat()}
+    else:
+        match.update(_date_filter(filter))
+
+    media_type, ext = FORMATS[format]
+    name = f"sessions_{station}_{datetime.utcnow():%Y%m%d%H%M%S}.{ext}"
+    return StreamingResponse(
+        STREAMERS[format](match, cols),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{name}"'},
+    )
@@ -1,6 +1,9 @@
 from fastapi import APIRouter
+from app.responses import FastJSONResponse
 from app.stats_flow.classifier import classify_single_vehicle
-from app.database.database import get_last_station_stats
+from app.database.database import iter_user_totals, user_classification
+from app.services import station_registry
+from app.services.station_stats import _date_filter
 
 router = APIRouter()
 
@@ -9,19 +12,26 @@ router = APIRouter()
 def unclassified_models(station: str = "all", filter: str = "total"):
     """Lista de (brand, model) sin clasificar como EV/PHEV en el período seleccionado."""
 
-    def _details_for(st: str):
-        doc = get_last_station_stats(st, filter) or get_last_station_stats(st)
-        return (doc or {}).get("details", [])
-
-    if station and station.lower() not in ("all", "todas"):
-        details = _details_for(station)
-    else:
-        details = _details_for("Portobelo") + _details_for("Salvio")
+    query: dict = {"category": {"$nin": ["EV", "PHEV"]}}
+    scope = station_registry.session_match(station)
+    if scope is None:
+        return {"items": []}
+    if not station_registry.is_all(station):
+        query["stations"] = station
+
+    date_q = _date_filter(filter)
+    if date_q:
+        # solo usuarios con cargas en el período
+        active = [row["_id"] for row in iter_user_totals({**scope, **date_q}) if row["_id"]]
+        if not active:
+            return {"items": []}
+        query["user_code"] = {"$in": active}
 
     counter: dict[tuple[str, str], int] = {}
-    for d in details:
+    for d in user_classification.find(query, {"_id": 0, "brand": 1, "model": 1}):
         brand = d.get("brand") or ""
         model = d.get("model") or ""
+        # se reclasifica: el catálogo pudo actualizarse desde el último pipeline
         cat = classify_single_vehicle(brand, model)
         if cat != "unclassified":
             continue
@@ -33,5 +43,4 @@ def unclassified_models(station: str = "all", filter: str = "total"):
         for (b, m), c in counter.items()
     ]
     items.sort(key=lambda x: (-x["count"], x["brand"], x["model"]))
-    return {"items": items}
-
+    return FastJSONResponse({"items": items})
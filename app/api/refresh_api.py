@@ -0,0 +1,16 @@
+from fastapi import APIRouter
+
+from app.services.refresh import refresh_orchestrator
+from app.services.leader import refresh_leader
+
+router = APIRouter()
+
+
+@router.get("/refresh/status", tags=["refresh"])  # /api/stats/refresh/status
+def refresh_status():
+    """
+    Estado del refresco periódico: si está en curso, si hay uno pendiente
+    y duración/resultado por etapa de la ejecución actual y la última.
+    Solo la instancia líder (``leader``) ejecuta los refrescos.
+    """
+    return {**refresh_orchestrator.status(), "leader": refresh_leader.status()}
@@ -1,10 +1,27 @@
 from fastapi import APIRouter
-from app.database.database import get_last_station_stats
+from app.responses import FastJSONResponse
+from app.database.database import get_user_classifications
+from app.services import station_registry
 from app.services.station_stats import get_station_summary, get_user_summary
 
 router = APIRouter()
 
 
+@router.get("/stations", tags=["stats"])  # /api/stats/stations
+def list_stations():
+    """Estaciones del registro (nombre, cargadores, conectores)."""
+    return {
+        "stations": [
+            {
+                "name": d["_id"],
+                "chargers": d.get("chargers", []),
+                "connectors": d.get("connectors", 0),
+            }
+            for d in station_registry.all_stations()
+        ]
+    }
+
+
 @router.get("/stations/{station}/summary", tags=["stats"])  # /api/stats/stations/{station}/summary
 def station_summary(station: str, filter: str = "total"):
     return get_station_summary(station, filter)
@@ -13,9 +30,7 @@ def station_summary(station: str, filter: str = "total"):
 @router.get("/stations/{station}/users", tags=["stats"])  # /api/stats/stations/{station}/users
 def station_users(station: str, filter: str = "total"):
     usuarios = get_user_summary(station, filter)
-    last = get_last_station_stats(station) or {}
-    details = last.get("details", [])
-    by_code = {d.get("user_code"): d for d in details}
+    by_code = get_user_classifications(u.get("_id") for u in usuarios)
 
     for u in usuarios:
         u["user_code"] = u.get("_id")
@@ -26,5 +41,5 @@ def station_users(station: str, filter: str = "total"):
             u["brand"] = info.get("brand")
             u["model"] = info.get("model")
             u["category"] = info.get("category")
-    return {"usuarios": usuarios}
+    return FastJSONResponse({"usuarios": usuarios})
 
@@ -18,30 +18,8 @@ async def generate_stats():
 
 @router.get("/last", tags=["stats"])  # /api/stats/last
 def get_last_stats(station: str | None = None, filter: str = "total"):
-    """Estadísticas para tarjetas del frontend (global y por estación)."""
+    """Estadísticas para tarjetas del frontend (global y por estación; 'all' = todas las del registro)."""
     if station:
-        if station.lower() in ("all", "todas"):
-            sum_porto = get_station_summary("Portobelo", filter)
-            sum_salvio = get_station_summary("Salvio", filter)
-            counts_porto = get_station_vehicle_counts("Portobelo", filter)
-            counts_salvio = get_station_vehicle_counts("Salvio", filter)
-
-            total_cargas = sum_porto.get("total_cargas", 0) + sum_salvio.get("total_cargas", 0)
-            total_usuarios = sum_porto.get("total_usuarios", 0) + sum_salvio.get("total_usuarios", 0)
-            total_energy_Wh = sum_porto.get("total_energy_Wh", 0) + sum_salvio.get("total_energy_Wh", 0)
-            total_ingresos = float(sum_porto.get("total_ingresos", 0.0)) + float(sum_salvio.get("total_ingresos", 0.0))
-            ev = counts_porto.get("ev_count", 0) + counts_salvio.get("ev_count", 0)
-            phev = counts_porto.get("phev_count", 0) + counts_salvio.get("phev_count", 0)
-            return {
-                "total_cargas": total_cargas,
-                "total_usuarios": total_usuarios,
-                "total_energy_Wh": total_energy_Wh,
-                "ingresos": round(total_ingresos, 2),
-                "coches_hibridos": phev,
-                "coches_electricos": ev,
-                "coches_totales": ev + phev,
-            }
-
         summary = get_station_summary(station, filter)
         counts = get_station_vehicle_counts(station, filter)
         return {
@@ -1,6 +1,8 @@
 
+import asyncio
 import os
-from typing import Optional
+from collections import deque
+from typing import AsyncIterator, Deque, List, Optional
 
 import httpx
 from dotenv import load_dotenv
@@ -18,46 +20,87 @@ BASE_URL = "https://etecnic.net/api/v1/etecnic"
 ETECNIC_PLATE_URL = os.getenv("ETECNIC_PLATE_URL", f"{BASE_URL}/users/charges-by-plate")
 ETECNIC_TIMEOUT = float(os.getenv("ETECNIC_TIMEOUT", "10"))
 
-async def get_charger_charges(charger_id: int) -> dict:
-    """
-    Obtiene TODAS las cargas de un cargador (maneja la paginación automáticamente).
-    """
-    all_charges = []
-    page = 1
-
-    try:
-        async with httpx.AsyncClient(timeout=30) as client:
-            while True:
-                url = f"{ETECNIC_STATS_URL}/{charger_id}?page={page}"
-                response = await client.get(url, headers=HEADERS)
-
-                if response.status_code != 200:
-                    # se suprime log en consola en producción; usar nivel debug para troubleshooting
-                    logger.debug("ETECNIC charges request failed: %s - %s", response.status_code, response.text)
-                    break
+try:
+    ETECNIC_PAGE_WINDOW = max(1, int(os.getenv("ETECNIC_PAGE_WINDOW", "4")))
+except ValueError:
+    ETECNIC_PAGE_WINDOW = 4
+ETECNIC_PAGE_SIZE = 20  # la API devuelve 20 cargas por página
 
-                data = response.json()
-                charges = data.get("charges", [])
 
-                if not charges:
-                    break
+async def _fetch_charges_page(client: httpx.AsyncClient, charger_id: int, page: int) -> Optional[List[dict]]:
+    """Una página de cargas; None si la petición falla."""
+    url = f"{ETECNIC_STATS_URL}/{charger_id}?page={page}"
+    try:
+        response = await client.get(url, headers=HEADERS)
+    except Exception as e:
+        logger.debug("Excepción durante la solicitud ETECNIC: %s", e)
+        return None
+    if response.status_code != 200:
+        # se suprime log en consola en producción; usar nivel debug para troubleshooting
+        logger.debug("ETECNIC charges request failed: %s - %s", response.status_code, response.text)
+        return None
+    try:
+        # un gateway puede responder 200 con HTML o cuerpo vacío
+        return response.json().get("charges", [])
+    except (ValueError, AttributeError) as e:
+        logger.debug("Respuesta ETECNIC no es JSON válido (cargador %s, página %s): %s", charger_id, page, e)
+        return None
 
-                all_charges.extend(charges)
 
-                # si devuelve menos de 20, ya era la última página
-                if len(charges) < 20:
-                    break
+async def iter_charger_pages(
+    charger_id: int,
+    client: Optional[httpx.AsyncClient] = None,
+    window: Optional[int] = None,
+) -> AsyncIterator[List[dict]]:
+    """
+    Itera las páginas de cargas de un cargador, en orden.
 
-                page += 1
+    - Mantiene hasta ``window`` páginas en vuelo (``ETECNIC_PAGE_WINDOW``, default 4):
+      mientras se consume la página N ya se están pidiendo las siguientes.
+    - Se detiene en la primera página corta (< 20), vacía o fallida y cancela
+      las peticiones adelantadas que ya no hacen falta.
+    """
+    window = window or ETECNIC_PAGE_WINDOW
+    own_client = client is None
+    if own_client:
+        client = httpx.AsyncClient(timeout=30)
+    inflight: Deque[asyncio.Task] = deque()
+    next_page = 1
+    try:
+        while True:
+            while len(inflight) < window:
+                inflight.append(asyncio.create_task(_fetch_charges_page(client, charger_id, next_page)))
+                next_page += 1
+            charges = await inflight.popleft()
+            if charges:
+                yield charges
+            # si devuelve menos de 20, ya era la última página
+            if not charges or len(charges) < ETECNIC_PAGE_SIZE:
+                break
+    finally:
+        for task in inflight:
+            task.cancel()
+        if inflight:
+            await asyncio.gather(*inflight, return_exceptions=True)
+        if own_client:
+            await client.aclose()
 
-        return {
-            "charger_id": charger_id,
-            "charges": all_charges
-        }
 
+async def get_charger_charges(charger_id: int) -> dict:
+    """
+    Obtiene TODAS las cargas de un cargador (maneja la paginación automáticamente).
+    Para sincronizar sin acumular en memoria, usar ``iter_charger_pages``.
+    """
+    all_charges = []
+    try:
+        async for charges in iter_charger_pages(charger_id):
+            all_charges.extend(charges)
     except Exception as e:
         logger.debug("Excepción durante la solicitud ETECNIC: %s", e)
-    return {"charger_id": charger_id, "charges": []}
+    return {
+        "charger_id": charger_id,
+        "charges": all_charges
+    }
 
 async def get_user_id_from_code(user_code: str):
     url = f"{BASE_URL}/cards/get-user-from-code/{user_code}"
@@ -146,6 +189,7 @@ class EtecnicClient:
 
 __all__ = [
     "get_charger_charges",
+    "iter_charger_pages",
     "get_user_id_from_code",
     "get_user_info",
     "EtecnicClient",
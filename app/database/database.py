@@ -1,5 +1,7 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, ReturnDocument, UpdateOne
+from pymongo.errors import OperationFailure
 import os
+import logging
 from datetime import datetime
 from dotenv import load_dotenv
 import certifi
@@ -45,10 +47,36 @@ except Exception as e:
 
 db = client[DB_NAME]
 
-# Colecciones por estación
-sessions_Portobelo = db["sessions_Portobelo"]
-sessions_Salvio = db["sessions_Salvio"]
+# Sesiones de todas las estaciones (campo `station`) y registro de estaciones
+sessions = db["sessions"]
+stations = db["stations"]
 stats_by_station = db["stats_by_station"]
+# Clasificación EV/PHEV por usuario (una fila por user_code), escrita por los pipelines
+user_classification = db["user_classification"]
+# Primera carga y meses activos por usuario (ver app.services.first_seen)
+user_first_seen = db["user_first_seen"]
+# Media/varianza (Welford) de energía por usuario (ver app.services.energy_stats)
+user_energy_stats = db["user_energy_stats"]
+# Buckets hora/día/mes de energía y sesiones por estación (ver app.services.rollups)
+session_rollups = db["session_rollups"]
+# Contador de generación de los rollups (invalida cachés derivadas)
+rollup_meta = db["rollup_meta"]
+# Historial diario (último snapshot de cada día) de stats / stats_by_station / executive_kpis
+stats_history = db["stats_history"]
+
+# Clave de snapshot por colección; el valor es el default para documentos antiguos sin el campo
+SNAPSHOT_KEYS = {
+    "stats": {"scope": "global"},
+    "stats_by_station": {"station": None, "filter": "total"},
+    "executive_kpis": {"scope": None, "station": None},
+}
+
+try:
+    STATS_HISTORY_DAYS = int(os.getenv("STATS_HISTORY_DAYS", "365"))
+except ValueError:
+    STATS_HISTORY_DAYS = 365
+
+logger = logging.getLogger(__name__)
 
 
 
@@ -72,38 +100,195 @@ def update_document(collection: str, query: dict, update: dict):
 # Funciones específicas para estadísticas
 # ==========================================
 
+# energy_Wh llega como string o número; valores inválidos cuentan como 0
+ENERGY_WH_EXPR = {"$toLong": {"$convert": {"input": "$energy_Wh", "to": "double", "onError": 0, "onNull": 0}}}
+AMOUNT_EXPR = {"$convert": {"input": "$amount", "to": "double", "onError": 0, "onNull": 0}}
+
+def aggregate_sessions(match: dict, stages: list, batch_size: int = 1000):
+    """
+    Ejecuta `stages` sobre las sesiones que cumplen `match` (incluye el filtro
+    de `station`, ver station_registry.session_match). Devuelve un cursor:
+    los resultados se leen por lotes.
+    """
+    return sessions.aggregate([{"$match": match}] + stages, allowDiskUse=True, batchSize=batch_size)
+
+def iter_user_totals(match: dict | None = None):
+    """
+    Cargas y energía agrupadas por user_code, calculadas en el servidor.
+    Cada elemento: {"_id": user_code | None, "sessions": int, "energy_Wh": int}.
+    """
+    return aggregate_sessions(match or {}, [
+        {"$project": {"user_code": 1, "energy_Wh": ENERGY_WH_EXPR}},
+        {"$group": {"_id": "$user_code", "sessions": {"$sum": 1}, "energy_Wh": {"$sum": "$energy_Wh"}}},
+    ])
+
 def get_sessions():
     """
     Devuelve todas las sesiones guardadas en la colección `sessions`.
     """
-    return db.sessions.find()
+    return sessions.find()
+
+def _ensure_ttl_index(coll, field: str, seconds: int):
+    """Crea el índice TTL o, si ya existe con otro plazo, lo ajusta con collMod."""
+    try:
+        coll.create_index(field, expireAfterSeconds=seconds)
+    except OperationFailure:
+        db.command("collMod", coll.name, index={"keyPattern": {field: 1}, "expireAfterSeconds": seconds})
+
+def ensure_indexes():
+    """Índices de las colecciones de estadísticas y sesiones (idempotente; se llama al arrancar)."""
+    sessions.create_index([("station", 1), ("charge_id", 1)], unique=True)
+    sessions.create_index([("station", 1), ("session_start_at", 1)])
+    sessions.create_index("session_start_at")
+    sessions.create_index([("user_code", 1), ("session_start_at", 1)])
+    sessions.create_index([("energy_z_abs", -1), ("session_start_at", 1)])
+    db.stats.create_index([("scope", 1), ("timestamp", -1)])
+    stats_by_station.create_index([("station", 1), ("filter", 1), ("timestamp", -1)])
+    db.executive_kpis.create_index([("scope", 1), ("station", 1), ("timestamp", -1)])
+    stats_history.create_index([("collection", 1), ("key", 1), ("day", -1)])
+    _ensure_ttl_index(stats_history, "day", STATS_HISTORY_DAYS * 86400)
+    user_classification.create_index("user_code", unique=True)
+    user_classification.create_index([("category", 1), ("stations", 1)])
+    user_first_seen.create_index("user_code", unique=True)
+    user_energy_stats.create_index("user_code", unique=True)
+    session_rollups.create_index([("unit", 1), ("station", 1), ("ts", 1)])
+    user_first_seen.create_index("first_seen")
+    for st in stations.distinct("_id"):
+        user_first_seen.create_index(f"stations.{st}")
+
+def _day(ts: datetime) -> datetime:
+    return datetime(ts.year, ts.month, ts.day)
+
+def _history_id(collection: str, key: dict, day: datetime) -> str:
+    parts = "|".join(f"{k}={key.get(k)}" for k in sorted(key))
+    return f"{collection}|{parts}|{day.date().isoformat()}"
+
+def _snapshot_key(collection: str, doc: dict) -> dict:
+    return {f: doc.get(f, default) for f, default in SNAPSHOT_KEYS[collection].items()}
+
+def upsert_snapshot(collection: str, doc: dict) -> dict:
+    """
+    Guarda `doc` como el snapshot vigente de su clave (ver SNAPSHOT_KEYS) y como
+    el snapshot del día en `stats_history`. Devuelve el documento con `_id`.
+    """
+    key = _snapshot_key(collection, doc)
+    saved = db[collection].find_one_and_replace(key, doc, upsert=True, return_document=ReturnDocument.AFTER)
+    day = _day(doc["timestamp"])
+    stats_history.update_one(
+        {"_id": _history_id(collection, key, day)},
+        {"$set": {"collection": collection, "key": key, "day": day, "snapshot": {k: v for k, v in doc.items() if k != "_id"}}},
+        upsert=True,
+    )
+    return saved
+
+def compact_stats_collections() -> dict:
+    """
+    Compacta el histórico append-only previo: por cada clave deja solo el
+    documento más reciente y pasa el resto a `stats_history` (uno por día).
+    Tras la primera pasada no hay nada que compactar y es una consulta barata.
+    """
+    removed = {}
+    for name, defaults in SNAPSHOT_KEYS.items():
+        coll = db[name]
+        key_expr = {f: {"$ifNull": [f"${f}", default]} for f, default in defaults.items()}
+        dupes = list(coll.aggregate([
+            {"$sort": {"timestamp": -1}},
+            {"$group": {"_id": key_expr, "keep": {"$first": "$_id"}, "n": {"$sum": 1}}},
+            {"$match": {"n": {"$gt": 1}}},
+        ], allowDiskUse=True))
+        total = 0
+        for group in dupes:
+            key = group["_id"]
+            match = {f: ({"$in": [v, None]} if v == defaults[f] else v) for f, v in key.items()}
+            match["_id"] = {"$ne": group["keep"]}
+            # último snapshot de cada día (sin el antiguo array `details`)
+            daily = coll.aggregate([
+                {"$match": match},
+                {"$sort": {"timestamp": 1}},
+                {"$group": {
+                    "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}},
+                    "snapshot": {"$last": "$$ROOT"},
+                }},
+                {"$project": {"snapshot._id": 0, "snapshot.details": 0}},
+            ], allowDiskUse=True)
+            ops = []
+            for d in daily:
+                snap = d["snapshot"]
+                day = _day(snap["timestamp"])
+                # $setOnInsert: si ya hay historial de ese día, es más reciente
+                ops.append(UpdateOne(
+                    {"_id": _history_id(name, key, day)},
+                    {"$setOnInsert": {"collection": name, "key": key, "day": day, "snapshot": snap}},
+                    upsert=True,
+                ))
+            if ops:
+                stats_history.bulk_write(ops, ordered=False)
+            total += coll.delete_many(match).deleted_count
+        if total:
+            logger.info(f"🧹 {name}: {total} snapshots antiguos compactados")
+        removed[name] = total
+    return removed
+
+def upsert_user_classifications(details: list, station: str | None = None) -> int:
+    """
+    Guarda marca/modelo/categoría de cada usuario en `user_classification`.
+    - `details`: [{"user_code", "brand", "model", "category"}, ...]
+    - `station`: si viene, se añade al set `stations` del usuario.
+    """
+    now = datetime.utcnow()
+    ops = []
+    for d in details:
+        code = d.get("user_code")
+        if not code:
+            continue
+        update = {"$set": {
+            "brand": d.get("brand"),
+            "model": d.get("model"),
+            "category": d.get("category"),
+            "updated_at": now,
+        }}
+        if station:
+            update["$addToSet"] = {"stations": station}
+        ops.append(UpdateOne({"user_code": code}, update, upsert=True))
+    if ops:
+        user_classification.bulk_write(ops, ordered=False)
+    return len(ops)
 
-def insert_stats(ev_count, phev_count, unclassified_count, details,
+def get_user_classifications(user_codes) -> dict:
+    """{user_code: {"brand", "model", "category"}} para los códigos pedidos ($in sobre el índice)."""
+    codes = [c for c in user_codes if c]
+    if not codes:
+        return {}
+    cursor = user_classification.find(
+        {"user_code": {"$in": codes}},
+        {"_id": 0, "user_code": 1, "brand": 1, "model": 1, "category": 1},
+    )
+    return {d["user_code"]: d for d in cursor}
+
+def insert_stats(ev_count, phev_count, unclassified_count,
                  total_cargas=0, total_usuarios=0, total_energy_Wh=0):
     """
-    Inserta un documento de estadísticas en la colección `stats`.
+    Guarda el snapshot global en la colección `stats` (un documento, vía upsert).
     Incluye EV, PHEV, unclassified, y opcionalmente cargas/usuarios/energía.
+    El detalle por usuario vive en `user_classification`.
     """
     doc = {
         "timestamp": datetime.utcnow(),
+        "scope": "global",
         "ev_count": ev_count,
         "phev_count": phev_count,
         "unclassified_count": unclassified_count,
-        "details": details,
         "total_cargas": total_cargas,
         "total_usuarios": total_usuarios,
         "total_energy_Wh": total_energy_Wh,
     }
-    result = db.stats.insert_one(doc)
-    doc["_id"] = result.inserted_id
-    return doc
+    return upsert_snapshot("stats", doc)
 
 def insert_station_stats(station: str, ev_count: int, phev_count: int, unclassified_count: int,
-                         details: list,
                          total_cargas: int = 0, total_usuarios: int = 0, total_energy_Wh: int = 0,
                          filter: str = "total"):
     """
-    Inserta un documento de estadísticas por estación en `stats_by_station`.
+    Guarda el snapshot de (estación, filtro) en `stats_by_station` vía upsert.
     """
     doc = {
         "timestamp": datetime.utcnow(),
@@ -112,14 +297,11 @@ def insert_station_stats(station: str, ev_count: int, phev_count: int, unclassif
         "ev_count": ev_count,
         "phev_count": phev_count,
         "unclassified_count": unclassified_count,
-        "details": details,
         "total_cargas": total_cargas,
         "total_usuarios": total_usuarios,
         "total_energy_Wh": total_energy_Wh,
     }
-    result = stats_by_station.insert_one(doc)
-    doc["_id"] = result.inserted_id
-    return doc
+    return upsert_snapshot("stats_by_station", doc)
 
 def get_last_station_stats(station: str, filter: str | None = None):
     """Devuelve el último documento de estadísticas para una estación (opcional por filtro)."""
@@ -1,19 +1,24 @@
+import time
+
+_T_IMPORT = time.perf_counter()
+
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import StreamingResponse, PlainTextResponse, RedirectResponse
 from apscheduler.schedulers.background import BackgroundScheduler
-from app.stats_flow.pipeline import run_pipeline
 import logging
 
 from app.api import router as api_router
+from app.responses import FastJSONResponse, SelectiveGZipMiddleware
 from app.vision import router as vision_router
-from app.services.sync_etecnic import sync_etecnic_data
-from app.services.station_stats import run_station_pipeline
-from app.services.executive import materialize_all_scopes
+from app.services.refresh import refresh_orchestrator
+from app.services.leader import refresh_leader
 
 import os
 
+_IMPORT_SECONDS = time.perf_counter() - _T_IMPORT
+
 # ==== Logging policy (silence logs in production) ====
 LOG_LEVEL_NAME = os.getenv("LOG_LEVEL", "WARNING").upper()
 LOG_LEVEL = getattr(logging, LOG_LEVEL_NAME, logging.WARNING)
@@ -44,7 +49,7 @@ if os.getenv("ACCESS_LOG_DISABLED", "true").lower() == "true":
     except Exception:
         pass
 
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
 
 # CORS
 app.add_middleware(
@@ -54,6 +59,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# gzip para respuestas grandes (excepto streams MJPEG)
+app.add_middleware(SelectiveGZipMiddleware)
 
 # Registrar las rutas de stats con prefijo /api/stats
 app.include_router(api_router, prefix="/api/stats")
@@ -61,7 +68,8 @@ app.include_router(vision_router)  # /api/vision
 
 # ============ Simple auth middleware (cookie-based) ============
 from app.auth.security import verify_access_token
-from app.database.database import db
+from app.database.database import db, ensure_indexes
+from app.services import station_registry
 
 AUTH_REQUIRED = os.getenv("AUTH_REQUIRED", "true").lower() == "true"
 
@@ -206,39 +214,29 @@ scheduler = BackgroundScheduler()
 
 def scheduled_sync():
     """Trabajo en hilo aparte que actualiza datos cada 15 minutos.
-    Ejecuta toda la cadena para mantener stats al día sin bloquear el servidor.
+    Ejecuta toda la cadena (ver ``app.services.refresh``) sin bloquear el servidor;
+    si el refresco anterior sigue en curso, este tick se fusiona con él.
     """
+    if not refresh_leader.is_leader:
+        logging.debug("Sincronización periódica omitida: otra instancia es líder")
+        return
     logging.info("⏳ Ejecutando sincronización periódica...")
     try:
-        import asyncio
-
-        async def full_refresh():
-            try:
-                await sync_etecnic_data()
-            except Exception as e:
-                logging.error(f"❌ Error en sync etecnic: {e}")
-            try:
-                await run_pipeline()
-            except Exception as e:
-                logging.error(f"❌ Error en pipeline global: {e}")
-            for st in ("Portobelo", "Salvio"):
-                try:
-                    await run_station_pipeline(st)
-                except Exception as e:
-                    logging.error(f"❌ Error en pipeline estación {st}: {e}")
-            # KPIs ejecutivos materializados (global y por estación)
-            try:
-                materialize_all_scopes()
-            except Exception as e:
-                logging.error(f"❌ Error materializando KPIs ejecutivos: {e}")
-
-        asyncio.run(full_refresh())
-        logging.info("✅ Sincronización periódica completada")
+        refresh_orchestrator.run("scheduled")
     except Exception as e:
         logging.error(f"❌ Error en sincronización periódica: {e}")
 
 # Actualiza sesiones (cargas/usuarios/energía) cada 15 minutos
-scheduler.add_job(scheduled_sync, "interval", minutes=15)
+scheduler.add_job(scheduled_sync, "interval", minutes=15, max_instances=1, coalesce=True)
+
+
+def _on_elected():
+    """Al ganar el lease (arranque o failover) se refresca sin esperar al próximo tick."""
+    import threading
+    threading.Thread(target=refresh_orchestrator.run, args=("elected",), name="refresh-elected", daemon=True).start()
+
+
+refresh_leader.on_elected = _on_elected
 
 
 @app.on_event("startup")
@@ -246,14 +244,22 @@ async def startup_event():
     """No bloquea el arranque. Sirve datos previos y refresca en background."""
     import asyncio
 
+    t0 = time.perf_counter()
+
     async def initial_refresh():
-        logging.info("🚀 Sincronización inicial en background...")
         try:
-            await sync_etecnic_data()
-            await run_pipeline()
-            await run_station_pipeline("Portobelo")
-            await run_station_pipeline("Salvio")
-            logging.info("✅ Refresco inicial completado")
+            await asyncio.to_thread(station_registry.seed_defaults)
+            await asyncio.to_thread(ensure_indexes)
+        except Exception as e:
+            logging.error(f"⚠️ Error creando índices: {e}")
+        try:
+            if refresh_leader.enabled:
+                # si esta instancia gana el lease, on_elected lanza el refresco inicial
+                leader = await asyncio.to_thread(refresh_leader.start)
+                logging.info(f"🚀 Lease de refresco: {'líder' if leader else 'seguidor'}")
+                return
+            logging.info("🚀 Sincronización inicial en background...")
+            await asyncio.to_thread(refresh_orchestrator.run, "startup")
         except Exception as e:
             logging.error(f"⚠️ Error en refresco inicial: {e}")
 
@@ -263,7 +269,24 @@ async def startup_event():
     # Iniciar scheduler periódico
     scheduler.start()
 
+    # Modelos de visión: se cargan al primer uso; VISION_WARMUP=true los precarga en background
+    # (con VISION_RUNTIME=process cada proceso de cámara se precarga al arrancar)
+    if os.getenv("VISION_WARMUP", "false").lower() == "true":
+        import threading
+        from app.vision.service import vision_service
+
+        def _warmup():
+            try:
+                logging.info(f"🔥 Warm-up de visión: {vision_service.warmup()}")
+            except Exception as e:
+                logging.error(f"⚠️ Error en warm-up de visión: {e}")
+
+        threading.Thread(target=_warmup, name="vision-warmup", daemon=True).start()
+
+    logging.info(f"⏱️ Arranque: imports {_IMPORT_SECONDS:.3f}s, startup {time.perf_counter() - t0:.3f}s")
+
 
 @app.on_event("shutdown")
 def shutdown_event():
     scheduler.shutdown()
+    refresh_leader.stop()
@@ -0,0 +1,65 @@
+"""Respuesta JSON rápida (orjson) y compresión gzip selectiva para toda la app.
+
+- ``FastJSONResponse``: serializa con orjson; datetime, dataclasses y arrays
+  NumPy de forma nativa, ``ObjectId`` como string. Es la respuesta por defecto
+  de la app; los endpoints pesados la devuelven directamente para saltarse
+  además ``jsonable_encoder``.
+- ``SelectiveGZipMiddleware``: gzip por encima de ``GZIP_MIN_BYTES`` salvo en
+  rutas de streaming continuo (MJPEG), que no deben bufferizarse.
+"""
+
+import os
+from decimal import Decimal
+from typing import Any, Iterable
+
+import orjson
+from fastapi.responses import JSONResponse
+from starlette.middleware.gzip import GZipMiddleware
+
+try:
+    GZIP_MIN_BYTES = int(os.getenv("GZIP_MIN_BYTES", "1024"))
+except ValueError:
+    GZIP_MIN_BYTES = 1024
+
+# Streams multipart/x-mixed-replace: gzip los retendría en el buffer del compresor
+GZIP_EXCLUDED_PATHS = ("/api/stream/", "/api/vision/debug")
+
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(obj: Any):
+    """Tipos que orjson no conoce: ObjectId / Decimal128 de Mongo, sets, Decimal."""
+    name = type(obj).__name__
+    if name in ("ObjectId", "Decimal128"):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f"Tipo no serializable a JSON: {name}")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=_ORJSON_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class SelectiveGZipMiddleware:
+    """GZipMiddleware de Starlette con rutas excluidas por prefijo."""
+
+    def __init__(self, app, minimum_size: int = GZIP_MIN_BYTES, exclude_paths: Iterable[str] = GZIP_EXCLUDED_PATHS):
+        self.app = app
+        self.gzip = GZipMiddleware(app, minimum_size=minimum_size)
+        self.exclude_paths = tuple(exclude_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and not scope["path"].startswith(self.exclude_paths):
+            await self.gzip(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
@@ -0,0 +1,20 @@
+"""Recalcula user_energy_stats y energy_z_abs de todas las sesiones (NumPy).
+
+Uso:
+    python -m app.scripts.backfill_energy_stats
+
+La sincronización mantiene las estadísticas de forma incremental; esto sirve
+tras el despliegue y para refrescar los |z| de sesiones antiguas.
+"""
+from app.database.database import ensure_indexes
+from app.services.energy_stats import backfill
+
+
+def main():
+    ensure_indexes()
+    n = backfill()
+    print(f"✅ energy_z_abs recalculado para {n} sesiones")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+"""Reconstruye la colección user_first_seen desde las sesiones ya guardadas.
+
+Uso:
+    python -m app.scripts.backfill_first_seen
+
+La sincronización la mantiene al día; esto solo hace falta una vez tras el
+despliegue (o si la colección se borra).
+"""
+from app.database.database import ensure_indexes
+from app.services.first_seen import backfill
+
+
+def main():
+    ensure_indexes()
+    written = backfill()
+    print(f"✅ user_first_seen: {written} actualizaciones")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Compara el tiempo de serialización JSON por endpoint: antes (jsonable_encoder +
+json de FastAPI) y después (FastJSONResponse con orjson).
+
+Uso:
+    python -m app.scripts.bench_serialization                 # payloads sintéticos
+    python -m app.scripts.bench_serialization --live          # datos reales de Mongo
+    python -m app.scripts.bench_serialization --repeat 50 --gzip
+
+Con --gzip también se muestra el tamaño comprimido (nivel 9 de GZipMiddleware).
+"""
+import argparse
+import gzip
+import json
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.responses import FastJSONResponse
+
+
+@dataclass
+class _Entry:  # misma forma que app.vision.service.Entry
+    ts: float
+    source: str
+    brand: Optional[str]
+    model: Optional[str]
+    category: str
+    score: float
+    plate: Optional[str] = None
+    origin: str = "ai"
+
+
+def _synthetic() -> dict:
+    rnd = random.Random(0)
+    now = datetime.utcnow()
+    users = [
+        {
+            "user_code": f"U{i:06d}",
+            "user_name": f"Usuario {i}",
+            "total_cargas": rnd.randint(1, 400),
+            "total_energy_Wh": rnd.randint(1_000, 9_000_000),
+            "total_ingresos": rnd.random() * 1e6,
+            "brand": rnd.choice(["BYD", "Renault", "Kia", None]),
+            "model": rnd.choice(["Dolphin", "Zoe", "EV6", None]),
+            "category": rnd.choice(["EV", "PHEV", "unclassified"]),
+        }
+        for i in range(5000)
+    ]
+    entries = [
+        _Entry(time.time() - i, "rtsp://cam", "BYD", "Han", "EV", rnd.random(), f"ABC{i:03d}")
+        for i in range(500)
+    ]
+    hours = [now - timedelta(hours=h) for h in range(24 * 365)]
+    series = {"series": [{"period_start": t.isoformat(), "energy_Wh": rnd.randint(0, 50_000)} for t in hours]}
+    executive = {
+        "timestamp": now,
+        "scope": "global",
+        "station": None,
+        **{f"kpi_{i}": rnd.random() * 1e6 for i in range(30)},
+    }
+    return {
+        "/users/{station}": ({"usuarios": users}, None),
+        "/vision/entries": ({"items": [e.__dict__ for e in entries]}, {"items": entries}),
+        "/energy/series (hora, 1 año)": (series, None),
+        "/executive/summary?materialized": (executive, None),
+    }
+
+
+def _live() -> dict:
+    from app.api.users import get_users_stats
+    from app.services.executive import latest_executive_summary
+    from app.services.sustainability import get_energy_series
+
+    users = json.loads(get_users_stats("all", "total").body)
+    series = get_energy_series("all", "total", "hour")
+    executive = latest_executive_summary(None) or {}
+    executive.pop("_id", None)
+    return {
+        "/users/all": (users, None),
+        "/energy/series (hora, total)": (series, None),
+        "/executive/summary?materialized": (executive, None),
+    }
+
+
+def _time(fn: Callable[[], bytes], repeat: int) -> tuple:
+    times = []
+    body = b""
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        body = fn()
+        times.append(time.perf_counter() - t0)
+    return float(np.median(times)) * 1000.0, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de serialización JSON por endpoint")
+    parser.add_argument("--live", action="store_true", help="usar datos reales de Mongo")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--gzip", action="store_true", help="mostrar tamaño gzip")
+    args = parser.parse_args()
+
+    payloads = _live() if args.live else _synthetic()
+    before_resp = JSONResponse.__new__(JSONResponse)
+    after_resp = FastJSONResponse.__new__(FastJSONResponse)
+    print(f"{'endpoint':<36} {'antes ms':>10} {'después ms':>11} {'x':>6} {'bytes':>10}" + (f" {'gzip':>9}" if args.gzip else ""))
+    for name, (payload, fast_payload) in payloads.items():
+        before, _ = _time(lambda: before_resp.render(jsonable_encoder(payload)), args.repeat)
+        target = fast_payload if fast_payload is not None else payload
+        after, body = _time(lambda: after_resp.render(target), args.repeat)
+        line = f"{name:<36} {before:>10.2f} {after:>11.2f} {before / after if after else 0:>6.1f} {len(body):>10}"
+        if args.gzip:
+            line += f" {len(gzip.compress(body, compresslevel=9)):>9}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Compara latencia y concordancia entre backends torch y ONNX (YOLO + CLIP).
+
+Uso:
+    python -m app.scripts.bench_vision --source video.mp4 --frames 100
+    python -m app.scripts.bench_vision --source carpeta_con_jpgs/ --int8 false
+
+YOLO: concordancia = fracción de cajas torch con pareja ONNX (IoU >= 0.5).
+CLIP: similitud coseno media de embeddings y acuerdo top-1 marca/modelo y EV/PHEV.
+"""
+import argparse
+import os
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+
+def _load_frames(source: str, limit: int) -> list:
+    path = Path(source)
+    frames = []
+    if path.is_dir():
+        for p in sorted(path.iterdir()):
+            if p.suffix.lower() in (".jpg", ".jpeg", ".png"):
+                img = cv2.imread(str(p))
+                if img is not None:
+                    frames.append(img)
+            if len(frames) >= limit:
+                break
+        return frames
+    cap = cv2.VideoCapture(source)
+    while len(frames) < limit:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def _pct(values: list, q: float) -> float:
+    return float(np.percentile(values, q)) * 1000.0 if values else 0.0
+
+
+def _report(name: str, values: list) -> None:
+    print(f"  {name:<10} p50={_pct(values, 50):8.2f} ms  p95={_pct(values, 95):8.2f} ms  n={len(values)}")
+
+
+def _iou(a, b) -> float:
+    ax0, ay0, aw, ah = a.x, a.y, a.w, a.h
+    bx0, by0, bw, bh = b.x, b.y, b.w, b.h
+    ix = max(0, min(ax0 + aw, bx0 + bw) - max(ax0, bx0))
+    iy = max(0, min(ay0 + ah, by0 + bh) - max(ay0, by0))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+
+def bench_yolo(frames: list) -> list:
+    from app.vision.detector import VehicleDetector
+
+    # backend explícito y carga inmediata: cada detector usa su propio modelo
+    torch_det = VehicleDetector(backend="torch")
+    torch_det.load()
+    onnx_det = VehicleDetector(backend="onnx")
+    onnx_det.load()
+    if onnx_det._onnx is None:
+        print("YOLO: backend ONNX no disponible")
+        return []
+
+    t_torch, t_onnx, matched, total = [], [], 0, 0
+    crops = []
+    for frame in frames:
+        t0 = time.perf_counter(); a = torch_det.detect(frame); t_torch.append(time.perf_counter() - t0)
+        t0 = time.perf_counter(); b = onnx_det.detect(frame); t_onnx.append(time.perf_counter() - t0)
+        total += len(a)
+        matched += sum(1 for box in a if any(_iou(box, other) >= 0.5 for other in b))
+        for box in a:
+            crops.append(frame[box.y:box.y + box.h, box.x:box.x + box.w])
+    print("YOLO")
+    _report("torch", t_torch)
+    _report("onnx", t_onnx)
+    print(f"  concordancia cajas: {matched}/{total} ({(matched / total * 100.0) if total else 0.0:.1f}%)")
+    return crops
+
+
+def bench_clip(crops: list, batch: int) -> None:
+    from app.vision.classifier import ZeroShotClassifier
+
+    torch_clf = ZeroShotClassifier(backend="torch")
+    torch_clf.load()
+    onnx_clf = ZeroShotClassifier(backend="onnx")
+    onnx_clf.load()
+    if torch_clf.model is None or onnx_clf._onnx is None:
+        print("CLIP: backend ONNX no disponible")
+        return
+    crops = [c for c in crops if c.size]
+    if not crops:
+        print("CLIP: sin recortes para comparar")
+        return
+
+    t_torch, t_onnx, sims = [], [], []
+    agree_model = agree_cat = 0
+    for i in range(0, len(crops), batch):
+        chunk = crops[i:i + batch]
+        t0 = time.perf_counter(); ea = torch_clf.encode_images(chunk); t_torch.append(time.perf_counter() - t0)
+        t0 = time.perf_counter(); eb = onnx_clf.encode_images(chunk); t_onnx.append(time.perf_counter() - t0)
+        sims.extend(np.sum(ea * eb, axis=1).tolist())
+        for x, y in zip(ea, eb):
+            ra, rb = torch_clf._score(x), onnx_clf._score(y)
+            agree_model += int((ra.brand, ra.model) == (rb.brand, rb.model))
+            agree_cat += int(ra.category == rb.category)
+    n = len(crops)
+    print(f"CLIP (batch={batch})")
+    _report("torch", t_torch)
+    _report("onnx", t_onnx)
+    print(f"  coseno medio: {np.mean(sims):.4f}  top-1 modelo: {agree_model / n * 100.0:.1f}%  categoría: {agree_cat / n * 100.0:.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", required=True, help="video o carpeta con imágenes")
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--batch", type=int, default=8)
+    parser.add_argument("--int8", default=None, help="true/false (por defecto ONNX_INT8)")
+    args = parser.parse_args()
+
+    if args.int8 is not None:
+        os.environ["ONNX_INT8"] = args.int8
+    frames = _load_frames(args.source, args.frames)
+    if not frames:
+        raise SystemExit("No se pudieron leer frames de la fuente")
+    print(f"{len(frames)} frames, ONNX_INT8={os.getenv('ONNX_INT8', 'true')}, ORT_INTRA_OP_THREADS={os.getenv('ORT_INTRA_OP_THREADS', '0')}")
+    crops = bench_yolo(frames)
+    bench_clip(crops or frames, args.batch)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,30 @@
 import re
-from paddleocr import PaddleOCR
+import threading
 
-ocr = PaddleOCR(use_textline_orientation=True, lang="en")
 REGEX_MATRICULA = r"^[A-Z]{3}-?\d{3}$"
 
+# PaddleOCR se construye bajo demanda: importarlo tarda segundos y ocupa
+# cientos de MB, y la API de estadísticas no lo necesita.
+_ocr = None
+_ocr_lock = threading.Lock()
+
+
+def get_ocr():
+    global _ocr
+    if _ocr is None:
+        with _ocr_lock:
+            if _ocr is None:
+                from paddleocr import PaddleOCR
+                _ocr = PaddleOCR(use_textline_orientation=True, lang="en")
+    return _ocr
+
+
+def __getattr__(name):
+    # Compatibilidad con `from app.scripts.detector import ocr`
+    if name == "ocr":
+        return get_ocr()
+    raise AttributeError(name)
+
 
 def normalizar_matricula(text):
     return text.replace("-", "").replace(" ", "").upper()
@@ -27,7 +48,7 @@ async def detectar_matriculas_en_video(video_path, informes=None, buscar_dueno_p
             frame_count += 1
             continue
 
-        result = ocr.predict(frame)
+        result = get_ocr().predict(frame)
         for item in result:
             rec_texts = item.get("rec_texts", [])
             rec_scores = item.get("rec_scores", [])
@@ -0,0 +1,56 @@
+"""Migra las colecciones por estación (sessions_<Estación>) a la colección única `sessions`.
+
+Uso:
+    python -m app.scripts.migrate_sessions          # copia (idempotente)
+    python -m app.scripts.migrate_sessions --drop   # copia y borra las colecciones antiguas
+
+- Siembra el registro `stations` y crea los índices (incluido el único
+  (station, charge_id) que necesita el $merge).
+- La copia es un $merge en el servidor: cada sesión recibe su `station` y se
+  fusiona con la que ya haya escrito la sync nueva, si existe.
+- Las sesiones sin charge_id no se pueden fusionar y se informan, no se copian.
+"""
+import argparse
+
+from app.database.database import db, ensure_indexes, sessions
+from app.services import rollups, station_registry
+
+
+def migrate_station(station: str, drop: bool = False) -> int:
+    legacy = db[f"sessions_{station}"]
+    if legacy.name not in db.list_collection_names():
+        print(f"⏭️ {station}: no existe {legacy.name}")
+        return 0
+    total = legacy.count_documents({})
+    skipped = legacy.count_documents({"charge_id": {"$exists": False}})
+    legacy.aggregate([
+        {"$match": {"charge_id": {"$exists": True}}},
+        {"$unset": "_id"},
+        {"$set": {"station": station}},
+        {"$merge": {"into": sessions.name, "on": ["station", "charge_id"], "whenMatched": "merge", "whenNotMatched": "insert"}},
+    ], allowDiskUse=True)
+    migrated = sessions.count_documents({"station": station})
+    print(f"✅ {station}: {total - skipped}/{total} sesiones copiadas ({migrated} en `sessions`, {skipped} sin charge_id)")
+    if drop:
+        if skipped:
+            print(f"⚠️ {station}: no se borra {legacy.name} (hay sesiones sin charge_id)")
+        else:
+            legacy.drop()
+            print(f"🧹 {legacy.name} eliminada")
+    return total - skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--drop", action="store_true", help="borrar las colecciones sessions_<Estación> tras copiarlas")
+    args = parser.parse_args()
+
+    station_registry.seed_defaults()
+    ensure_indexes()
+    for station in station_registry.names():
+        migrate_station(station, drop=args.drop)
+        rollups.refresh_station(station)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+"""Reconstruye session_rollups (hora / día / mes) de todas las estaciones.
+
+Uso:
+    python -m app.scripts.rebuild_rollups
+
+La sincronización construye los rollups la primera vez y luego solo refresca
+los días con cambios; esto sirve si se editan sesiones fuera de la sync.
+"""
+from app.database.database import ensure_indexes
+from app.services import rollups, station_registry
+
+
+def main():
+    ensure_indexes()
+    names = station_registry.names()
+    for station in names:
+        rollups.refresh_station(station)
+    print(f"✅ session_rollups reconstruido para {len(names)} estaciones")
+
+
+if __name__ == "__main__":
+    main()
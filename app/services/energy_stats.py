@@ -0,0 +1,166 @@
+"""Estadísticas de energía por usuario y marca de anomalía por sesión.
+
+- ``user_energy_stats``: ``{user_code, n, mean, m2}`` (Welford) sobre ``energy_Wh``
+  de todas las sesiones del usuario, en todas las estaciones.
+- En cada sesión se guarda ``energy_counted`` (valor ya incluido en las
+  estadísticas) y ``energy_z_abs`` (|z| respecto a las estadísticas del usuario
+  al ingerirla). ``/drivers/alerts`` filtra por ``energy_z_abs`` con índice.
+- La sync vuelve a traer sesiones ya vistas: solo se contabilizan las nuevas y,
+  si cambió su energía, se reemplaza el valor anterior (quitar + añadir).
+- ``backfill`` recalcula todo vectorizado con NumPy (y refresca los z antiguos).
+"""
+
+import logging
+import math
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from pymongo import ReplaceOne, UpdateOne
+
+from app.database.database import sessions as sessions_col, user_energy_stats
+
+logger = logging.getLogger(__name__)
+
+# Las páginas de varias estaciones se procesan en hilos en paralelo y un usuario
+# puede cargar en ambas: se serializa la lectura-modificación-escritura.
+_lock = threading.Lock()
+
+
+def parse_energy(value) -> Optional[float]:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return None
+
+
+class Welford:
+    __slots__ = ("n", "mean", "m2")
+
+    def __init__(self, n: int = 0, mean: float = 0.0, m2: float = 0.0):
+        self.n, self.mean, self.m2 = n, mean, m2
+
+    def add(self, x: float) -> None:
+        self.n += 1
+        d = x - self.mean
+        self.mean += d / self.n
+        self.m2 += d * (x - self.mean)
+
+    def remove(self, x: float) -> None:
+        if self.n <= 1:
+            self.n, self.mean, self.m2 = 0, 0.0, 0.0
+            return
+        old_mean = self.mean
+        self.n -= 1
+        self.mean = (old_mean * (self.n + 1) - x) / self.n
+        self.m2 = max(0.0, self.m2 - (x - old_mean) * (x - self.mean))
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.m2 / self.n) if self.n else 0.0
+
+    def z_abs(self, x: float) -> float:
+        std = self.std
+        return abs(x - self.mean) / std if std > 0 else 0.0
+
+
+def record_sessions(sessions: Iterable[dict]) -> int:
+    """Incorpora un lote (ya upsertado en ``sessions``) a las estadísticas; devuelve sesiones contabilizadas."""
+    batch: Dict[Tuple[str, object], Tuple[str, float]] = {}
+    for s in sessions:
+        code, cid = s.get("user_code"), s.get("charge_id")
+        val = parse_energy(s.get("energy_Wh"))
+        if code and cid is not None and val is not None:
+            batch[(s.get("station"), cid)] = (code, val)
+    if not batch:
+        return 0
+
+    with _lock:
+        prior = {
+            (d.get("station"), d["charge_id"]): d.get("energy_counted")
+            for d in sessions_col.find(
+                {"$or": [{"station": st, "charge_id": cid} for st, cid in batch]},
+                {"_id": 0, "station": 1, "charge_id": 1, "energy_counted": 1},
+            )
+        }
+        changed = {key: cv for key, cv in batch.items() if prior.get(key) != cv[1]}
+        if not changed:
+            return 0
+        users = {code for code, _ in changed.values()}
+        stats = {
+            d["user_code"]: Welford(d.get("n", 0), d.get("mean", 0.0), d.get("m2", 0.0))
+            for d in user_energy_stats.find({"user_code": {"$in": list(users)}})
+        }
+        for key, (code, val) in changed.items():
+            w = stats.setdefault(code, Welford())
+            old = prior.get(key)
+            if old is not None:
+                w.remove(old)
+            w.add(val)
+
+        session_ops = [
+            UpdateOne(
+                {"station": st, "charge_id": cid},
+                {"$set": {"energy_counted": val, "energy_z_abs": round(stats[code].z_abs(val), 4)}},
+            )
+            for (st, cid), (code, val) in changed.items()
+        ]
+        stat_ops = [
+            ReplaceOne({"user_code": code}, {"user_code": code, "n": w.n, "mean": w.mean, "m2": w.m2}, upsert=True)
+            for code, w in stats.items() if code in users
+        ]
+        user_energy_stats.bulk_write(stat_ops, ordered=False)
+        sessions_col.bulk_write(session_ops, ordered=False)
+    return len(changed)
+
+
+def backfill(batch_size: int = 5000) -> int:
+    """Recalcula estadísticas y |z| de todas las sesiones con operaciones NumPy por lotes."""
+    codes: List[str] = []
+    values: List[float] = []
+    refs: List[Tuple[str, object]] = []  # (estación, charge_id)
+    cursor = sessions_col.find(
+        {"user_code": {"$nin": [None, ""]}, "charge_id": {"$exists": True}},
+        {"_id": 0, "station": 1, "charge_id": 1, "user_code": 1, "energy_Wh": 1},
+        batch_size=batch_size,
+    )
+    for d in cursor:
+        val = parse_energy(d.get("energy_Wh"))
+        if val is None:
+            continue
+        codes.append(d["user_code"])
+        values.append(val)
+        refs.append((d.get("station"), d["charge_id"]))
+    if not values:
+        return 0
+
+    with _lock:
+        e = np.asarray(values, dtype=np.float64)
+        users, inv = np.unique(np.asarray(codes, dtype=object), return_inverse=True)
+        n = np.bincount(inv)
+        mean = np.bincount(inv, weights=e) / n
+        m2 = np.bincount(inv, weights=(e - mean[inv]) ** 2)
+        std = np.sqrt(m2 / n)
+        dev = np.abs(e - mean[inv])
+        z = np.divide(dev, std[inv], out=np.zeros_like(dev), where=std[inv] > 0)
+
+        ops = [
+            ReplaceOne({"user_code": u}, {"user_code": u, "n": int(n[i]), "mean": float(mean[i]), "m2": float(m2[i])}, upsert=True)
+            for i, u in enumerate(users)
+        ]
+        for i in range(0, len(ops), batch_size):
+            user_energy_stats.bulk_write(ops[i:i + batch_size], ordered=False)
+
+        session_ops: List[UpdateOne] = []
+        for (station, cid), val, zi in zip(refs, e.tolist(), z.tolist()):
+            session_ops.append(UpdateOne(
+                {"station": station, "charge_id": cid},
+                {"$set": {"energy_counted": val, "energy_z_abs": round(zi, 4)}},
+            ))
+            if len(session_ops) >= batch_size:
+                sessions_col.bulk_write(session_ops, ordered=False)
+                session_ops = []
+        if session_ops:
+            sessions_col.bulk_write(session_ops, ordered=False)
+    logger.info(f"✅ user_energy_stats: {len(users)} usuarios, {len(values)} sesiones")
+    return len(values)
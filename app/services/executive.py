@@ -4,9 +4,14 @@ import os
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Literal
 
-from pymongo.collection import Collection
-
-from app.database.database import db, sessions_Portobelo, sessions_Salvio
+from app.database.database import (
+    db,
+    sessions,
+    aggregate_sessions,
+    upsert_snapshot,
+    AMOUNT_EXPR,
+)
+from app.services import rollups, station_registry
 
 Scope = Literal["global", "station"]
 
@@ -54,81 +59,63 @@ def _prev_month_bounds(ref: Optional[str] = None) -> tuple[datetime, datetime]:
     return start, end
 
 
-def _collections_for_scope(station: Optional[str]) -> list[Collection]:
-    if station and station.lower() not in ("all", "todas"):
-        if station == "Portobelo":
-            return [sessions_Portobelo]
-        if station == "Salvio":
-            return [sessions_Salvio]
-        return []
-    return [sessions_Portobelo, sessions_Salvio]
-
-
-def _count_distinct_users(collections: list[Collection], start: datetime, end: datetime) -> int:
-    users = set()
-    q = {"session_start_at": {"$gte": _to_iso(start), "$lt": _to_iso(end)}}
-    for c in collections:
-        for doc in c.find(q, {"user_code": 1}):
-            code = doc.get("user_code")
-            if code:
-                users.add(code)
-    return len(users)
-
-
-def _count_sessions(collections: list[Collection], start: datetime, end: datetime) -> int:
-    q = {"session_start_at": {"$gte": _to_iso(start), "$lt": _to_iso(end)}}
-    total = 0
-    for c in collections:
-        total += c.count_documents(q)
-    return total
-
-
-def _sum_energy_wh(collections: list[Collection], start: datetime, end: datetime) -> int:
-    q = {"session_start_at": {"$gte": _to_iso(start), "$lt": _to_iso(end)}}
-    total = 0
-    for c in collections:
-        cursor = c.find(q, {"energy_Wh": 1})
-        for doc in cursor:
-            try:
-                total += int(doc.get("energy_Wh", 0))
-            except Exception:
-                pass
-    return total
-
-
-def _sum_amount(collections: list[Collection], start: datetime | None, end: datetime | None) -> float:
-    if start is not None and end is not None:
-        q = {"session_start_at": {"$gte": _to_iso(start), "$lt": _to_iso(end)}}
-    else:
-        q = {}
-    total = 0.0
-    for c in collections:
-        cursor = c.find(q, {"amount": 1})
-        for doc in cursor:
-            try:
-                total += float(doc.get("amount", 0) or 0)
-            except Exception:
-                pass
-    return total
-
-
-def _estimate_occupied_minutes(collections: list[Collection], start: datetime, end: datetime) -> int:
-    """
-    Estimación simple si no tenemos duración: usa duración media configurable.
-    Variables de entorno:
-    - SESSION_AVG_MINUTES (default 45)
-    """
-    avg_minutes = int(os.getenv("SESSION_AVG_MINUTES", "45"))
-    sessions = _count_sessions(collections, start, end)
-    return sessions * avg_minutes
+def _scope_for(station: Optional[str]) -> dict:
+    """Filtro de sesiones del alcance; una estación no registrada no casa con nada."""
+    scope = station_registry.session_match(station)
+    return scope if scope is not None else {"station": {"$in": []}}
+
+
+def _range_query(scope: dict, start: datetime, end: datetime) -> dict:
+    return {**scope, "session_start_at": {"$gte": _to_iso(start), "$lt": _to_iso(end)}}
+
+
+def _first_value(cursor, field: str, default):
+    for doc in cursor:
+        return doc.get(field, default)
+    return default
+
+
+def _count_distinct_users(scope: dict, start: datetime, end: datetime) -> int:
+    cursor = aggregate_sessions(_range_query(scope, start, end), [
+        {"$group": {"_id": "$user_code"}},
+        {"$match": {"_id": {"$nin": [None, ""]}}},
+        {"$count": "n"},
+    ])
+    return int(_first_value(cursor, "n", 0))
+
+
+def _count_sessions(scope: dict, start: datetime, end: datetime) -> int:
+    return sessions.count_documents(_range_query(scope, start, end))
+
+
+def _sum_amount(scope: dict, start: datetime | None, end: datetime | None) -> float:
+    q = _range_query(scope, start, end) if start is not None and end is not None else scope
+    cursor = aggregate_sessions(q, [
+        {"$group": {"_id": None, "total": {"$sum": AMOUNT_EXPR}}},
+    ])
+    return float(_first_value(cursor, "total", 0.0))
+
+
+def _occupied_minutes(station: Optional[str], start: datetime, end: datetime) -> float:
+    """Minutos-conector ocupados según los rollups (duración real de cada sesión, ver app.services.rollups)."""
+    stations = station_registry.resolve(station)
+    return rollups.total(stations, start, end, field="occupied_s") / 60.0 if stations else 0.0
+
+
+def _peak_concurrency(station: Optional[str], start: datetime, end: datetime) -> int:
+    """Sesiones simultáneas máximas en el alcance (para "todas", pico de la red completa)."""
+    return rollups.peak_concurrency(station_registry.resolve(station), start, end)
+
+
+def _connectors(station_doc: Optional[dict]) -> int:
+    # sin conectores registrados se asume uno por cargador
+    doc = station_doc or {}
+    return int(doc.get("connectors") or len(doc.get("chargers", [])))
 
 
 def _available_minutes(station: Optional[str], start: datetime, end: datetime) -> int:
     minutes = int((end - start).total_seconds() // 60)
-    if station and station.lower() not in ("all", "todas"):
-        conns = int(os.getenv(f"CONNECTORS_{station.upper()}", "0"))
-    else:
-        conns = int(os.getenv("CONNECTORS_PORTOBELO", "0")) + int(os.getenv("CONNECTORS_SALVIO", "0"))
+    conns = sum(_connectors(station_registry.get(st)) for st in station_registry.resolve(station))
     return minutes * max(1, conns)
 
 
@@ -143,24 +130,24 @@ def compute_executive_summary(
     - window_days: ventana para clientes activos
     - month: YYYY-MM para el mes de referencia
     """
-    colls = _collections_for_scope(station)
+    scope = _scope_for(station)
     now = datetime.utcnow()
     # Clientes activos
     win_start = now - timedelta(days=window_days)
-    active_customers = _count_distinct_users(colls, win_start, now)
+    active_customers = _count_distinct_users(scope, win_start, now)
 
     # Cargas mes actual vs mes anterior
     cur_start, cur_end = _month_bounds(month)
     prev_start, prev_end = _prev_month_bounds(month)
-    charges_cur = _count_sessions(colls, cur_start, cur_end)
-    charges_prev = _count_sessions(colls, prev_start, prev_end)
+    charges_cur = _count_sessions(scope, cur_start, cur_end)
+    charges_prev = _count_sessions(scope, prev_start, prev_end)
     growth_pct = ((charges_cur - charges_prev) / charges_prev * 100.0) if charges_prev > 0 else (100.0 if charges_cur > 0 else 0.0)
 
     # Ingresos por mes, YTD (hasta fin del mes seleccionado) y totales
     year_start = datetime(now.year, 1, 1)
-    revenue_month = _sum_amount(colls, cur_start, cur_end)
-    revenue_ytd = _sum_amount(colls, year_start, cur_end)
-    revenue_total = _sum_amount(colls, None, None)
+    revenue_month = _sum_amount(scope, cur_start, cur_end)
+    revenue_ytd = _sum_amount(scope, year_start, cur_end)
+    revenue_total = _sum_amount(scope, None, None)
 
     # Meta YTD (meta anual por defecto 1,996,677,530 COP ≈ 500k USD)
     rate_cop_usd = float(os.getenv("EXCHANGE_RATE_COP_USD", "3993.35506"))  # COP por 1 USD
@@ -181,14 +168,15 @@ def compute_executive_summary(
         revenue_target_ytd = 0.0
     revenue_achv_pct = (revenue_ytd / revenue_target_ytd * 100.0) if revenue_target_ytd > 0 else 0.0
 
-    # Utilización promedio de red
-    occupied_min = _estimate_occupied_minutes(colls, cur_start, cur_end)
+    # Utilización promedio de red (ocupación real / minutos-conector disponibles)
+    occupied_min = _occupied_minutes(station, cur_start, cur_end)
     available_min = _available_minutes(station, cur_start, cur_end)
     utilization_pct = (occupied_min / available_min * 100.0) if available_min > 0 else 0.0
+    peak_concurrency = _peak_concurrency(station, cur_start, cur_end)
 
     return {
-        "scope": "station" if station and station.lower() not in ("all", "todas") else "global",
-        "station": None if not station or station.lower() in ("all", "todas") else station,
+        "scope": "global" if station_registry.is_all(station) else "station",
+        "station": None if station_registry.is_all(station) else station,
         "window_days": window_days,
         "month": month,
         "active_customers": active_customers,
@@ -201,6 +189,7 @@ def compute_executive_summary(
         "revenue_target_ytd": round(revenue_target_ytd, 2),
         "revenue_achv_pct": round(revenue_achv_pct, 2),
         "utilization_pct": round(utilization_pct, 2),
+        "peak_concurrency": peak_concurrency,
         # Conversión a USD
         "exchange_rate_cop_usd": rate_cop_usd,
         "revenue_month_usd": round(revenue_month / rate_cop_usd, 2),
@@ -244,20 +233,18 @@ def get_executive_summary_cached(
 
 def materialize_all_scopes():
     """Calcula y guarda KPIs materializados para global y cada estación."""
-    for st in (None, "Portobelo", "Salvio"):
+    for st in (None, *station_registry.names()):
         doc = compute_executive_summary(st)
         store_executive_summary(doc)
 
 
 def store_executive_summary(doc: dict) -> dict:
     doc = {**doc, "timestamp": datetime.utcnow()}
-    res = db.executive_kpis.insert_one(doc)
-    doc["_id"] = res.inserted_id
-    return doc
+    return upsert_snapshot("executive_kpis", doc)
 
 
 def latest_executive_summary(station: Optional[str] = None) -> Optional[dict]:
-    scope = "station" if station and station.lower() not in ("all", "todas") else "global"
+    scope = "global" if station_registry.is_all(station) else "station"
     query = {"scope": scope}
     if scope == "station":
         query["station"] = station
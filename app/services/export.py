@@ -0,0 +1,173 @@
+"""Exportación en streaming de sesiones (CSV / NDJSON / Parquet).
+
+- Lee de un cursor de ``sessions`` con proyección de columnas y lotes de
+  ``EXPORT_BATCH_SIZE``: la memoria no depende del tamaño del rango.
+- CSV y NDJSON se emiten por bloques de texto; Parquet por row groups
+  (un ``write_table`` por lote) con ``pyarrow``, que es opcional.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+import os
+from datetime import datetime
+from typing import Iterator, Optional
+
+from app.database.database import sessions
+
+try:
+    EXPORT_BATCH_SIZE = max(100, int(os.getenv("EXPORT_BATCH_SIZE", "5000")))
+except ValueError:
+    EXPORT_BATCH_SIZE = 5000
+
+# Columnas exportables → tipo en Parquet ("str" | "int" | "float")
+EXPORT_FIELDS: dict[str, str] = {
+    "charge_id": "str",
+    "station": "str",
+    "charger_id": "str",
+    "user_code": "str",
+    "user_name": "str",
+    "session_start_at": "str",
+    "energy_Wh": "int",
+    "amount": "float",
+    "time_total": "float",
+    "time_charging": "float",
+}
+
+FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def parse_fields(fields: Optional[str]) -> list[str]:
+    """'a,b,c' → columnas válidas en ese orden; vacío → todas. ValueError si hay desconocidas."""
+    if not fields:
+        return list(EXPORT_FIELDS)
+    cols = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in cols if f not in EXPORT_FIELDS]
+    if unknown:
+        raise ValueError(f"Columnas no exportables: {', '.join(unknown)}")
+    return cols
+
+
+def _cursor(match: dict, cols: list[str]):
+    projection = {"_id": 0, **{c: 1 for c in cols}}
+    return sessions.find(match, projection, batch_size=EXPORT_BATCH_SIZE).sort("session_start_at", 1)
+
+
+def _batches(match: dict, cols: list[str]) -> Iterator[list[dict]]:
+    batch: list[dict] = []
+    for doc in _cursor(match, cols):
+        batch.append(doc)
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def iter_csv(match: dict, cols: list[str]) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(cols)
+    for batch in _batches(match, cols):
+        writer.writerows([_text(d.get(c)) for c in cols] for d in batch)
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+def iter_ndjson(match: dict, cols: list[str]) -> Iterator[bytes]:
+    for batch in _batches(match, cols):
+        lines = (json.dumps({c: d.get(c) for c in cols}, ensure_ascii=False, default=_text) for d in batch)
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def _coerce(value, kind: str):
+    if value is None or value == "":
+        return None
+    try:
+        if kind == "int":
+            return int(float(value))
+        if kind == "float":
+            return float(value)
+    except (TypeError, ValueError):
+        return None
+    return _text(value)
+
+
+class _ChunkSink(io.RawIOBase):
+    """Destino de escritura que acumula bytes para devolverlos por trozos."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+        self._pos = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        data = bytes(b)
+        self._chunks.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def drain(self) -> bytes:
+        out = b"".join(self._chunks)
+        self._chunks.clear()
+        return out
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def iter_parquet(match: dict, cols: list[str]) -> Iterator[bytes]:
+    """Un row group por lote del cursor; el footer va en el último trozo."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {"str": pa.string(), "int": pa.int64(), "float": pa.float64()}
+    schema = pa.schema([(c, types[EXPORT_FIELDS[c]]) for c in cols])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        for batch in _batches(match, cols):
+            table = pa.Table.from_pydict(
+                {c: [_coerce(d.get(c), EXPORT_FIELDS[c]) for d in batch] for c in cols},
+                schema=schema,
+            )
+            writer.write_table(table)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    tail = sink.drain()
+    if tail:
+        yield tail
+
+
+STREAMERS = {"csv": iter_csv, "ndjson": iter_ndjson, "parquet": iter_parquet}
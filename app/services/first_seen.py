@@ -0,0 +1,152 @@
+"""Índice de primera carga por usuario (colección ``user_first_seen``).
+
+Un documento por ``user_code``:
+
+    {user_code, first_seen, stations: {<estación>: datetime},
+     months: ["YYYY-MM", ...], station_months: {<estación>: [...]}}
+
+- Lo mantiene la sincronización (``record_sessions``) con ``$min`` / ``$addToSet``,
+  así que es idempotente aunque la misma página se procese varias veces.
+- ``backfill`` lo reconstruye desde las colecciones de sesiones (una vez).
+- Fechas en UTC naive, igual que ``session_start_at``.
+"""
+
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+
+from app.database.database import sessions, user_first_seen
+
+logger = logging.getLogger(__name__)
+
+
+def parse_start(value) -> Optional[datetime]:
+    """session_start_at (ISO, con o sin zona) → datetime UTC naive; None si no es válido."""
+    if isinstance(value, datetime):
+        dt = value
+    elif isinstance(value, str) and value:
+        try:
+            dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    else:
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def _update(station: str, first: datetime, months: Iterable[str]) -> dict:
+    months = sorted(set(months))
+    return {
+        "$min": {"first_seen": first, f"stations.{station}": first},
+        "$addToSet": {
+            "months": {"$each": months},
+            f"station_months.{station}": {"$each": months},
+        },
+    }
+
+
+def record_sessions(station: str, sessions: Iterable[dict]) -> int:
+    """Actualiza el índice con un lote de sesiones de una estación (una escritura por usuario)."""
+    firsts: Dict[str, datetime] = {}
+    months: Dict[str, set] = {}
+    for s in sessions:
+        code = s.get("user_code")
+        dt = parse_start(s.get("session_start_at"))
+        if not code or dt is None:
+            continue
+        if code not in firsts or dt < firsts[code]:
+            firsts[code] = dt
+        months.setdefault(code, set()).add(dt.strftime("%Y-%m"))
+    ops = [UpdateOne({"user_code": code}, _update(station, first, months[code]), upsert=True) for code, first in firsts.items()]
+    if ops:
+        user_first_seen.bulk_write(ops, ordered=False)
+    return len(ops)
+
+
+def backfill(batch_size: int = 1000) -> int:
+    """Reconstruye ``user_first_seen`` desde todas las sesiones (agregado en Mongo)."""
+    cursor = sessions.aggregate([
+        {"$match": {"user_code": {"$nin": [None, ""]}}},
+        {"$project": {"station": 1, "user_code": 1, "d": {"$dateFromString": {"dateString": "$session_start_at", "onError": None, "onNull": None}}}},
+        {"$match": {"d": {"$ne": None}}},
+        {"$group": {
+            "_id": {"u": "$user_code", "st": "$station"},
+            "first": {"$min": "$d"},
+            "months": {"$addToSet": {"$dateToString": {"format": "%Y-%m", "date": "$d"}}},
+        }},
+    ], allowDiskUse=True, batchSize=batch_size)
+    written = 0
+    ops: List[UpdateOne] = []
+    for row in cursor:
+        key = row["_id"]
+        ops.append(UpdateOne({"user_code": key["u"]}, _update(key["st"], row["first"], row["months"]), upsert=True))
+        if len(ops) >= batch_size:
+            user_first_seen.bulk_write(ops, ordered=False)
+            written += len(ops)
+            ops = []
+    if ops:
+        user_first_seen.bulk_write(ops, ordered=False)
+        written += len(ops)
+    logger.info(f"✅ user_first_seen: {written} actualizaciones (usuario × estación)")
+    return written
+
+
+def _fields(station: Optional[str]) -> tuple[str, str]:
+    """(campo de primera carga, campo de meses activos) para el alcance pedido."""
+    if station:
+        return f"stations.{station}", f"station_months.{station}"
+    return "first_seen", "months"
+
+
+def count_new_users(station: Optional[str], start: Optional[datetime], end: Optional[datetime]) -> int:
+    """Usuarios cuya primera carga (en el alcance) cae en [start, end); sin rango, todos."""
+    field, _ = _fields(station)
+    if start is None or end is None:
+        return user_first_seen.count_documents({field: {"$exists": True}})
+    return user_first_seen.count_documents({field: {"$gte": start, "$lt": end}})
+
+
+def _month_index(ym: str) -> int:
+    year, month = ym.split("-")
+    return int(year) * 12 + int(month) - 1
+
+
+def cohort_retention(station: Optional[str], months: int = 12, now: Optional[datetime] = None) -> List[dict]:
+    """
+    Cohortes mensuales por mes de primera carga × meses desde entonces.
+    - ``active[k]`` = usuarios de la cohorte con alguna carga en el mes k (k=0 es el de alta).
+    """
+    now = now or datetime.utcnow()
+    first_month = _month_index(now.strftime("%Y-%m")) - max(1, months) + 1
+    start = datetime(first_month // 12, first_month % 12 + 1, 1)
+    field, months_field = _fields(station)
+    rows = user_first_seen.aggregate([
+        {"$match": {field: {"$gte": start}}},
+        {"$project": {"cohort": {"$dateToString": {"format": "%Y-%m", "date": f"${field}"}}, "m": f"${months_field}"}},
+        {"$unwind": "$m"},
+        {"$group": {"_id": {"c": "$cohort", "m": "$m"}, "n": {"$sum": 1}}},
+    ])
+    grid: Dict[str, Dict[int, int]] = {}
+    for r in rows:
+        c, m = r["_id"]["c"], r["_id"]["m"]
+        k = _month_index(m) - _month_index(c)
+        if k >= 0:
+            grid.setdefault(c, {})[k] = r["n"]
+
+    out = []
+    last = _month_index(now.strftime("%Y-%m"))
+    for c in sorted(grid):
+        span = last - _month_index(c) + 1
+        active = [grid[c].get(k, 0) for k in range(span)]
+        size = active[0] if active else 0
+        out.append({
+            "cohort": c,
+            "size": size,
+            "active": active,
+            "retention_pct": [round(a / size * 100.0, 2) if size else 0.0 for a in active],
+        })
+    return out
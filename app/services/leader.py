@@ -0,0 +1,146 @@
+"""Elección de líder con un lease en MongoDB (colección ``leader_locks``).
+
+Con varias réplicas / workers de uvicorn solo el líder ejecuta los trabajos
+programados (sync Etecnic, pipelines, KPIs); el resto solo sirve lecturas.
+
+- Un documento por lease: ``{_id: nombre, owner, renewed_at, expires_at}``.
+- Se adquiere con un ``find_one_and_update`` condicional con upsert: si otro
+  dueño tiene el lease vigente el filtro no casa, el upsert choca con el
+  ``_id`` existente (DuplicateKeyError) y la instancia queda como seguidora.
+- Las fechas salen del reloj del servidor (``$$NOW``), no del de cada réplica.
+- Un hilo renueva cada ``ttl/3``; si el líder muere, otro toma el lease al
+  vencer (failover automático en ≤ ``LEADER_LEASE_TTL`` segundos, default 60).
+- ``LEADER_ELECTION=false`` desactiva la elección (la instancia siempre es líder).
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Callable, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderLease:
+    def __init__(self, name: str, ttl: Optional[int] = None, on_elected: Optional[Callable[[], None]] = None):
+        if ttl is None:
+            try:
+                ttl = int(os.getenv("LEADER_LEASE_TTL", "60"))
+            except Exception:
+                ttl = 60
+        self.name = name
+        self.ttl = max(5, ttl)
+        self.enabled = os.getenv("LEADER_ELECTION", "true").lower() == "true"
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.on_elected = on_elected
+        self._leader = not self.enabled
+        self._renewed = 0.0  # monotonic de la última renovación confirmada
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._coll = None
+
+    def _collection(self):
+        if self._coll is None:
+            from app.database.database import db
+            coll = db["leader_locks"]
+            # limpieza de leases vencidos; la lógica no depende del TTL monitor
+            coll.create_index("expires_at", expireAfterSeconds=0)
+            self._coll = coll
+        return self._coll
+
+    @property
+    def is_leader(self) -> bool:
+        if not self.enabled:
+            return True
+        # sin renovación reciente no nos consideramos líderes aunque el hilo no haya corrido
+        return self._leader and (time.monotonic() - self._renewed) < self.ttl
+
+    def try_acquire(self) -> bool:
+        """Adquiere o renueva el lease; devuelve si esta instancia es líder."""
+        if not self.enabled:
+            return True
+        was_leader = self.is_leader
+        t0 = time.monotonic()
+        try:
+            doc = self._collection().find_one_and_update(
+                {
+                    "_id": self.name,
+                    "$or": [
+                        {"owner": self.owner},
+                        {"$expr": {"$lt": ["$expires_at", "$$NOW"]}},
+                    ],
+                },
+                [{"$set": {
+                    "owner": self.owner,
+                    "renewed_at": "$$NOW",
+                    "expires_at": {"$add": ["$$NOW", self.ttl * 1000]},
+                }}],
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            self._leader = bool(doc and doc.get("owner") == self.owner)
+        except DuplicateKeyError:
+            self._leader = False
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo renovar el lease '{self.name}': {e}")
+            self._leader = False
+        if self._leader:
+            self._renewed = t0
+        if self._leader != was_leader:
+            logger.info(f"👑 Lease '{self.name}': {'líder' if self._leader else 'seguidor'} ({self.owner})")
+            if self._leader and self.on_elected is not None:
+                try:
+                    self.on_elected()
+                except Exception as e:
+                    logger.error(f"❌ Error en on_elected de '{self.name}': {e}")
+        return self._leader
+
+    def start(self) -> bool:
+        """Primer intento síncrono y luego heartbeat en segundo plano."""
+        if not self.enabled or self._thread is not None:
+            return self.is_leader
+        leader = self.try_acquire()
+        self._thread = threading.Thread(target=self._heartbeat, name=f"leader-{self.name}", daemon=True)
+        self._thread.start()
+        return leader
+
+    def _heartbeat(self) -> None:
+        interval = self.ttl / 3.0
+        while not self._stop.wait(interval):
+            self.try_acquire()
+
+    def stop(self) -> None:
+        """Detiene el heartbeat y libera el lease para que otra réplica lo tome ya."""
+        self._stop.set()
+        if not self.enabled:
+            return
+        try:
+            self._collection().delete_one({"_id": self.name, "owner": self.owner})
+        except Exception as e:
+            logger.debug(f"No se pudo liberar el lease '{self.name}': {e}")
+        self._leader = False
+
+    def status(self) -> dict:
+        holder = None
+        if self.enabled:
+            try:
+                holder = self._collection().find_one({"_id": self.name}, {"_id": 0})
+            except Exception:
+                holder = None
+        return {
+            "enabled": self.enabled,
+            "name": self.name,
+            "owner": self.owner,
+            "is_leader": self.is_leader,
+            "ttl_s": self.ttl,
+            "holder": holder,
+        }
+
+
+refresh_leader = LeaderLease("refresh")
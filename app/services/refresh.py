@@ -0,0 +1,202 @@
+"""Orquestador del refresco periódico (sync → estadísticas → KPIs ejecutivos).
+
+Las etapas forman un grafo de dependencias y cada una arranca en cuanto
+terminan las suyas:
+
+    sync:<estación>  ──►  stats:<estación>  ──┐
+          └─────────────►  global  ───────────┴──►  executive  ──►  retention
+
+- Una sola ejecución a la vez (single-flight): si llega otro disparo mientras
+  corre un refresco, se marca como pendiente y se ejecuta UNA vez al terminar
+  (los ticks perdidos se fusionan).
+- El fallo de una etapa se registra pero no detiene a las dependientes: igual
+  que antes, las estadísticas se recalculan con los datos que ya hay en Mongo.
+- ``status()`` expone duración y resultado por etapa de la última ejecución.
+"""
+
+import asyncio
+import copy
+import inspect
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from functools import partial
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from app.services import station_registry
+from app.services.sync_etecnic import sync_station
+from app.services.station_stats import run_station_pipeline
+from app.services.executive import materialize_all_scopes
+from app.stats_flow.pipeline import run_pipeline
+from app.database.database import compact_stats_collections
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Stage:
+    name: str
+    run: Callable[[], Any]  # corrutina o función síncrona (va a un hilo)
+    deps: List[str] = field(default_factory=list)
+
+
+def default_stages() -> List[Stage]:
+    """Grafo de etapas para las estaciones del registro en este momento."""
+    names = station_registry.names()
+    stages: List[Stage] = []
+    for st in names:
+        stages.append(Stage(f"sync:{st}", partial(sync_station, st)))
+        stages.append(Stage(f"stats:{st}", partial(run_station_pipeline, st), [f"sync:{st}"]))
+    stages.append(Stage("global", run_pipeline, [f"sync:{st}" for st in names]))
+    stages.append(Stage("executive", materialize_all_scopes, ["global"] + [f"stats:{st}" for st in names]))
+    stages.append(Stage("retention", compact_stats_collections, ["executive"]))
+    return stages
+
+
+class RefreshOrchestrator:
+    def __init__(self, stages: Optional[List[Stage]] = None):
+        # sin etapas fijas, el grafo se rehace en cada ejecución desde el registro
+        # de estaciones (una estación nueva entra en el siguiente refresco)
+        self._factory: Optional[Callable[[], List[Stage]]] = None if stages is not None else default_stages
+        self.stages: List[Stage] = []
+        self._order: List[Stage] = []
+        if stages is not None:
+            self._plan(stages)
+        self._lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._pending: Optional[str] = None
+        self._current: Optional[dict] = None
+        self._last: Optional[dict] = None
+        self.runs = 0
+        self.coalesced = 0
+
+    def _plan(self, stages: List[Stage]) -> None:
+        self._order = self._topological(stages)
+        self.stages = stages
+
+    @staticmethod
+    def _topological(stages: List[Stage]) -> List[Stage]:
+        names = {s.name for s in stages}
+        for s in stages:
+            missing = [d for d in s.deps if d not in names]
+            if missing:
+                raise ValueError(f"Etapa {s.name} depende de etapas inexistentes: {missing}")
+        order: List[Stage] = []
+        done: set = set()
+        pending = list(stages)
+        while pending:
+            ready = [s for s in pending if all(d in done for d in s.deps)]
+            if not ready:
+                raise ValueError(f"Ciclo en etapas de refresco: {[s.name for s in pending]}")
+            for s in ready:
+                order.append(s)
+                done.add(s.name)
+                pending.remove(s)
+        return order
+
+    # ---------- disparo ----------
+    def run(self, trigger: str = "manual") -> bool:
+        """Ejecuta el refresco completo (bloqueante).
+
+        Devuelve False si ya había uno en curso; en ese caso queda pendiente
+        una única re-ejecución que hará el hilo que tiene el turno.
+        """
+        if not self._lock.acquire(blocking=False):
+            with self._state_lock:
+                if self._pending is not None:
+                    self.coalesced += 1
+                self._pending = trigger
+            logger.info(f"⏭️ Refresco '{trigger}' fusionado con el que está en curso")
+            return False
+        try:
+            while trigger is not None:
+                self._run_once(trigger)
+                with self._state_lock:
+                    trigger, self._pending = self._pending, None
+        finally:
+            self._lock.release()
+        return True
+
+    def _run_once(self, trigger: str) -> None:
+        if self._factory is not None:
+            try:
+                self._plan(self._factory())
+            except Exception as e:
+                logger.error(f"❌ No se pudo armar el grafo de refresco: {e}")
+                if not self._order:
+                    return
+        run = {
+            "trigger": trigger,
+            "started_at": datetime.utcnow().isoformat(),
+            "finished_at": None,
+            "duration_s": None,
+            "ok": None,
+            # todas las claves existen desde aquí: status() copia este dict desde otro hilo
+            "stages": {
+                s.name: {"status": "waiting", "deps": list(s.deps), "started_at": None, "duration_s": None, "error": None}
+                for s in self.stages
+            },
+        }
+        with self._state_lock:
+            self._current = run
+        t0 = time.perf_counter()
+        logger.info(f"🔄 Refresco '{trigger}' iniciado")
+        try:
+            asyncio.run(self._run_graph(run["stages"]))
+        except Exception as e:
+            logger.error(f"❌ Error en refresco '{trigger}': {e}")
+        with self._state_lock:
+            run["duration_s"] = round(time.perf_counter() - t0, 3)
+            run["finished_at"] = datetime.utcnow().isoformat()
+            run["ok"] = all(st["status"] == "ok" for st in run["stages"].values())
+            self._current = None
+            self._last = run
+            self.runs += 1
+        logger.info(f"✅ Refresco '{trigger}' terminado en {run['duration_s']}s (ok={run['ok']})")
+
+    # ---------- grafo ----------
+    async def _run_graph(self, status: Dict[str, dict]) -> None:
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_stage(stage: Stage) -> None:
+            if stage.deps:
+                await asyncio.gather(*(tasks[d] for d in stage.deps))
+            info = status[stage.name]
+            self._update(info, status="running", started_at=datetime.utcnow().isoformat())
+            t0 = time.perf_counter()
+            try:
+                if inspect.iscoroutinefunction(stage.run):
+                    await stage.run()
+                else:
+                    await asyncio.to_thread(stage.run)
+                result = {"status": "ok"}
+            except Exception as e:
+                result = {"status": "error", "error": str(e)}
+                logger.error(f"❌ Error en etapa {stage.name}: {e}")
+            self._update(info, duration_s=round(time.perf_counter() - t0, 3), **result)
+
+        # en orden topológico, las dependencias de cada etapa ya tienen su task
+        for s in self._order:
+            tasks[s.name] = asyncio.create_task(run_stage(s))
+        await asyncio.gather(*tasks.values())
+
+    # ---------- estado ----------
+    def _update(self, info: dict, **fields) -> None:
+        with self._state_lock:
+            info.update(fields)
+
+    def status(self) -> dict:
+        with self._state_lock:
+            return {
+                "running": self._current is not None,
+                "pending": self._pending,
+                "runs": self.runs,
+                "coalesced": self.coalesced,
+                "current": copy.deepcopy(self._current),
+                "last": copy.deepcopy(self._last),
+            }
+
+
+refresh_orchestrator = RefreshOrchestrator()
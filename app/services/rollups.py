@@ -0,0 +1,389 @@
+"""Rollups de sesiones por estación en buckets de hora / día / mes (``session_rollups``).
+
+Documento: ``{_id: "<estación>|<unidad>|<inicio>", station, unit, ts, energy_Wh, sessions,
+occupied_s, peak_concurrency, built_at}``
+
+- Se construyen en Mongo con ``$dateTrunc`` + ``$merge`` (nada pasa por Python).
+- La sync reconstruye solo los días (y meses) que tocó; la primera vez, todo.
+- ``series`` lee los buckets, suma estaciones alineando arrays NumPy
+  (``np.add.at``) y rellena con ceros los huecos del rango.
+- Buckets en UTC, igual que ``session_start_at``.
+- Ocupación: cada sesión es el intervalo [inicio, inicio + ``time_total``); un
+  barrido (sweep-line) vectorizado con NumPy da por hora los segundos-conector
+  ocupados (``occupied_s``) y la concurrencia máxima (``peak_concurrency``).
+  Día y mes se agregan desde las horas (suma / máximo).
+- Cada reconstrucción incrementa la generación en ``rollup_meta``; las cachés
+  derivadas (p.ej. el resumen de CO2) se invalidan al cambiar.
+"""
+
+import logging
+import os
+from datetime import date, datetime, timedelta
+from typing import Iterable, List, Literal, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from pymongo import ReturnDocument, UpdateOne
+
+from app.database.database import ENERGY_WH_EXPR, rollup_meta, session_rollups, sessions
+from app.services.first_seen import parse_start
+
+logger = logging.getLogger(__name__)
+
+Unit = Literal["hour", "day", "month"]
+UNITS: Tuple[Unit, ...] = ("hour", "day", "month")
+_NP_UNIT = {"hour": "h", "day": "D", "month": "M"}
+_ID_FORMAT = {"hour": "%Y-%m-%dT%H", "day": "%Y-%m-%d", "month": "%Y-%m"}
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+# Segundos por unidad de `time_total` de Etecnic (minutos por defecto: ver
+# "Wh/min" en app/scripts/enrichment.py). Sesiones sin duración usan la media.
+SESSION_TIME_UNIT_SECONDS = _env_float("SESSION_TIME_UNIT_SECONDS", 60)
+SESSION_AVG_MINUTES = _env_float("SESSION_AVG_MINUTES", 45)
+# Tope de duración (sesiones "colgadas" no ocupan el conector días enteros)
+MAX_SESSION_HOURS = _env_float("MAX_SESSION_HOURS", 24)
+
+
+def _range_match(station: str, start: Optional[datetime], end: Optional[datetime]) -> dict:
+    match: dict = {"station": station}
+    if start is not None and end is not None:
+        match["session_start_at"] = {"$gte": start.isoformat(), "$lt": end.isoformat()}
+    return match
+
+
+def _build(station: str, unit: Unit, start: Optional[datetime], end: Optional[datetime]) -> None:
+    """(Re)construye los buckets ``unit`` de ``station`` en [start, end) (todo si no hay rango)."""
+    built_at = datetime.utcnow()
+    sessions.aggregate([
+        {"$match": _range_match(station, start, end)},
+        {"$project": {
+            "d": {"$dateFromString": {"dateString": "$session_start_at", "onError": None, "onNull": None}},
+            "e": ENERGY_WH_EXPR,
+        }},
+        {"$match": {"d": {"$ne": None}}},
+        {"$group": {
+            "_id": {"$dateTrunc": {"date": "$d", "unit": unit}},
+            "energy_Wh": {"$sum": "$e"},
+            "sessions": {"$sum": 1},
+        }},
+        {"$project": {
+            "_id": {"$concat": [station, "|", unit, "|", {"$dateToString": {"date": "$_id", "format": _ID_FORMAT[unit]}}]},
+            "station": {"$literal": station},
+            "unit": {"$literal": unit},
+            "ts": "$_id",
+            "energy_Wh": 1,
+            "sessions": 1,
+            "built_at": {"$literal": built_at},
+        }},
+        {"$merge": {"into": session_rollups.name, "on": "_id", "whenMatched": "merge", "whenNotMatched": "insert"}},
+    ], allowDiskUse=True)
+    # buckets del rango que ya no tienen sesiones
+    stale = {"station": station, "unit": unit, "built_at": {"$lt": built_at}}
+    if start is not None and end is not None:
+        stale["ts"] = {"$gte": start, "$lt": end}
+    session_rollups.delete_many(stale)
+
+
+# ==========================
+# Ocupación (sweep-line)
+# ==========================
+def _duration_s(value) -> float:
+    try:
+        dur = float(value) * SESSION_TIME_UNIT_SECONDS
+    except (TypeError, ValueError):
+        dur = 0.0
+    if dur <= 0:
+        dur = SESSION_AVG_MINUTES * 60
+    return min(dur, MAX_SESSION_HOURS * 3600)
+
+
+def _epoch_s(dt: datetime) -> int:
+    return int(np.datetime64(dt, "s").astype(np.int64))
+
+
+def _intervals(station, start: Optional[datetime], end: Optional[datetime]) -> Tuple[np.ndarray, np.ndarray]:
+    """(inicios, fines) en segundos epoch de las sesiones (de una estación o de varias) que pueden solapar [start, end)."""
+    query: dict = {"station": station if isinstance(station, str) else {"$in": list(station)}}
+    if start is not None and end is not None:
+        lookback = start - timedelta(hours=MAX_SESSION_HOURS)
+        query["session_start_at"] = {"$gte": lookback.isoformat(), "$lt": end.isoformat()}
+    starts: List[datetime] = []
+    durations: List[float] = []
+    for d in sessions.find(query, {"_id": 0, "session_start_at": 1, "time_total": 1}, batch_size=5000):
+        dt = parse_start(d.get("session_start_at"))
+        if dt is not None:
+            starts.append(dt)
+            durations.append(_duration_s(d.get("time_total")))
+    if not starts:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    s = np.array(starts, dtype="datetime64[s]").astype(np.int64)
+    return s, s + np.asarray(durations).astype(np.int64)
+
+
+def sweep_hours(starts: np.ndarray, ends: np.ndarray, lo: int, hi: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Barrido sobre intervalos [inicio, fin) (segundos epoch) para las horas de [lo, hi).
+    - lo/hi alineados a hora. Devuelve (segundos ocupados, concurrencia máxima) por hora.
+    - En empates se procesan antes los fines: una sesión que termina cuando otra
+      empieza no cuenta como solape.
+    """
+    n_hours = (hi - lo) // 3600
+    keep = ends > starts
+    times = np.concatenate([starts[keep], ends[keep]])
+    delta = np.concatenate([np.ones(keep.sum(), dtype=np.int64), -np.ones(keep.sum(), dtype=np.int64)])
+    order = np.lexsort((delta, times))
+    t, level = times[order], np.cumsum(delta[order])
+
+    def level_at(points: np.ndarray) -> np.ndarray:
+        if not len(t):
+            return np.zeros(len(points), dtype=np.int64)
+        i = np.searchsorted(t, points, side="right") - 1
+        return np.where(i >= 0, level[np.maximum(i, 0)], 0)
+
+    bounds = lo + 3600 * np.arange(n_hours + 1, dtype=np.int64)
+    peak = level_at(bounds[:-1])
+    inside = (t >= lo) & (t < hi)
+    np.maximum.at(peak, (t[inside] - lo) // 3600, level[inside])
+
+    # integral del nivel: tramos entre eventos y cortes de hora
+    pts = np.union1d(t[inside], bounds)
+    occupied = np.bincount((pts[:-1] - lo) // 3600, weights=level_at(pts[:-1]) * np.diff(pts), minlength=n_hours)
+    return occupied.astype(np.int64), peak.astype(np.int64)
+
+
+def _occupancy(station: str, start: Optional[datetime], end: Optional[datetime]) -> Tuple[datetime, datetime]:
+    """Recalcula ``occupied_s``/``peak_concurrency`` de las horas de [start, end); devuelve el rango cubierto."""
+    s, e = _intervals(station, start, end)
+    if start is None or end is None:
+        if not len(s):
+            return datetime.utcnow(), datetime.utcnow()
+        lo, hi = int(s.min()) // 3600 * 3600, -(-int(e.max()) // 3600) * 3600
+        start = datetime.utcfromtimestamp(lo)
+        end = datetime.utcfromtimestamp(hi)
+    else:
+        lo, hi = _epoch_s(start), _epoch_s(end)
+    occupied, peak = sweep_hours(s, e, lo, hi)
+
+    built_at = datetime.utcnow()
+    session_rollups.update_many(
+        {"station": station, "unit": "hour", "ts": {"$gte": start, "$lt": end}},
+        {"$set": {"occupied_s": 0, "peak_concurrency": 0}},
+    )
+    ops = []
+    for k in np.flatnonzero((occupied > 0) | (peak > 0)).tolist():
+        ts = datetime.utcfromtimestamp(lo + 3600 * k)
+        ops.append(UpdateOne(
+            {"_id": f"{station}|hour|{ts.strftime(_ID_FORMAT['hour'])}"},
+            {
+                "$set": {"occupied_s": int(occupied[k]), "peak_concurrency": int(peak[k]), "built_at": built_at},
+                "$setOnInsert": {"station": station, "unit": "hour", "ts": ts, "energy_Wh": 0, "sessions": 0},
+            },
+            upsert=True,
+        ))
+    for i in range(0, len(ops), 1000):
+        session_rollups.bulk_write(ops[i:i + 1000], ordered=False)
+    return start, end
+
+
+def peak_concurrency(stations: Sequence[str], start: datetime, end: datetime) -> int:
+    """
+    Máximo de sesiones simultáneas en [start, end) sobre el conjunto de ``stations``.
+    - Una estación: máximo de los rollups horarios ya calculados.
+    - Varias: barrido sobre los intervalos combinados (el pico de la red no es
+      el máximo de los picos de cada estación).
+    """
+    if not stations:
+        return 0
+    if len(stations) == 1:
+        return total(stations, start, end, field="peak_concurrency", op="$max")
+    lo = _epoch_s(start) // 3600 * 3600
+    hi = -(-_epoch_s(end) // 3600) * 3600
+    s, e = _intervals(stations, start, end)
+    _, peak = sweep_hours(s, e, lo, hi)
+    return int(peak.max()) if len(peak) else 0
+
+
+def _roll_occupancy(station: str, unit: Unit, start: Optional[datetime], end: Optional[datetime]) -> None:
+    """Ocupación de día/mes a partir de las horas: suma de segundos y máximo de concurrencia."""
+    match: dict = {"station": station, "unit": "hour"}
+    reset: dict = {"station": station, "unit": unit}
+    if start is not None and end is not None:
+        match["ts"] = {"$gte": start, "$lt": end}
+        reset["ts"] = {"$gte": start, "$lt": end}
+    session_rollups.update_many(reset, {"$set": {"occupied_s": 0, "peak_concurrency": 0}})
+    session_rollups.aggregate([
+        {"$match": match},
+        {"$group": {
+            "_id": {"$dateTrunc": {"date": "$ts", "unit": unit}},
+            "occupied_s": {"$sum": "$occupied_s"},
+            "peak_concurrency": {"$max": "$peak_concurrency"},
+        }},
+        {"$project": {
+            "_id": {"$concat": [station, "|", unit, "|", {"$dateToString": {"date": "$_id", "format": _ID_FORMAT[unit]}}]},
+            "station": {"$literal": station},
+            "unit": {"$literal": unit},
+            "ts": "$_id",
+            "occupied_s": 1,
+            "peak_concurrency": 1,
+        }},
+        {"$merge": {"into": session_rollups.name, "on": "_id", "whenMatched": "merge", "whenNotMatched": "insert"}},
+    ], allowDiskUse=True)
+
+
+def _day_intervals(days: Iterable[date]) -> List[Tuple[datetime, datetime]]:
+    """Agrupa días sueltos en intervalos [inicio, fin) de días consecutivos."""
+    out: List[Tuple[datetime, datetime]] = []
+    for d in sorted(set(days)):
+        start = datetime(d.year, d.month, d.day)
+        if out and out[-1][1] == start:
+            out[-1] = (out[-1][0], start + timedelta(days=1))
+        else:
+            out.append((start, start + timedelta(days=1)))
+    return out
+
+
+def _month_bounds(d: date) -> Tuple[datetime, datetime]:
+    start = datetime(d.year, d.month, 1)
+    end = datetime(d.year + (d.month == 12), d.month % 12 + 1, 1)
+    return start, end
+
+
+def _months_between(start: datetime, end: datetime) -> List[Tuple[int, int]]:
+    """Meses (año, mes) que toca el intervalo [start, end), ambos extremos incluidos."""
+    last = end - timedelta(microseconds=1)
+    out = []
+    y, m = start.year, start.month
+    while (y, m) <= (last.year, last.month):
+        out.append((y, m))
+        y, m = y + (m == 12), m % 12 + 1
+    return out
+
+
+def generation() -> int:
+    doc = rollup_meta.find_one({"_id": "generation"}, {"value": 1})
+    return int((doc or {}).get("value", 0))
+
+
+def _bump_generation() -> int:
+    doc = rollup_meta.find_one_and_update(
+        {"_id": "generation"},
+        {"$inc": {"value": 1}, "$set": {"updated_at": datetime.utcnow()}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return int(doc["value"])
+
+
+def has_rollups(station: str) -> bool:
+    return session_rollups.count_documents({"station": station}, limit=1) > 0
+
+
+def refresh_station(station: str, days: Optional[Set[date]] = None) -> None:
+    """Reconstruye los rollups de los días tocados (y sus meses); ``None`` = reconstrucción completa."""
+    if days is None:
+        for unit in UNITS:
+            _build(station, unit, None, None)
+        _occupancy(station, None, None)
+        _roll_occupancy(station, "day", None, None)
+        _roll_occupancy(station, "month", None, None)
+        _bump_generation()
+        logger.info(f"✅ Rollups {station}: reconstrucción completa")
+        return
+    if not days:
+        return
+    months = set()
+    for start, end in _day_intervals(days):
+        _build(station, "hour", start, end)
+        _build(station, "day", start, end)
+        # las sesiones que cruzan la medianoche ocupan horas del día siguiente
+        occ_end = end + timedelta(days=1)
+        _occupancy(station, start, occ_end)
+        _roll_occupancy(station, "day", start, occ_end)
+        months.update(_months_between(start, occ_end))
+    for month in {(d.year, d.month) for d in days}:
+        _build(station, "month", *_month_bounds(date(month[0], month[1], 1)))
+    for year, month in months:
+        _roll_occupancy(station, "month", *_month_bounds(date(year, month, 1)))
+    _bump_generation()
+    logger.info(f"✅ Rollups {station}: {len(days)} días actualizados")
+
+
+# ==========================
+# Lectura
+# ==========================
+def _floor(dt: datetime, unit: Unit) -> np.datetime64:
+    return np.datetime64(dt, _NP_UNIT[unit])
+
+
+def series(
+    stations: Sequence[str],
+    unit: Unit,
+    start: Optional[datetime],
+    end: Optional[datetime],
+    field: str = "energy_Wh",
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Serie continua (timestamps datetime64, valores int64) de ``field`` sumado entre estaciones.
+    - Con rango, cubre [start, end) completo; sin rango, del primer al último bucket con datos.
+    - Si el rango es más corto que la unidad (p.ej. mes pedido para un día), se leen
+      buckets diarios y se agrupan a la unidad pedida.
+    """
+    src: Unit = unit
+    if unit == "month" and start is not None and end is not None and (end - start) < timedelta(days=28):
+        src = "day"
+    query: dict = {"station": {"$in": list(stations)}, "unit": src}
+    if start is not None and end is not None:
+        query["ts"] = {"$gte": start, "$lt": end}
+    ts_list: List[datetime] = []
+    values: List[int] = []
+    for r in session_rollups.find(query, {"_id": 0, "ts": 1, field: 1}):
+        ts_list.append(r["ts"])
+        values.append(int(r.get(field) or 0))
+
+    np_unit = _NP_UNIT[unit]
+    if start is not None and end is not None:
+        lo = _floor(start, unit)
+        hi = _floor(end - timedelta(microseconds=1), unit) + 1
+    elif ts_list:
+        lo = _floor(min(ts_list), unit)
+        hi = _floor(max(ts_list), unit) + 1
+    else:
+        return np.array([], dtype=f"datetime64[{np_unit}]"), np.array([], dtype=np.int64)
+
+    grid = np.arange(lo, hi)
+    out = np.zeros(len(grid), dtype=np.int64)
+    if ts_list:
+        idx = (np.array(ts_list, dtype="datetime64[us]").astype(f"datetime64[{np_unit}]") - lo).astype(np.int64)
+        ok = (idx >= 0) & (idx < len(grid))
+        np.add.at(out, idx[ok], np.asarray(values, dtype=np.int64)[ok])
+    return grid, out
+
+
+def total(
+    stations: Sequence[str],
+    start: Optional[datetime],
+    end: Optional[datetime],
+    field: str = "energy_Wh",
+    op: Literal["$sum", "$max"] = "$sum",
+) -> int:
+    """Suma (o máximo) de ``field`` en [start, end) (todo si no hay rango); los filtros van alineados a días."""
+    query: dict = {"station": {"$in": list(stations)}, "unit": "month"}
+    if start is not None and end is not None:
+        query.update(unit="day", ts={"$gte": start, "$lt": end})
+    rows = list(session_rollups.aggregate([
+        {"$match": query},
+        {"$group": {"_id": None, "v": {op: f"${field}"}}},
+    ]))
+    return int(rows[0]["v"] or 0) if rows else 0
+
+
+def iso_timestamps(grid: np.ndarray) -> List[str]:
+    """datetime64 → 'YYYY-MM-DDTHH:MM:SS' (mismo formato que ``datetime.isoformat()``)."""
+    return grid.astype("datetime64[s]").astype(str).tolist()
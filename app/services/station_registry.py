@@ -0,0 +1,119 @@
+"""Registro de estaciones (colección ``stations``).
+
+Un documento por estación:
+
+    {_id: <nombre>, chargers: [id Etecnic, ...], connectors: int, active: bool}
+
+No hay zona horaria por estación: los hábitos usan ``STATS_TIMEZONE`` (global)
+y los rollups van en UTC.
+
+- Las sesiones de todas las estaciones viven en ``sessions`` con el campo
+  ``station``; "todas" es una sola consulta con ``station: {$in: [...]}``.
+- Sync, estadísticas y KPIs recorren el registro; añadir una estación es
+  insertar su documento (sin tocar código).
+- Se lee con una caché corta (``STATION_REGISTRY_TTL``, 60 s por defecto).
+- Si la colección está vacía se siembra con las estaciones históricas.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import List, Optional
+
+from pymongo import UpdateOne
+
+from app.database.database import stations
+
+logger = logging.getLogger(__name__)
+
+try:
+    STATION_REGISTRY_TTL = float(os.getenv("STATION_REGISTRY_TTL", "60"))
+except ValueError:
+    STATION_REGISTRY_TTL = 60.0
+
+ALL_ALIASES = ("all", "todas", "todas las estaciones")
+
+
+def _env_int(name: str, default: int = 0) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+# Estaciones que antes estaban fijas en el código (semilla del registro)
+DEFAULT_STATIONS = [
+    {"_id": "Portobelo", "chargers": [31033, 31150], "connectors": _env_int("CONNECTORS_PORTOBELO"), "active": True},
+    {"_id": "Salvio", "chargers": [31726, 31727], "connectors": _env_int("CONNECTORS_SALVIO"), "active": True},
+]
+
+_lock = threading.Lock()
+_cache: List[dict] = []
+_cache_at = 0.0
+
+
+def seed_defaults() -> int:
+    """Inserta las estaciones por defecto que falten ($setOnInsert: no pisa ediciones)."""
+    ops = [
+        UpdateOne({"_id": d["_id"]}, {"$setOnInsert": {k: v for k, v in d.items() if k != "_id"}}, upsert=True)
+        for d in DEFAULT_STATIONS
+    ]
+    result = stations.bulk_write(ops, ordered=False)
+    if result.upserted_count:
+        logger.info(f"✅ Registro de estaciones: {result.upserted_count} estaciones sembradas")
+    invalidate()
+    return result.upserted_count
+
+
+def invalidate() -> None:
+    global _cache_at
+    with _lock:
+        _cache_at = 0.0
+
+
+def all_stations() -> List[dict]:
+    """Estaciones activas, ordenadas por nombre (caché de ``STATION_REGISTRY_TTL`` s)."""
+    global _cache, _cache_at
+    with _lock:
+        if _cache and time.monotonic() - _cache_at < STATION_REGISTRY_TTL:
+            return _cache
+    docs = list(stations.find({"active": {"$ne": False}}).sort("_id", 1))
+    if not docs:
+        seed_defaults()
+        docs = list(stations.find({"active": {"$ne": False}}).sort("_id", 1))
+    with _lock:
+        _cache, _cache_at = docs, time.monotonic()
+    return docs
+
+
+def names() -> List[str]:
+    return [d["_id"] for d in all_stations()]
+
+
+def get(name: str) -> Optional[dict]:
+    for d in all_stations():
+        if d["_id"] == name:
+            return d
+    return None
+
+
+def is_all(station: Optional[str]) -> bool:
+    return not station or station.lower() in ALL_ALIASES
+
+
+def resolve(station: Optional[str]) -> List[str]:
+    """'all'/None → todas las estaciones; nombre registrado → [nombre]; desconocida → []."""
+    if is_all(station):
+        return names()
+    return [station] if get(station) is not None else []
+
+
+def session_match(station: Optional[str]) -> Optional[dict]:
+    """Filtro de ``sessions`` para el alcance pedido; None si la estación no existe."""
+    scope = resolve(station)
+    if not scope:
+        return None
+    if len(scope) == 1:
+        return {"station": scope[0]}
+    return {"station": {"$in": scope}}
@@ -1,26 +1,18 @@
 # station_stats.py
 from datetime import datetime, timedelta
-from pymongo.collection import Collection
 from app.database.database import (
-    sessions_Portobelo,
-    sessions_Salvio,
+    aggregate_sessions,
     insert_station_stats,
-    get_last_station_stats,
+    iter_user_totals,
+    upsert_user_classifications,
 )
 from app.client.etecnic_client import get_user_id_from_code, get_user_info
+from app.services import station_registry
 from app.stats_flow.classifier import classify_single_vehicle
 import logging
 
 logger = logging.getLogger(__name__)
 
-# ==========================
-# Mapear estaciones a colecciones
-# ==========================
-STATION_COLLECTIONS: dict[str, Collection] = {
-    "Portobelo": sessions_Portobelo,
-    "Salvio": sessions_Salvio,
-}
-
 def _date_filter(filter: str):
     """Genera filtro de fecha según total, mes o día"""
     now = datetime.utcnow()
@@ -42,14 +34,13 @@ def _date_filter(filter: str):
 
 def get_station_summary(station_name: str, filter: str):
     """Resumen de cargas de una estación"""
-    collection = STATION_COLLECTIONS.get(station_name)
-    if collection is None:
+    scope = station_registry.session_match(station_name)
+    if scope is None:
         return {"error": f"Estación {station_name} no soportada."}
 
-    query = _date_filter(filter)
+    query = {**scope, **_date_filter(filter)}
 
     pipeline = [
-        {"$match": query},
         {
             "$group": {
                 "_id": None,
@@ -61,7 +52,7 @@ def get_station_summary(station_name: str, filter: str):
         }
     ]
 
-    result = list(collection.aggregate(pipeline))
+    result = list(aggregate_sessions(query, pipeline))
     if not result:
         return {"total_cargas": 0, "total_usuarios": 0, "total_energy_Wh": 0}
 
@@ -75,14 +66,13 @@ def get_station_summary(station_name: str, filter: str):
 
 def get_user_summary(station_name: str, filter: str):
     """Estadísticas por usuario en una estación"""
-    collection = STATION_COLLECTIONS.get(station_name)
-    if collection is None:
+    scope = station_registry.session_match(station_name)
+    if scope is None:
         return {"usuarios": []}
 
-    query = _date_filter(filter)
+    query = {**scope, **_date_filter(filter)}
 
     pipeline = [
-        {"$match": query},
         {
             "$group": {
                 "_id": "$user_code",
@@ -95,7 +85,7 @@ def get_user_summary(station_name: str, filter: str):
         {"$sort": {"total_cargas": -1}}
     ]
 
-    return list(collection.aggregate(pipeline))
+    return list(aggregate_sessions(query, pipeline))
 
 
 # ==========================
@@ -107,18 +97,19 @@ async def run_station_pipeline(station_name: str, filter: str = "total") -> dict
     para obtener marca/modelo, clasifica (EV/PHEV/unclassified) y guarda en Mongo.
     Devuelve el documento insertado.
     """
-    collection = STATION_COLLECTIONS.get(station_name)
-    if collection is None:
+    scope = station_registry.session_match(station_name)
+    if scope is None:
         raise ValueError(f"Estación {station_name} no soportada")
 
     # Filtrado temporal opcional
-    query = _date_filter(filter)
-    sessions = list(collection.find(query))
-
-    total_cargas = len(sessions)
-    total_energy_Wh = sum(int(s.get("energy_Wh", 0)) for s in sessions if s.get("energy_Wh"))
-
-    user_codes = {s.get("user_code") for s in sessions if s.get("user_code")}
+    query = {**scope, **_date_filter(filter)}
+    total_cargas = total_energy_Wh = 0
+    user_codes = []
+    for row in iter_user_totals(query):
+        total_cargas += row["sessions"]
+        total_energy_Wh += row["energy_Wh"]
+        if row["_id"]:
+            user_codes.append(row["_id"])
 
     details = []
     ev_count = phev_count = unclassified_count = 0
@@ -152,12 +143,12 @@ async def run_station_pipeline(station_name: str, filter: str = "total") -> dict
         except Exception as e:
             logger.error(f"❌ Error en {station_name} con user_code {code}: {e}")
 
+    upsert_user_classifications(details, station=station_name)
     doc = insert_station_stats(
         station=station_name,
         ev_count=ev_count,
         phev_count=phev_count,
         unclassified_count=unclassified_count,
-        details=details,
         total_cargas=total_cargas,
         total_usuarios=len(user_codes),
         total_energy_Wh=total_energy_Wh,
@@ -170,32 +161,31 @@ async def run_station_pipeline(station_name: str, filter: str = "total") -> dict
 def get_station_vehicle_counts(station_name: str, filter: str) -> dict:
     """
     Devuelve conteos EV/PHEV/unclassified para una estación y rango de tiempo.
-    Usa el set de user_codes del rango y los detalla con la última clasificación disponible.
+    Agrupa los user_codes del rango y los cruza ($lookup) con `user_classification`.
     """
-    collection = STATION_COLLECTIONS.get(station_name)
-    if collection is None:
-        return {"ev_count": 0, "phev_count": 0, "unclassified_count": 0}
-
-    # Usuarios en el rango solicitado
-    query = _date_filter(filter)
-    user_codes = {s.get("user_code") for s in collection.find(query) if s.get("user_code")}
-
-    if not user_codes:
+    scope = station_registry.session_match(station_name)
+    if scope is None:
         return {"ev_count": 0, "phev_count": 0, "unclassified_count": 0}
 
-    # Preferir último doc del mismo filtro; si no, usar el último disponible
-    last = get_last_station_stats(station_name, filter) or get_last_station_stats(station_name)
-    details = (last or {}).get("details", [])
-    by_code = {d.get("user_code"): d for d in details}
-
+    query = {**scope, **_date_filter(filter)}
+    pipeline = [
+        {"$group": {"_id": "$user_code"}},
+        {"$match": {"_id": {"$nin": [None, ""]}}},
+        {"$lookup": {
+            "from": "user_classification",
+            "localField": "_id",
+            "foreignField": "user_code",
+            "as": "c",
+        }},
+        {"$group": {"_id": {"$arrayElemAt": ["$c.category", 0]}, "n": {"$sum": 1}}},
+    ]
     ev = phev = unclassified = 0
-    for code in user_codes:
-        cat = (by_code.get(code) or {}).get("category")
-        if cat == "EV":
-            ev += 1
-        elif cat == "PHEV":
-            phev += 1
+    for row in aggregate_sessions(query, pipeline):
+        if row["_id"] == "EV":
+            ev += row["n"]
+        elif row["_id"] == "PHEV":
+            phev += row["n"]
         else:
-            unclassified += 1
+            unclassified += row["n"]
 
     return {"ev_count": ev, "phev_count": phev, "unclassified_count": unclassified}
@@ -1,11 +1,10 @@
 from __future__ import annotations
 
+import threading
 from datetime import datetime, timedelta
-from typing import Literal, Iterable
+from typing import Literal
 
-from pymongo.collection import Collection
-
-from app.database.database import sessions_Portobelo, sessions_Salvio
+from app.services import rollups, station_registry
 
 
 # ==========================
@@ -30,14 +29,8 @@ EV_KM_PER_KWH = _get_env_float("EV_EFFICIENCY_KM_PER_KWH", 6.0)
 
 
 # ==========================
-# Utilidades de tiempo y colecciones
+# Utilidades de tiempo
 # ==========================
-STATION_COLLECTIONS: dict[str, Collection] = {
-    "Portobelo": sessions_Portobelo,
-    "Salvio": sessions_Salvio,
-}
-
-
 def _date_bounds_for_filter(filter: str) -> tuple[datetime | None, datetime | None]:
     now = datetime.utcnow()
     if filter == "mes":
@@ -71,71 +64,30 @@ def _unit_for_period(period: str, default_for_filter: str | None = None) -> Lite
     return "month"
 
 
-def _aggregate_energy_per(collection: Collection, start: datetime | None, end: datetime | None, unit: Literal["hour", "day", "month"]) -> list[dict]:
-    match: dict = {}
-    if start and end:
-        match = {
-            "session_start_at": {"$gte": start.isoformat(), "$lt": end.isoformat()}
-        }
-    pipeline = [
-        {"$match": match},
-        {
-            "$addFields": {
-                "_start": {"$toDate": "$session_start_at"},
-                "_energy": {"$toInt": {"$ifNull": ["$energy_Wh", 0]}},
-            }
-        },
-        {
-            "$group": {
-                "_id": {"$dateTrunc": {"date": "$_start", "unit": unit}},
-                "energy_Wh": {"$sum": "$_energy"},
-            }
-        },
-        {"$sort": {"_id": 1}},
-    ]
-    return list(collection.aggregate(pipeline))
-
-
-def _merge_timeseries(rows_list: Iterable[list[dict]]) -> list[dict]:
-    buckets: dict[datetime, int] = {}
-    for rows in rows_list:
-        for r in rows:
-            ts = r.get("_id")
-            val = int(r.get("energy_Wh", 0) or 0)
-            if isinstance(ts, datetime):
-                buckets[ts] = buckets.get(ts, 0) + val
-    out = [{"period_start": k.isoformat(), "energy_Wh": v} for k, v in buckets.items()]
-    out.sort(key=lambda x: x["period_start"])  # ascending
-    return out
-
-
-def get_energy_series(station: str, filter: str = "total", period: str | None = None) -> dict:
+def get_energy_series(
+    station: str,
+    filter: str = "total",
+    period: str | None = None,
+    format: Literal["rows", "columnar"] = "rows",
+) -> dict:
+    """
+    Serie de energía por bucket leída de ``session_rollups`` (ver app.services.rollups).
+    - Buckets sin sesiones salen con 0: la serie cubre el rango completo del filtro.
+    - format=rows: ``{"series": [{"period_start", "energy_Wh"}]}``.
+    - format=columnar: ``{"unit", "timestamps": [...], "values": [...]}``.
+    """
     start, end = _date_bounds_for_filter(filter)
     unit = _unit_for_period(period or "", default_for_filter=filter)
+    stations = station_registry.resolve(station)
+    if stations:
+        grid, values = rollups.series(stations, unit, start, end)
+        timestamps, values = rollups.iso_timestamps(grid), values.tolist()
+    else:
+        timestamps, values = [], []
 
-    if station and station not in ("all", "todas", "todas las estaciones"):
-        coll = STATION_COLLECTIONS.get(station)
-        if coll is None:
-            return {"series": []}
-        rows = _aggregate_energy_per(coll, start, end, unit)
-        return {"series": _merge_timeseries([rows])}
-
-    # all stations: merge both
-    rows_a = _aggregate_energy_per(sessions_Portobelo, start, end, unit)
-    rows_b = _aggregate_energy_per(sessions_Salvio, start, end, unit)
-    return {"series": _merge_timeseries([rows_a, rows_b])}
-
-
-def _sum_energy_wh(collection: Collection, start: datetime | None, end: datetime | None) -> int:
-    match: dict = {}
-    if start and end:
-        match = {"session_start_at": {"$gte": start.isoformat(), "$lt": end.isoformat()}}
-    pipeline = [
-        {"$match": match},
-        {"$group": {"_id": None, "energy_Wh": {"$sum": {"$toInt": {"$ifNull": ["$energy_Wh", 0]}}}}},
-    ]
-    rows = list(collection.aggregate(pipeline))
-    return int((rows[0] or {}).get("energy_Wh", 0)) if rows else 0
+    if format == "columnar":
+        return {"unit": unit, "timestamps": timestamps, "values": values}
+    return {"series": [{"period_start": t, "energy_Wh": v} for t, v in zip(timestamps, values)]}
 
 
 def compute_co2_equivalents(total_energy_Wh: int) -> dict:
@@ -157,19 +109,49 @@ def compute_co2_equivalents(total_energy_Wh: int) -> dict:
     }
 
 
-def get_energy_summary(station: str, filter: str = "total") -> dict:
-    start, end = _date_bounds_for_filter(filter)
-    if station and station not in ("all", "todas", "todas las estaciones"):
-        coll = STATION_COLLECTIONS.get(station)
-        if coll is None:
-            total_wh = 0
-        else:
-            total_wh = _sum_energy_wh(coll, start, end)
-    else:
-        total_wh = _sum_energy_wh(sessions_Portobelo, start, end) + _sum_energy_wh(sessions_Salvio, start, end)
+# Resúmenes por (estación, filtro, inicio del rango) válidos para una generación de rollups
+SUMMARY_FILTERS = ("total", "mes", "diario")
+_summary_cache: dict[tuple, dict] = {}
+_summary_generation = -1
+_summary_lock = threading.Lock()
+
 
-    co2 = compute_co2_equivalents(total_wh)
+def _summary(stations: list[str], start: datetime | None, end: datetime | None) -> dict:
+    total_wh = rollups.total(stations, start, end) if stations else 0
     return {
         "total_energy_Wh": total_wh,
-        **co2,
+        **compute_co2_equivalents(total_wh),
+    }
+
+
+def get_energy_summary(station: str, filter: str = "total", gen: int | None = None) -> dict:
+    """Energía total (de ``session_rollups``) + equivalentes CO2; cacheado por generación de rollups."""
+    global _summary_generation
+    start, end = _date_bounds_for_filter(filter)
+    stations = station_registry.resolve(station)
+    gen = rollups.generation() if gen is None else gen
+    key = (tuple(stations), start, end)  # 'mes' y 'diario' empiezan igual el día 1
+    with _summary_lock:
+        if gen != _summary_generation:
+            _summary_cache.clear()
+            _summary_generation = gen
+        cached = _summary_cache.get(key)
+    if cached is not None:
+        return dict(cached)
+    summary = _summary(stations, start, end)
+    with _summary_lock:
+        if gen == _summary_generation:
+            _summary_cache[key] = summary
+    return dict(summary)
+
+
+def get_energy_summaries() -> dict:
+    """Resúmenes de todas las estaciones (y 'all') para todos los filtros, en una sola llamada."""
+    gen = rollups.generation()
+    return {
+        "generation": gen,
+        "stations": {
+            st: {f: get_energy_summary(st, f, gen=gen) for f in SUMMARY_FILTERS}
+            for st in ["all", *station_registry.names()]
+        },
     }
@@ -1,32 +1,77 @@
-from app.database.database import sessions_Portobelo, sessions_Salvio
-from app.client.etecnic_client import get_charger_charges
+import asyncio
 import logging
+from datetime import date
+from typing import List, Optional, Set, Tuple
+
+import httpx
+from pymongo import UpdateOne
+
+from app.database.database import sessions
+from app.client.etecnic_client import iter_charger_pages
+from app.services import energy_stats, first_seen, rollups, station_registry
+
+
+def _upsert_page(station: str, charges: List[dict], charger_id: Optional[int] = None) -> Tuple[int, Set[date]]:
+    """Upsert por ``charge_id`` de una página de sesiones (un solo bulk_write) y
+    actualización de los índices derivados por usuario.
+
+    Devuelve (sesiones upsertadas, días tocados): si la página no cambió nada
+    en Mongo, no hay días que recalcular en los rollups.
+    """
+    extra = {"station": station} if charger_id is None else {"station": station, "charger_id": charger_id}
+    synced = [{**s, **extra} for s in charges if "charge_id" in s]
+    if not synced:
+        return 0, set()
+    result = sessions.bulk_write(
+        [UpdateOne({"station": station, "charge_id": s["charge_id"]}, {"$set": s}, upsert=True) for s in synced],
+        ordered=False,
+    )
+    first_seen.record_sessions(station, synced)
+    energy_stats.record_sessions(synced)
+    touched: Set[date] = set()
+    if result.upserted_count or result.modified_count:
+        for s in synced:
+            dt = first_seen.parse_start(s.get("session_start_at"))
+            if dt is not None:
+                touched.add(dt.date())
+    return len(synced), touched
+
+
+async def sync_charger(station: str, charger_id: int, client: Optional[httpx.AsyncClient] = None) -> Tuple[int, Set[date]]:
+    """Sincroniza un cargador: cada página se escribe en Mongo en cuanto llega.
+    Devuelve (sesiones upsertadas, días con cambios)."""
+    inserted = 0
+    touched: Set[date] = set()
+    async for charges in iter_charger_pages(charger_id, client=client):
+        # la escritura va a un hilo para que las páginas adelantadas sigan llegando
+        n, days = await asyncio.to_thread(_upsert_page, station, charges, charger_id)
+        inserted += n
+        touched |= days
+    return inserted, touched
+
+
+async def sync_station(station: str, client: Optional[httpx.AsyncClient] = None) -> int:
+    """Sincroniza las sesiones de una estación (cargadores en paralelo); devuelve cuántas se upsertaron."""
+    own_client = client is None
+    if own_client:
+        client = httpx.AsyncClient(timeout=30)
+    try:
+        chargers = (station_registry.get(station) or {}).get("chargers", [])
+        results = await asyncio.gather(*(sync_charger(station, sid, client) for sid in chargers))
+    finally:
+        if own_client:
+            await client.aclose()
+    inserted = sum(n for n, _ in results)
+    touched: Set[date] = set().union(*(days for _, days in results))
+    full = not await asyncio.to_thread(rollups.has_rollups, station)
+    await asyncio.to_thread(rollups.refresh_station, station, None if full else touched)
+    logging.info(f"✅ {station}: {inserted} sesiones sincronizadas")
+    return inserted
 
-STATIONS = {
-    "Portobelo": [31033, 31150],
-    "Salvio": [31726, 31727],
-}
 
 async def sync_etecnic_data():
-    results = {}
-    for station, ids in STATIONS.items():
-        all_sessions = []
-        for sid in ids:
-            resp = await get_charger_charges(sid)   # 👈 devuelve dict
-            charges = resp.get("charges", [])       # 👈 lista de sesiones
-            all_sessions.extend(charges)
-
-        # Seleccionar colección Mongo
-        col = sessions_Portobelo if station.lower() == "portobelo" else sessions_Salvio
-
-        inserted = 0
-        for s in all_sessions:
-            if "charge_id" not in s:
-                continue
-            col.update_one({"charge_id": s["charge_id"]}, {"$set": s}, upsert=True)
-            inserted += 1
-
-        logging.info(f"✅ {station}: {inserted} sesiones sincronizadas")
-        results[station] = inserted
-
-    return results
+    """Sincroniza todas las estaciones del registro a la vez; dura lo que el cargador más largo."""
+    names = station_registry.names()
+    async with httpx.AsyncClient(timeout=30) as client:
+        counts = await asyncio.gather(*(sync_station(st, client) for st in names))
+    return dict(zip(names, counts))
@@ -1,11 +1,22 @@
 import json
+import os
 import re
+import threading
+import time
 import unicodedata
+from collections import deque
+from functools import lru_cache
 from pathlib import Path
 
 # Ruta al archivo con modelos EV/PHEV en Colombia
 MODELS_FILE = Path(__file__).resolve().parents[1] / "models" / "models_ev_phev.json"
 
+# Cada cuántos segundos, como mucho, se revisa si el JSON cambió (hot-reload)
+try:
+    RELOAD_CHECK_SECONDS = float(os.getenv("MODELS_RELOAD_CHECK_SECONDS", "5"))
+except ValueError:
+    RELOAD_CHECK_SECONDS = 5.0
+
 with open(MODELS_FILE, "r", encoding="utf-8") as f:
     models_data = json.load(f)["marcas"]
 
@@ -50,44 +61,146 @@ def _contains_either(a: str, b: str) -> bool:
     b_c = b_n.replace(" ", "")
     return a_c in b_c or b_c in a_c
 
-def classify_vehicle(brand: str, model: str) -> str:
-    """
-    Clasifica un vehículo como EV, PHEV o unclassified.
-    - Usa comparación flexible (minúsculas + contains).
+
+class _Automaton:
+    """Aho-Corasick mínimo: ¿aparece alguno de los patrones dentro del texto?"""
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [False]
+        for p in patterns:
+            node = 0
+            for ch in p:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append(False)
+                node = nxt
+            self.out[node] = True
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self.goto[node].items():
+                queue.append(nxt)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.out[nxt] = self.out[nxt] or self.out[self.fail[nxt]]
+
+    def search(self, text: str) -> bool:
+        node = 0
+        for ch in text:
+            while node and ch not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(ch, 0)
+            if self.out[node]:
+                return True
+        return False
+
+
+class _ModelMatcher:
+    """Equivalente precompilado de ``any(_contains_either(m, modelo) for m in modelos)``.
+
+    Basta comparar sin espacios: si A está en B con espacios, también lo está sin ellos.
+    - modelo del catálogo dentro del modelo consultado → autómata Aho-Corasick
+    - modelo consultado dentro de alguno del catálogo → búsqueda en la lista unida
+      con un separador que no puede aparecer en un texto normalizado
     """
-    if not brand or not model:
-        return "unclassified"
 
-    brand_norm = normalize(brand)
-    model_norm = normalize(model)
+    def __init__(self, models):
+        compact = [normalize(m).replace(" ", "") for m in models]
+        compact = [c for c in compact if c]
+        self._automaton = _Automaton(compact)
+        self._joined = "\x00".join(compact)
+
+    def matches(self, model_compact: str) -> bool:
+        if not model_compact:
+            return False
+        return self._automaton.search(model_compact) or model_compact in self._joined
+
+
+class _Catalog:
+    def __init__(self, data: dict):
+        self.exact = {}
+        self.by_norm = {}
+        for brand, entry in data.items():
+            compiled = (_ModelMatcher(entry.get("EV", [])), _ModelMatcher(entry.get("PHEV", [])))
+            self.exact[brand] = compiled
+            # ante claves que normalizan igual, gana la primera (como el recorrido original)
+            self.by_norm.setdefault(normalize(brand), compiled)
+
+    def lookup(self, brand: str):
+        return self.exact.get(brand) or self.by_norm.get(normalize(brand))
+
+
+_catalog = _Catalog(models_data)
+_catalog_mtime = MODELS_FILE.stat().st_mtime
+_last_check = time.monotonic()
+_reload_lock = threading.Lock()
+
+
+def reload_models(force: bool = False) -> bool:
+    """Recompila el catálogo si ``models_ev_phev.json`` cambió; devuelve si recargó."""
+    global models_data, _catalog, _catalog_mtime, _last_check
+    with _reload_lock:
+        _last_check = time.monotonic()
+        try:
+            mtime = MODELS_FILE.stat().st_mtime
+        except OSError:
+            return False
+        if not force and mtime == _catalog_mtime:
+            return False
+        try:
+            with open(MODELS_FILE, "r", encoding="utf-8") as f:
+                data = json.load(f)["marcas"]
+            catalog = _Catalog(data)
+        except Exception as e:
+            # JSON a medio escribir o inválido: se mantiene el catálogo anterior
+            print(f"⚠️ No se pudo recargar {MODELS_FILE.name}: {e}")
+            return False
+        models_data, _catalog, _catalog_mtime = data, catalog, mtime
+        _classify_cached.cache_clear()
+        return True
 
-    # Buscar por coincidencia exacta de clave o por versión normalizada
-    brand_data = models_data.get(brand)
-    if not brand_data:
-        # también intentamos buscar ignorando mayúsculas/acentos
-        for b in models_data.keys():
-            if normalize(b) == brand_norm:
-                brand_data = models_data[b]
-                break
 
-    if not brand_data:
+@lru_cache(maxsize=4096)
+def _classify_cached(brand: str, model: str) -> str:
+    compiled = _catalog.lookup(brand)
+    if not compiled:
         print(f"⚠️ Marca no encontrada en JSON: {brand}")
         return "unclassified"
 
+    model_compact = normalize(model).replace(" ", "")
+    ev, phev = compiled
     # Buscar coincidencia EV (flexible)
-    for ev_model in brand_data.get("EV", []):
-        if _contains_either(ev_model, model_norm):
-            return "EV"
-
+    if ev.matches(model_compact):
+        return "EV"
     # Buscar coincidencia PHEV (flexible)
-    for phev_model in brand_data.get("PHEV", []):
-        if _contains_either(phev_model, model_norm):
-            return "PHEV"
+    if phev.matches(model_compact):
+        return "PHEV"
 
     print(f"❓ Modelo no clasificado: {brand} {model}")
     return "unclassified"
 
 
+def classify_vehicle(brand: str, model: str) -> str:
+    """
+    Clasifica un vehículo como EV, PHEV o unclassified.
+    - Usa comparación flexible (minúsculas + contains) contra el catálogo precompilado.
+    - Resultado memoizado (LRU); se invalida al recargar el JSON.
+    """
+    if not brand or not model:
+        return "unclassified"
+    if time.monotonic() - _last_check > RELOAD_CHECK_SECONDS:
+        reload_models()
+    return _classify_cached(str(brand), str(model))
+
+
 # 🔹 Nueva función: clasifica un solo vehículo
 def classify_single_vehicle(brand: str, model: str) -> str:
     return classify_vehicle(brand, model)
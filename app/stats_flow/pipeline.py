@@ -1,7 +1,12 @@
 import logging
 from datetime import datetime
-from app.database.database import insert_stats, sessions_Portobelo, sessions_Salvio
+from app.database.database import (
+    insert_stats,
+    iter_user_totals,
+    upsert_user_classifications,
+)
 from app.client.etecnic_client import get_user_id_from_code, get_user_info
+from app.services import station_registry
 from app.stats_flow.classifier import classify_single_vehicle  # clasifica EV / PHEV
 
 logger = logging.getLogger(__name__)
@@ -10,20 +15,20 @@ logger = logging.getLogger(__name__)
 async def run_pipeline():
     logger.info("🚀 Ejecutando pipeline de estadísticas EV/PHEV...")
 
-    # 1️⃣ Obtener sesiones de ambas estaciones
-    portobelo_sessions = list(sessions_Portobelo.find())
-    salvio_sessions = list(sessions_Salvio.find())
-    all_sessions = portobelo_sessions + salvio_sessions
-
-    total_cargas = len(all_sessions)
+    # 1️⃣ Totales por user_code de todas las estaciones, agregados en Mongo
+    total_cargas = total_energy_Wh = 0
+    user_codes = []
+    for row in iter_user_totals(station_registry.session_match("all") or {}):
+        total_cargas += row["sessions"]
+        total_energy_Wh += row["energy_Wh"]
+        if row["_id"]:
+            user_codes.append(row["_id"])
     logger.info(f"🔍 Total de cargas encontradas: {total_cargas}")
 
-    # 2️⃣ Obtener todos los user_codes únicos
-    user_codes = {s.get("user_code") for s in all_sessions if s.get("user_code")}
+    # 2️⃣ user_codes únicos
     logger.info(f"🔍 Total de user_codes únicos encontrados: {len(user_codes)}")
 
     # 3️⃣ Energía total
-    total_energy_Wh = sum(int(s.get("energy_Wh", 0)) for s in all_sessions if s.get("energy_Wh"))
     logger.info(f"🔍 Energía total consumida: {total_energy_Wh} Wh")
 
     # 4️⃣ Procesar usuarios
@@ -64,12 +69,12 @@ async def run_pipeline():
         except Exception as e:
             logger.error(f"❌ Error procesando user_code {code}: {e}")
 
-    # 5️⃣ Guardar en Mongo
+    # 5️⃣ Guardar en Mongo: clasificación por usuario aparte, el documento de stats solo con conteos
+    upsert_user_classifications(details)
     stats_doc = insert_stats(
         ev_count=ev_count,
         phev_count=phev_count,
         unclassified_count=unclassified_count,
-        details=details,
         total_cargas=total_cargas,
         total_usuarios=len(user_codes),
         total_energy_Wh=total_energy_Wh,
@@ -3,6 +3,7 @@ from fastapi.responses import StreamingResponse, PlainTextResponse
 import time
 
 from .service import vision_service
+from app.responses import FastJSONResponse
 import json
 
 
@@ -26,6 +27,14 @@ def start_source(url: str, rois: str | None = None, x0: float = 0.1, y0: float =
     return {"status": "started", "url": url, "rois": rois_list}
 
 
+@router.get("/sources")
+def list_sources():
+    return {"items": [
+        {"url": url, "rois": w.rois, "frames_seen": w.frames_seen, "detect_runs": w.detect_runs}
+        for url, w in vision_service.workers.items()
+    ]}
+
+
 @router.delete("/sources")
 def stop_source(url: str):
     vision_service.stop(url)
@@ -40,8 +49,9 @@ def get_summary(window_sec: int = 600):
 @router.get("/entries")
 def get_entries(since_sec: int = 600, limit: int = 50):
     since = time.time() - max(1, since_sec)
-    items = vision_service.entries(since)[:max(1, min(500, limit))]
-    return {"items": [e.__dict__ for e in items]}
+    items = vision_service.entries(since, max(1, min(500, limit)))
+    # dataclasses: orjson las serializa directamente (sin copiar __dict__)
+    return FastJSONResponse({"items": items})
 
 
 @router.put("/sources/rois")
@@ -65,3 +75,19 @@ def debug_stream(url: str, w: int = 960, q: int = 90):
     if not wkr:
         return PlainTextResponse("source not started", status_code=404)
     return StreamingResponse(wkr.debug_jpeg_iter(maxw=w, q=q), media_type="multipart/x-mixed-replace; boundary=frame")
+
+
+@router.get("/ocr/stats")
+def ocr_stats():
+    return vision_service.ocr_stats()
+
+
+@router.get("/plate-cache/stats")
+def plate_cache_stats():
+    return vision_service.plate_cache_stats()
+
+
+@router.post("/warmup")
+def warmup():
+    """Precarga los modelos (los workers también los cargan bajo demanda)."""
+    return vision_service.warmup()
@@ -1,12 +1,24 @@
 from __future__ import annotations
 
+import hashlib
+import json
+import logging
 import os
+import threading
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Optional
+from pathlib import Path
+from typing import Hashable, List, Optional, Sequence, Tuple
 
 import cv2
 import numpy as np
 
+logger = logging.getLogger(__name__)
+
+# Normalización de OpenAI CLIP (la usan también los pesos LAION de OpenCLIP)
+_CLIP_MEAN = (0.48145466, 0.4578275, 0.40821073)
+_CLIP_STD = (0.26862954, 0.26130258, 0.27577711)
+
 
 @dataclass
 class Classified:
@@ -20,9 +32,20 @@ class ZeroShotClassifier:
     """
     Zero-shot classifier using OpenCLIP (if available). If not available,
     returns 'indeterminado'.
+
+    - ``classify_many`` preprocesses a batch with vectorized NumPy/torch ops
+      and runs a single image forward pass.
+    - Image embeddings can be cached per key (track id or plate), so changing
+      the prompt list or re-classifying does not re-encode the crop.
+    - Text embeddings are cached on disk (``OPENCLIP_CACHE_DIR``) keyed by
+      model and prompt hash.
+    - With CLIP_BACKEND=onnx (or ``backend="onnx"``) the image encoder runs through ONNX Runtime
+      (see ``onnx_backend``); text encoding stays in torch since it is cached.
+    - Weights are loaded on first use (or via ``load()``), not at import.
     """
 
-    def __init__(self):
+    def __init__(self, backend: Optional[str] = None):
+        self._backend = backend  # None = CLIP_BACKEND al cargar
         self.model = None
         self.preprocess = None
         self.tokenizer = None
@@ -34,62 +57,208 @@ class ZeroShotClassifier:
         ]
         self.txt_embeds = None
         self.cat_embeds = None
-        self._try_load()
+        self._arch = ""
+        self._weights_id = ""
+        self._image_size = 224
+        self._mean = np.array(_CLIP_MEAN, dtype=np.float32)
+        self._std = np.array(_CLIP_STD, dtype=np.float32)
+        self._onnx = None
+        self._emb_cache: "OrderedDict[Hashable, np.ndarray]" = OrderedDict()
+        try:
+            self._emb_cache_max = int(os.getenv("CLIP_EMBED_CACHE", "512"))
+        except Exception:
+            self._emb_cache_max = 512
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._loaded = False
+
+    def load(self) -> bool:
+        """Loads OpenCLIP once; returns whether the model is available."""
+        if not self._loaded:
+            with self._load_lock:
+                if not self._loaded:
+                    self._try_load()
+                    self._loaded = True
+        return self.model is not None
 
     def _try_load(self):
         try:
             import open_clip
-            import torch
             arch = os.getenv("OPENCLIP_MODEL", "ViT-B-32")
             pretrained = os.getenv("OPENCLIP_PRETRAINED", "laion2b_s34b_b79k")
             local = os.getenv("OPENCLIP_WEIGHTS", "").strip()
             if local and os.path.exists(local):
                 model, _, preprocess = open_clip.create_model_and_transforms(arch, pretrained=local)
+                self._weights_id = f"{local}:{int(os.path.getmtime(local))}"
             else:
                 model, _, preprocess = open_clip.create_model_and_transforms(arch, pretrained=pretrained)
+                self._weights_id = pretrained
             model.eval()
             tok = open_clip.get_tokenizer(arch)
             self.model, self.preprocess, self.tokenizer = model, preprocess, tok
+            self._arch = arch
+            self._configure_preprocess(model)
             # Wide list of brands/models can be supplied via env JSON or defaults
             default_list = [
                 ("Tesla", "Model 3"), ("Tesla", "Model Y"), ("Kia", "EV6"), ("BMW", "330e"),
                 ("BYD", "Dolphin"), ("Hyundai", "Ioniq 5"), ("Renault", "Megane E-Tech"),
             ]
             prompts = os.getenv("CAR_PROMPTS_JSON", "")
-            import json
             pairs = json.loads(prompts) if prompts else default_list
-            self.txt_prompts = [f"a photo of a {b} {m}" for (b, m) in pairs]
-            self.txt_meta = pairs
-            with torch.no_grad():
-                t = self.tokenizer(self.txt_prompts)
-                self.txt_embeds = self.model.encode_text(t).float()
-                self.txt_embeds /= self.txt_embeds.norm(dim=-1, keepdim=True) + 1e-9
-                t2 = self.tokenizer(self.cat_prompts)
-                self.cat_embeds = self.model.encode_text(t2).float()
-                self.cat_embeds /= self.cat_embeds.norm(dim=-1, keepdim=True) + 1e-9
+            self.set_prompts(pairs)
         except Exception:
             self.model = None
+            return
+        self._try_load_onnx()
 
-    def classify(self, crop_bgr: np.ndarray) -> Classified:
-        if self.model is None:
-            return Classified("indeterminado", 0.0, None, None)
+    def _try_load_onnx(self):
+        from .onnx_backend import backend_for
+        if (self._backend or backend_for("clip")).strip().lower() != "onnx":
+            return
+        try:
+            from .onnx_backend import OnnxClipVisual
+            self._onnx = OnnxClipVisual.from_model(self.model, self._arch, self._weights_id, self._image_size)
+        except Exception as e:
+            logger.warning("CLIP ONNX no disponible, se usa torch: %s", e)
+            self._onnx = None
+
+    def _configure_preprocess(self, model) -> None:
+        visual = getattr(model, "visual", None)
+        size = getattr(visual, "image_size", 224)
+        self._image_size = int(size[0] if isinstance(size, (tuple, list)) else size)
+        mean = getattr(visual, "image_mean", None)
+        std = getattr(visual, "image_std", None)
+        if mean and std:
+            self._mean = np.array(mean, dtype=np.float32)
+            self._std = np.array(std, dtype=np.float32)
+
+    # ---------- prompts ----------
+    def set_prompts(self, pairs: Sequence[Tuple[str, str]]) -> None:
+        """Cambia la lista de (marca, modelo). Los embeddings de imagen cacheados siguen siendo válidos."""
+        if self.model is None and not self.load():
+            return
+        pairs = [tuple(p) for p in pairs]
+        prompts = [f"a photo of a {b} {m}" for (b, m) in pairs]
+        txt, cat = self._load_text_embeds(prompts)
+        with self._lock:
+            self.txt_prompts = prompts
+            self.txt_meta = pairs
+            self.txt_embeds = txt
+            self.cat_embeds = cat
+
+    def _cache_path(self, prompts: List[str]) -> Path:
+        base = Path(os.getenv("OPENCLIP_CACHE_DIR", str(Path.home() / ".cache" / "ia_iris" / "openclip")))
+        key = json.dumps({"arch": self._arch, "weights": self._weights_id, "prompts": prompts, "cat": self.cat_prompts})
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+        return base / f"{self._arch}-{digest}.npz"
+
+    def _load_text_embeds(self, prompts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        path = self._cache_path(prompts)
+        try:
+            if path.exists():
+                data = np.load(path)
+                return data["txt"], data["cat"]
+        except Exception as e:
+            logger.debug("Caché de prompts CLIP ilegible (%s): %s", path, e)
+        txt = self._encode_text(prompts)
+        cat = self._encode_text(self.cat_prompts)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp.npz")
+            np.savez(tmp, txt=txt, cat=cat)
+            os.replace(tmp, path)
+        except Exception as e:
+            logger.debug("No se pudo guardar caché de prompts CLIP: %s", e)
+        return txt, cat
+
+    def _encode_text(self, prompts: List[str]) -> np.ndarray:
+        import torch
+        with torch.no_grad():
+            t = self.tokenizer(prompts)
+            emb = self.model.encode_text(t).float()
+            emb /= emb.norm(dim=-1, keepdim=True) + 1e-9
+        return emb.cpu().numpy().astype(np.float32)
+
+    # ---------- imagen ----------
+    def _resize_center(self, crop_bgr: np.ndarray) -> np.ndarray:
+        s = self._image_size
+        h, w = crop_bgr.shape[:2]
+        scale = s / float(max(1, min(h, w)))
+        nh, nw = max(s, int(round(h * scale))), max(s, int(round(w * scale)))
+        img = cv2.resize(crop_bgr, (nw, nh), interpolation=cv2.INTER_CUBIC)
+        y0, x0 = (nh - s) // 2, (nw - s) // 2
+        return img[y0:y0 + s, x0:x0 + s]
+
+    def _preprocess_batch(self, crops: Sequence[np.ndarray]) -> np.ndarray:
+        batch = np.stack([self._resize_center(c) for c in crops])  # N,S,S,3 BGR uint8
+        x = batch[..., ::-1].astype(np.float32) * (1.0 / 255.0)
+        x = (x - self._mean) / self._std
+        return np.ascontiguousarray(x.transpose(0, 3, 1, 2))  # N,3,S,S RGB
+
+    def encode_images(self, crops: Sequence[np.ndarray]) -> np.ndarray:
+        """Embeddings normalizados (N, D) en una sola pasada del modelo."""
+        self.load()
+        x = self._preprocess_batch(crops)
+        if self._onnx is not None:
+            return self._onnx.encode(x)
         import torch
-        from PIL import Image
-        rgb = cv2.cvtColor(crop_bgr, cv2.COLOR_BGR2RGB)
-        img = Image.fromarray(rgb)
-        x = self.preprocess(img).unsqueeze(0)
+        x = torch.from_numpy(x)
         with torch.no_grad():
             emb = self.model.encode_image(x).float()
             emb /= emb.norm(dim=-1, keepdim=True) + 1e-9
-            sim_models = (emb @ self.txt_embeds.T).cpu().numpy()[0]
-            sim_cat = (emb @ self.cat_embeds.T).cpu().numpy()[0]
+        return emb.cpu().numpy().astype(np.float32)
+
+    def _cached_embedding(self, key: Optional[Hashable]) -> Optional[np.ndarray]:
+        if key is None:
+            return None
+        with self._lock:
+            emb = self._emb_cache.get(key)
+            if emb is not None:
+                self._emb_cache.move_to_end(key)
+            return emb
+
+    def _remember(self, key: Optional[Hashable], emb: np.ndarray) -> None:
+        if key is None or self._emb_cache_max <= 0:
+            return
+        with self._lock:
+            self._emb_cache[key] = emb
+            self._emb_cache.move_to_end(key)
+            while len(self._emb_cache) > self._emb_cache_max:
+                self._emb_cache.popitem(last=False)
+
+    def _prompt_snapshot(self) -> Tuple[np.ndarray, np.ndarray, list]:
+        """(txt_embeds, cat_embeds, txt_meta) coherentes entre sí; ``set_prompts`` los cambia juntos."""
+        with self._lock:
+            return self.txt_embeds, self.cat_embeds, self.txt_meta
+
+    def _score(self, emb: np.ndarray, prompts: Optional[Tuple[np.ndarray, np.ndarray, list]] = None) -> Classified:
+        txt_embeds, cat_embeds, txt_meta = prompts if prompts is not None else self._prompt_snapshot()
+        sim_models = txt_embeds @ emb
+        sim_cat = cat_embeds @ emb
         mi = int(np.argmax(sim_models))
         ci = int(np.argmax(sim_cat))  # 0 EV, 1 PHEV
-        brand, model = self.txt_meta[mi]
+        brand, model = txt_meta[mi]
         category = "EV" if ci == 0 else "PHEV"
         score = float(0.6*sim_models[mi] + 0.4*sim_cat[ci])
         return Classified(category, round(score, 4), brand, model)
 
+    # ---------- API ----------
+    def classify(self, crop_bgr: np.ndarray, key: Optional[Hashable] = None) -> Classified:
+        return self.classify_many([crop_bgr], [key])[0]
+
+    def classify_many(self, crops: Sequence[np.ndarray], keys: Optional[Sequence[Optional[Hashable]]] = None) -> List[Classified]:
+        if not self.load():
+            return [Classified("indeterminado", 0.0, None, None) for _ in crops]
+        prompts = self._prompt_snapshot()  # un mismo juego de prompts para todo el lote
+        keys = list(keys) if keys is not None else [None] * len(crops)
+        embeds: List[Optional[np.ndarray]] = [self._cached_embedding(k) for k in keys]
+        pending = [i for i, e in enumerate(embeds) if e is None]
+        if pending:
+            fresh = self.encode_images([crops[i] for i in pending])
+            for j, i in enumerate(pending):
+                embeds[i] = fresh[j]
+                self._remember(keys[i], fresh[j])
+        return [self._score(e, prompts) for e in embeds]
 
-classifier = ZeroShotClassifier()
 
+classifier = ZeroShotClassifier()
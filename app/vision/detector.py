@@ -1,10 +1,13 @@
 from __future__ import annotations
 
+import logging
 import os
+import threading
 from dataclasses import dataclass
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import cv2
+import numpy as np
 
 
 @dataclass
@@ -17,27 +20,76 @@ class Box:
     cls: int
 
 
+class _OnnxSessions:
+    """ONNX YOLO sessions shared per process, keyed by (weights, imgsz).
+
+    ONNX Runtime allows concurrent ``run`` calls, so every camera can use the
+    same session without a lock. Torch models are not shared: Ultralytics
+    ``predict`` is not thread-safe and each detector keeps its own copy so
+    cameras run inference in parallel.
+    """
+
+    _lock = threading.Lock()
+    _sessions: Dict[Tuple[str, int], object] = {}
+
+    @classmethod
+    def get(cls, weights: str, imgsz: int):
+        with cls._lock:
+            key = (weights, imgsz)
+            if key not in cls._sessions:
+                from .onnx_backend import OnnxYolo
+                cls._sessions[key] = OnnxYolo.from_weights(weights, imgsz)
+            return cls._sessions[key]
+
+
 class VehicleDetector:
     """YOLOv8 detector wrapper with safe fallbacks.
 
     - If Ultralytics is available, use yolov8n.pt (local path from env YOLO_WEIGHTS or auto-download).
+    - With YOLO_BACKEND=onnx, the weights are exported once and run through ONNX Runtime on CPU
+      (INT8 by default, see ``onnx_backend``); any failure falls back to the torch path.
+    - Weights are loaded on the first ``detect`` (or ``load()``), not on construction.
+      The ONNX session is shared by every detector in the process; torch weights
+      are loaded per detector (one per camera worker).
     - Else, fallback to background subtraction to at least return motion boxes.
     """
 
-    def __init__(self):
+    def __init__(self, backend: Optional[str] = None):
+        from .onnx_backend import backend_for
+        # explícito (p.ej. bench_vision compara ambos) o YOLO_BACKEND al construir
+        self._backend = (backend or backend_for("yolo")).strip().lower()
         self._yolo = None
+        self._onnx = None
         self._use_yolo = False
-        self._load_yolo()
-        self._bg = cv2.createBackgroundSubtractorMOG2(history=300, varThreshold=25, detectShadows=True)
         try:
             self._imgsz = int(os.getenv("YOLO_IMGSZ", "512"))
         except Exception:
             self._imgsz = 512
+        self._loaded = False
+        self._load_lock = threading.Lock()  # warmup y el hilo del worker pueden cargar a la vez
+        self._bg = cv2.createBackgroundSubtractorMOG2(history=300, varThreshold=25, detectShadows=True)
+
+    def load(self) -> bool:
+        """Loads the detector weights once; returns whether YOLO is available."""
+        if not self._loaded:
+            with self._load_lock:
+                if not self._loaded:
+                    self._load_yolo()
+                    self._loaded = True
+        return self._use_yolo
 
     def _load_yolo(self):
+        weights = os.getenv("YOLO_WEIGHTS", "yolov8n.pt")
+        if self._backend == "onnx":
+            try:
+                self._onnx = _OnnxSessions.get(weights, self._imgsz)
+                self._use_yolo = True
+                return
+            except Exception as e:
+                logging.getLogger(__name__).warning("YOLO ONNX no disponible, se usa torch: %s", e)
+                self._onnx = None
         try:
             from ultralytics import YOLO
-            weights = os.getenv("YOLO_WEIGHTS", "yolov8n.pt")
             self._yolo = YOLO(weights)
             self._use_yolo = True
         except Exception:
@@ -45,8 +97,14 @@ class VehicleDetector:
             self._use_yolo = False
 
     def detect(self, frame) -> List[Box]:
+        self.load()
         h, w = frame.shape[:2]
-        if self._use_yolo:
+        if self._onnx is not None:
+            try:
+                return [Box(x, y, bw, bh, conf, cls) for (x, y, bw, bh, conf, cls) in self._onnx.predict(frame)]
+            except Exception:
+                pass
+        elif self._use_yolo:
             try:
                 res = self._yolo.predict(frame, imgsz=self._imgsz, conf=0.25, verbose=False)[0]
                 boxes: List[Box] = []
@@ -79,3 +137,42 @@ class VehicleDetector:
                 continue
             out.append(Box(x, y, ww, hh, 0.4, 2))
         return out
+
+
+class MotionGate:
+    """Cheap scene-activity check used to skip the detector on static frames.
+
+    Works on a downscaled, blurred grayscale copy compared against a running
+    average background, so slow vehicles still register and parked ones fade
+    into the background after a few seconds.
+
+    - MOTION_PIXEL_DELTA: per-pixel intensity change considered motion (default 25).
+    - MOTION_MIN_FRACTION: fraction of changed pixels to report motion (default 0.004).
+    """
+
+    def __init__(self, width: int = 160, alpha: float = 0.05):
+        self.width = width
+        self.alpha = alpha
+        try:
+            self.delta = float(os.getenv("MOTION_PIXEL_DELTA", "25"))
+        except Exception:
+            self.delta = 25.0
+        try:
+            self.min_fraction = float(os.getenv("MOTION_MIN_FRACTION", "0.004"))
+        except Exception:
+            self.min_fraction = 0.004
+        self._bg: Optional[np.ndarray] = None
+
+    def update(self, frame) -> bool:
+        h, w = frame.shape[:2]
+        nh = max(1, int(h * self.width / max(1, w)))
+        small = cv2.resize(frame, (self.width, nh), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        gray = cv2.GaussianBlur(gray, (5, 5), 0).astype(np.float32)
+        if self._bg is None or self._bg.shape != gray.shape:
+            self._bg = gray
+            return True
+        diff = cv2.absdiff(gray, self._bg)
+        cv2.accumulateWeighted(gray, self._bg, self.alpha)
+        changed = np.count_nonzero(diff > self.delta)
+        return changed >= self.min_fraction * diff.size
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import logging
+import os
+import queue
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from dataclasses import asdict, is_dataclass
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Counts = Tuple[int, int, int]  # total, EV, PHEV
+
+
+def _delta(entry: Any) -> Counts:
+    cat = getattr(entry, "category", None)
+    return (1, 1 if cat == "EV" else 0, 1 if cat == "PHEV" else 0)
+
+
+def _add(a: Counts, b: Counts) -> Counts:
+    return (a[0] + b[0], a[1] + b[1], a[2] + b[2])
+
+
+def _sub(a: Counts, b: Counts) -> Counts:
+    return (a[0] - b[0], a[1] - b[1], a[2] - b[2])
+
+
+class EntryStore:
+    """Buffer acotado de ingresos de una cámara, ordenado por timestamp.
+
+    - Conserva como máximo ``VISION_ENTRIES_MAX`` entradas (default 5000);
+      las más antiguas se descartan en bloque (coste amortizado O(1)).
+    - ``since`` y ``counts`` usan bisect sobre los timestamps; los conteos
+      salen de sumas acumuladas por categoría, sin recorrer las entradas.
+    - Si se pasa un ``writer``, cada entrada se encola para persistirla.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, writer: Optional["EntryWriter"] = None):
+        if max_entries is None:
+            try:
+                max_entries = int(os.getenv("VISION_ENTRIES_MAX", "5000"))
+            except Exception:
+                max_entries = 5000
+        self.max_entries = max(1, max_entries)
+        self._slack = max(1, self.max_entries // 4)
+        self.writer = writer
+        self._ts: List[float] = []
+        self._items: List[Any] = []
+        self._cum: List[Counts] = []  # acumulado inclusivo
+        self._base: Counts = (0, 0, 0)  # acumulado de lo ya descartado
+        self._lock = threading.Lock()
+
+    def append(self, entry: Any) -> None:
+        with self._lock:
+            i = bisect_right(self._ts, entry.ts)
+            if i == len(self._ts):
+                prev = self._cum[-1] if self._cum else self._base
+                self._ts.append(entry.ts)
+                self._items.append(entry)
+                self._cum.append(_add(prev, _delta(entry)))
+            else:
+                # llegada fuera de orden (poco común): recalcular desde i
+                self._ts.insert(i, entry.ts)
+                self._items.insert(i, entry)
+                prev = self._cum[i - 1] if i > 0 else self._base
+                self._cum[i:] = []
+                for e in self._items[i:]:
+                    prev = _add(prev, _delta(e))
+                    self._cum.append(prev)
+            if len(self._items) > self.max_entries + self._slack:
+                k = len(self._items) - self.max_entries
+                self._base = self._cum[k - 1]
+                del self._ts[:k]
+                del self._items[:k]
+                del self._cum[:k]
+        if self.writer is not None:
+            self.writer.put(entry)
+
+    def since(self, since: float, limit: Optional[int] = None) -> List[Any]:
+        """Entradas con ts >= since, de la más reciente a la más antigua."""
+        with self._lock:
+            i = bisect_left(self._ts, since)
+            if limit is not None:
+                i = max(i, len(self._items) - max(0, limit))
+            out = self._items[i:]
+        out.reverse()
+        return out
+
+    def counts(self, since: float) -> Counts:
+        with self._lock:
+            if not self._cum:
+                return (0, 0, 0)
+            i = bisect_left(self._ts, since)
+            before = self._cum[i - 1] if i > 0 else self._base
+            return _sub(self._cum[-1], before)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class EntryWriter:
+    """Persiste ingresos en la colección ``vision_entries`` en lotes, en segundo plano.
+
+    - ``VISION_ENTRIES_PERSIST=false`` lo desactiva.
+    - ``VISION_ENTRIES_TTL_DAYS`` (default 30) define el índice TTL en ``created_at``.
+    - Lotes de hasta ``batch_size`` o cada ``flush_interval`` segundos.
+    """
+
+    def __init__(self, batch_size: int = 200, flush_interval: float = 5.0, max_queue: int = 10000):
+        self.enabled = os.getenv("VISION_ENTRIES_PERSIST", "true").lower() == "true"
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._coll = None
+        self.written = 0
+        self.dropped = 0
+
+    def put(self, entry: Any) -> None:
+        if not self.enabled:
+            return
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="vision-entry-writer", daemon=True)
+                self._thread.start()
+
+    def _collection(self):
+        if self._coll is None:
+            from app.database.database import db
+            coll = db["vision_entries"]
+            try:
+                days = int(os.getenv("VISION_ENTRIES_TTL_DAYS", "30"))
+            except Exception:
+                days = 30
+            coll.create_index("created_at", expireAfterSeconds=days * 86400)
+            coll.create_index([("source", 1), ("ts", -1)])
+            self._coll = coll
+        return self._coll
+
+    @staticmethod
+    def _to_doc(entry: Any) -> dict:
+        doc = asdict(entry) if is_dataclass(entry) else dict(entry.__dict__)
+        doc["created_at"] = datetime.utcfromtimestamp(float(doc.get("ts", 0.0)))
+        return doc
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._collection().insert_many([self._to_doc(e) for e in batch], ordered=False)
+                self.written += len(batch)
+            except Exception as e:
+                self.dropped += len(batch)
+                logger.debug("No se pudieron persistir %s ingresos de visión: %s", len(batch), e)
@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+RecognizerFactory = Callable[[int], Any]
+
+
+def _default_factory(index: int):
+    """Builds one PaddleOCR recognizer per worker.
+
+    PaddleOCR is not thread-safe, so no worker shares the global instance that
+    ``app.scripts.detector`` uses for video processing.
+    """
+    from paddleocr import PaddleOCR
+    return PaddleOCR(use_textline_orientation=True, lang="en")
+
+
+class OCRPool:
+    """Pool of OCR workers, each thread owning its own recognizer instance.
+
+    - ``submit(crop)`` / ``submit_many(crops)`` return futures with the raw
+      ``predict`` result, so callers can batch all crops from a frame.
+    - ``stats()`` exposes queue depth and per-call latency.
+    - Size is taken from env ``OCR_WORKERS`` (default 2).
+    - ``predict`` waits at most ``OCR_TIMEOUT`` seconds (default 30); ``stop()``
+      fails every queued job so no caller is left waiting.
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        factory: Optional[RecognizerFactory] = None,
+        latency_window: int = 200,
+        timeout: Optional[float] = None,
+    ):
+        if workers is None:
+            try:
+                workers = int(os.getenv("OCR_WORKERS", "2"))
+            except Exception:
+                workers = 2
+        if timeout is None:
+            try:
+                timeout = float(os.getenv("OCR_TIMEOUT", "30"))
+            except Exception:
+                timeout = 30.0
+        self.size = max(1, workers)
+        self.timeout = timeout
+        self._factory = factory or _default_factory
+        self._queue: "queue.Queue[Optional[tuple[np.ndarray, Future]]]" = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._started = False
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._latencies: Deque[float] = deque(maxlen=latency_window)
+        self._calls = 0
+        self._errors = 0
+        self._busy = 0
+        self._ready = 0
+
+    def start(self) -> None:
+        with self._start_lock:
+            if self._started:
+                return
+            for i in range(self.size):
+                t = threading.Thread(target=self._run, args=(i,), name=f"ocr-worker-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+            self._started = True
+
+    def wait_ready(self, timeout: float = 120.0) -> bool:
+        """Starts the pool and waits until every worker has loaded its model."""
+        self.start()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._stats_lock:
+                if self._ready >= self.size:
+                    return True
+            time.sleep(0.05)
+        return False
+
+    def stop(self) -> None:
+        with self._start_lock:
+            if not self._started:
+                return
+            # los trabajos en cola no se van a ejecutar: se resuelven con error
+            while True:
+                try:
+                    job = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is not None and job[1].set_running_or_notify_cancel():
+                    job[1].set_exception(RuntimeError("OCR pool detenido"))
+            for _ in self._threads:
+                self._queue.put(None)
+            self._threads = []
+            self._started = False
+
+    def submit(self, crop_bgr: np.ndarray) -> Future:
+        self.start()
+        fut: Future = Future()
+        self._queue.put((crop_bgr, fut))
+        return fut
+
+    def submit_many(self, crops: Sequence[np.ndarray]) -> List[Future]:
+        return [self.submit(c) for c in crops]
+
+    def predict(self, crop_bgr: np.ndarray, timeout: Optional[float] = None):
+        """Synchronous convenience wrapper over ``submit`` (``TimeoutError`` after ``timeout``/``self.timeout``)."""
+        return self.submit(crop_bgr).result(timeout=self.timeout if timeout is None else timeout)
+
+    def predict_many(self, crops: Sequence[np.ndarray], timeout: Optional[float] = None) -> list:
+        futures = self.submit_many(crops)
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        return [f.result(timeout=max(0.0, deadline - time.monotonic())) for f in futures]
+
+    def _run(self, index: int) -> None:
+        try:
+            recognizer = self._factory(index)
+        except Exception as e:
+            logger.error("OCR worker %s no pudo cargar el modelo: %s", index, e)
+            recognizer = None
+        with self._stats_lock:
+            self._ready += 1
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            crop, fut = job
+            if not fut.set_running_or_notify_cancel():
+                continue
+            if recognizer is None:
+                fut.set_exception(RuntimeError("OCR no disponible"))
+                with self._stats_lock:
+                    self._errors += 1
+                continue
+            with self._stats_lock:
+                self._busy += 1
+            t0 = time.perf_counter()
+            try:
+                result = recognizer.predict(crop)
+            except Exception as e:
+                with self._stats_lock:
+                    self._errors += 1
+                fut.set_exception(e)
+            else:
+                fut.set_result(result)
+            finally:
+                dt = time.perf_counter() - t0
+                with self._stats_lock:
+                    self._busy -= 1
+                    self._calls += 1
+                    self._latencies.append(dt)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            lat = sorted(self._latencies)
+            calls, errors, busy, ready = self._calls, self._errors, self._busy, self._ready
+        n = len(lat)
+        return {
+            "workers": self.size,
+            "ready": ready,
+            "busy": busy,
+            "queue_depth": self._queue.qsize(),
+            "calls": calls,
+            "errors": errors,
+            "latency_ms": {
+                "avg": round(1000.0 * sum(lat) / n, 2) if n else 0.0,
+                "p50": round(1000.0 * lat[n // 2], 2) if n else 0.0,
+                "p95": round(1000.0 * lat[min(n - 1, int(n * 0.95))], 2) if n else 0.0,
+                "max": round(1000.0 * lat[-1], 2) if n else 0.0,
+            },
+        }
+
+
+_shared: Optional[OCRPool] = None
+_shared_lock = threading.Lock()
+
+
+def shared_pool(workers: Optional[int] = None) -> OCRPool:
+    """The process-wide OCR pool shared by every ``PlateMatcher``.
+
+    The first call fixes its size (``workers`` or env ``OCR_WORKERS``); camera
+    processes pass ``OCR_PROCESS_WORKERS`` so memory grows with one small pool
+    per process, not with one pool per matcher.
+    """
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = OCRPool(workers=workers)
+        elif workers is not None and workers != _shared.size:
+            logger.debug("OCR pool ya creado con %s workers; se ignora %s", _shared.size, workers)
+        return _shared
@@ -0,0 +1,168 @@
+"""Backends de inferencia en CPU con ONNX Runtime (opcional).
+
+Variables de entorno:
+- ``YOLO_BACKEND`` / ``CLIP_BACKEND``: ``torch`` (default) u ``onnx``.
+- ``ONNX_INT8``: ``true`` para cuantización dinámica INT8 de los pesos (default true).
+- ``ORT_INTRA_OP_THREADS``: hilos intra-op de ONNX Runtime (0 = automático).
+- ``ONNX_CACHE_DIR``: dónde se guardan los modelos exportados.
+
+Si ``onnxruntime`` no está instalado, los llamadores vuelven a torch.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import List, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def backend_for(kind: str) -> str:
+    return os.getenv(f"{kind.upper()}_BACKEND", "torch").strip().lower()
+
+
+def cache_dir() -> Path:
+    path = Path(os.getenv("ONNX_CACHE_DIR", str(Path.home() / ".cache" / "ia_iris" / "onnx")))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _int8_enabled() -> bool:
+    return os.getenv("ONNX_INT8", "true").lower() == "true"
+
+
+def quantize_int8(src: Path) -> Path:
+    """Cuantización dinámica (pesos INT8, activaciones en float)."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    dst = src.with_name(src.stem + ".int8.onnx")
+    if not dst.exists() or dst.stat().st_mtime < src.stat().st_mtime:
+        quantize_dynamic(str(src), str(dst), weight_type=QuantType.QInt8)
+    return dst
+
+
+def make_session(path: Path):
+    import onnxruntime as ort
+    opts = ort.SessionOptions()
+    try:
+        threads = int(os.getenv("ORT_INTRA_OP_THREADS", "0"))
+    except Exception:
+        threads = 0
+    if threads > 0:
+        opts.intra_op_num_threads = threads
+    opts.inter_op_num_threads = 1
+    opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return ort.InferenceSession(str(path), sess_options=opts, providers=["CPUExecutionProvider"])
+
+
+def _finalize(path: Path, int8: bool | None) -> Path:
+    use_int8 = _int8_enabled() if int8 is None else int8
+    return quantize_int8(path) if use_int8 else path
+
+
+# ==========================
+# YOLOv8
+# ==========================
+class OnnxYolo:
+    """YOLOv8 exportado a ONNX; devuelve cajas (x, y, w, h, conf, cls) en píxeles."""
+
+    def __init__(self, path: Path, imgsz: int):
+        self.path = path
+        self.imgsz = imgsz
+        self.session = make_session(path)
+        self.input_name = self.session.get_inputs()[0].name
+
+    @classmethod
+    def from_weights(cls, weights: str, imgsz: int, int8: bool | None = None) -> "OnnxYolo":
+        stem = Path(weights).stem
+        target = cache_dir() / f"{stem}-{imgsz}.onnx"
+        if not target.exists():
+            from ultralytics import YOLO
+            exported = Path(YOLO(weights).export(format="onnx", imgsz=imgsz, dynamic=False, simplify=False, verbose=False))
+            shutil.move(str(exported), target)
+        return cls(_finalize(target, int8), imgsz)
+
+    def _letterbox(self, frame: np.ndarray) -> Tuple[np.ndarray, float, int, int]:
+        h, w = frame.shape[:2]
+        s = self.imgsz
+        r = min(s / h, s / w)
+        nh, nw = int(round(h * r)), int(round(w * r))
+        img = cv2.resize(frame, (nw, nh), interpolation=cv2.INTER_LINEAR)
+        top, left = (s - nh) // 2, (s - nw) // 2
+        canvas = np.full((s, s, 3), 114, dtype=np.uint8)
+        canvas[top:top + nh, left:left + nw] = img
+        x = canvas[..., ::-1].transpose(2, 0, 1)[None].astype(np.float32) / 255.0
+        return np.ascontiguousarray(x), r, left, top
+
+    def predict(
+        self,
+        frame: np.ndarray,
+        conf: float = 0.25,
+        iou: float = 0.45,
+        classes: Sequence[int] = (2, 5, 7),
+    ) -> List[Tuple[int, int, int, int, float, int]]:
+        x, r, left, top = self._letterbox(frame)
+        out = self.session.run(None, {self.input_name: x})[0][0]  # (4+nc, N)
+        out = out.T
+        scores_all = out[:, 4:]
+        cls_ids = np.argmax(scores_all, axis=1)
+        scores = scores_all[np.arange(len(cls_ids)), cls_ids]
+        keep = (scores >= conf) & np.isin(cls_ids, classes)
+        if not np.any(keep):
+            return []
+        boxes, scores, cls_ids = out[keep, :4], scores[keep], cls_ids[keep]
+        # cx,cy,w,h (espacio letterbox) → x,y,w,h en la imagen original
+        bw = boxes[:, 2] / r
+        bh = boxes[:, 3] / r
+        bx = (boxes[:, 0] - left) / r - bw / 2
+        by = (boxes[:, 1] - top) / r - bh / 2
+        rects = np.stack([bx, by, bw, bh], axis=1)
+        idx = cv2.dnn.NMSBoxes(rects.tolist(), scores.tolist(), conf, iou)
+        h, w = frame.shape[:2]
+        result = []
+        for i in np.array(idx).reshape(-1):
+            x0 = int(max(0, rects[i, 0])); y0 = int(max(0, rects[i, 1]))
+            x1 = int(min(w, rects[i, 0] + rects[i, 2])); y1 = int(min(h, rects[i, 1] + rects[i, 3]))
+            result.append((x0, y0, max(1, x1 - x0), max(1, y1 - y0), float(scores[i]), int(cls_ids[i])))
+        return result
+
+
+# ==========================
+# OpenCLIP (encoder visual)
+# ==========================
+class OnnxClipVisual:
+    """Encoder visual de OpenCLIP exportado a ONNX, con batch dinámico."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.session = make_session(path)
+        self.input_name = self.session.get_inputs()[0].name
+
+    @classmethod
+    def from_model(cls, model, arch: str, weights_id: str, image_size: int, int8: bool | None = None) -> "OnnxClipVisual":
+        import hashlib
+        import torch
+        digest = hashlib.sha1(f"{arch}|{weights_id}|{image_size}".encode("utf-8")).hexdigest()[:12]
+        target = cache_dir() / f"clip-visual-{arch}-{digest}.onnx"
+        if not target.exists():
+            dummy = torch.zeros(1, 3, image_size, image_size)
+            tmp = target.with_suffix(".tmp.onnx")
+            with torch.no_grad():
+                torch.onnx.export(
+                    model.visual, dummy, str(tmp),
+                    input_names=["pixels"], output_names=["embeds"],
+                    dynamic_axes={"pixels": {0: "batch"}, "embeds": {0: "batch"}},
+                    opset_version=17,
+                )
+            os.replace(tmp, target)
+        return cls(_finalize(target, int8))
+
+    def encode(self, pixels: np.ndarray) -> np.ndarray:
+        emb = self.session.run(None, {self.input_name: pixels.astype(np.float32, copy=False)})[0]
+        emb = emb.astype(np.float32, copy=False)
+        return emb / (np.linalg.norm(emb, axis=-1, keepdims=True) + 1e-9)
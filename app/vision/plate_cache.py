@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FetchTimeout
+from dataclasses import asdict
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Callable, Dict, Optional, Set, Tuple
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .plate_lookup import PlateMatch
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+class PlateCache:
+    """Caché LRU de consultas de matrícula con TTL positivo/negativo y persistencia.
+
+    - Tamaño máximo ``PLATE_CACHE_MAX`` (default 5000); se expulsa la menos usada.
+    - ``ttl`` para matrículas encontradas y ``negative_ttl`` (``PLATE_CACHE_NEG_TTL``,
+      default 300 s) para las no encontradas, que suelen ser lecturas erróneas.
+    - Entradas con edad > ``refresh_ahead`` * TTL se sirven igual y se refrescan
+      en segundo plano, así los hilos de cámara no esperan a Etecnic.
+    - Los fallos de caché también se consultan en segundo plano, una sola vez por
+      matrícula aunque la pidan varias cámaras; ``get_or_fetch`` espera como mucho
+      ``fetch_timeout`` (``PLATE_CACHE_FETCH_TIMEOUT``, default 2 s) y lanza
+      ``FetchTimeout`` (la consulta sigue y el resultado queda en caché).
+    - Persistencia en la colección Mongo ``plate_cache`` (índice TTL en
+      ``expires_at``) para sobrevivir reinicios; se desactiva con
+      ``PLATE_CACHE_PERSIST=false``. Las entradas vigentes se precargan en
+      segundo plano al conectar (los hilos de cámara nunca esperan a Mongo) y,
+      si Mongo falla, se reintenta con backoff (``PLATE_CACHE_RETRY_MAX``, 300 s).
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[str], "PlateMatch"],
+        ttl: int = 1800,
+        negative_ttl: Optional[int] = None,
+        max_entries: Optional[int] = None,
+        refresh_ahead: Optional[float] = None,
+        persist: Optional[bool] = None,
+        fetch_timeout: Optional[float] = None,
+    ):
+        self._fetch = fetch
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl if negative_ttl is not None else _env_int("PLATE_CACHE_NEG_TTL", 300)
+        self.max_entries = max(1, max_entries if max_entries is not None else _env_int("PLATE_CACHE_MAX", 5000))
+        self.refresh_ahead = refresh_ahead if refresh_ahead is not None else _env_float("PLATE_CACHE_REFRESH_AHEAD", 0.8)
+        if persist is None:
+            persist = os.getenv("PLATE_CACHE_PERSIST", "true").lower() == "true"
+        self.persist = persist
+        self._items: "OrderedDict[str, Tuple[PlateMatch, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._refreshing: Set[str] = set()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="plate-cache")
+        self.fetch_timeout = fetch_timeout if fetch_timeout is not None else _env_float("PLATE_CACHE_FETCH_TIMEOUT", 2.0)
+        self._fetch_executor = ThreadPoolExecutor(
+            max_workers=max(1, _env_int("PLATE_CACHE_FETCH_WORKERS", 4)), thread_name_prefix="plate-fetch"
+        )
+        self._inflight: Dict[str, Future] = {}
+        self._coll = None
+        self._coll_lock = threading.Lock()
+        self._coll_retry_at = 0.0
+        self._coll_backoff = 5.0
+        self._coll_backoff_max = _env_float("PLATE_CACHE_RETRY_MAX", 300.0)
+        self._counters: Dict[str, int] = {"hits": 0, "misses": 0, "stale": 0, "refreshes": 0, "fetches": 0, "coalesced": 0, "timeouts": 0, "loaded": 0}
+        if self.persist:
+            self._executor.submit(self._collection)
+
+    # ---------- API ----------
+    def get_or_fetch(self, plate: str, timeout: Optional[float] = None) -> "PlateMatch":
+        match = self.get(plate)
+        if match is not None:
+            return match
+        try:
+            return self._fetch_async(plate).result(timeout=self.fetch_timeout if timeout is None else timeout)
+        except FetchTimeout:
+            with self._lock:
+                self._counters["timeouts"] += 1
+            raise
+
+    def get(self, plate: str) -> Optional["PlateMatch"]:
+        now = time.time()
+        refresh = False
+        with self._lock:
+            item = self._items.get(plate)
+            if item is not None:
+                match, ts = item
+                ttl = self._ttl_for(match)
+                age = now - ts
+                if age < ttl:
+                    self._items.move_to_end(plate)
+                    self._counters["hits"] += 1
+                    if age >= ttl * self.refresh_ahead and plate not in self._refreshing:
+                        self._refreshing.add(plate)
+                        self._counters["stale"] += 1
+                        refresh = True
+                else:
+                    del self._items[plate]
+                    item = None
+            if item is None:
+                self._counters["misses"] += 1
+        if item is not None and refresh:
+            self._executor.submit(self._refresh, plate)
+        return item[0] if item is not None else None
+
+    def set(self, plate: str, match: "PlateMatch") -> None:
+        now = time.time()
+        with self._lock:
+            self._put(plate, match, now)
+        if self.persist:
+            self._executor.submit(self._store, plate, match, now)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._items),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "negative_ttl": self.negative_ttl,
+                **self._counters,
+            }
+
+    # ---------- internos ----------
+    def _ttl_for(self, match: "PlateMatch") -> float:
+        return float(self.ttl if match.found else self.negative_ttl)
+
+    def _put(self, plate: str, match: "PlateMatch", ts: float) -> None:
+        self._items[plate] = (match, ts)
+        self._items.move_to_end(plate)
+        while len(self._items) > self.max_entries:
+            self._items.popitem(last=False)
+
+    def _fetch_async(self, plate: str) -> Future:
+        """Consulta en curso para ``plate`` (la crea si no hay ninguna)."""
+        with self._lock:
+            fut = self._inflight.get(plate)
+            if fut is not None:
+                self._counters["coalesced"] += 1
+                return fut
+            fut = Future()
+            self._inflight[plate] = fut
+            self._counters["fetches"] += 1
+        self._fetch_executor.submit(self._run_fetch, plate, fut)
+        return fut
+
+    def _run_fetch(self, plate: str, fut: Future) -> None:
+        try:
+            match = self._fetch(plate)
+            self.set(plate, match)
+        except Exception as e:
+            with self._lock:
+                self._inflight.pop(plate, None)
+            fut.set_exception(e)
+            return
+        with self._lock:
+            self._inflight.pop(plate, None)
+        fut.set_result(match)
+
+    def _refresh(self, plate: str) -> None:
+        try:
+            match = self._fetch(plate)
+            self.set(plate, match)
+            with self._lock:
+                self._counters["refreshes"] += 1
+        except Exception as e:
+            logger.debug("Refresco de matrícula %s falló: %s", plate, e)
+        finally:
+            with self._lock:
+                self._refreshing.discard(plate)
+
+    def _collection(self):
+        """Colección lista (índice creado) o None; tras un fallo se reintenta con backoff."""
+        if not self.persist:
+            return None
+        with self._coll_lock:
+            if self._coll is not None:
+                return self._coll
+            if time.time() < self._coll_retry_at:
+                return None
+            try:
+                from app.database.database import db
+                coll = db["plate_cache"]
+                coll.create_index("expires_at", expireAfterSeconds=0)
+            except Exception as e:
+                logger.debug("plate_cache sin persistencia (reintento en %.0fs): %s", self._coll_backoff, e)
+                self._coll_retry_at = time.time() + self._coll_backoff
+                self._coll_backoff = min(self._coll_backoff_max, self._coll_backoff * 2)
+                return None
+            self._coll = coll
+        self._executor.submit(self._preload, coll)
+        return coll
+
+    def _preload(self, coll) -> None:
+        """Vuelca a memoria las entradas vigentes más recientes (sin pisar las que ya hay)."""
+        try:
+            docs = list(
+                coll.find({"expires_at": {"$gt": datetime.utcnow()}})
+                .sort("fetched_at", -1)
+                .limit(self.max_entries)
+            )
+        except Exception as e:
+            logger.debug("Precarga de plate_cache falló: %s", e)
+            with self._coll_lock:
+                self._coll = None  # se reintenta (con su precarga) en el siguiente acceso
+                self._coll_retry_at = time.time() + self._coll_backoff
+            return
+        loaded = [(d["_id"], *self._from_doc(d)) for d in docs]
+        with self._lock:
+            n = 0
+            # de más reciente a más antigua, cada una al frente del LRU: las precargadas
+            # quedan ordenadas por antigüedad y detrás de las que ya estaban en memoria
+            for plate, match, ts in loaded:
+                if plate in self._items:
+                    continue
+                self._items[plate] = (match, ts)
+                self._items.move_to_end(plate, last=False)
+                n += 1
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+            self._counters["loaded"] += n
+
+    def _from_doc(self, doc: dict) -> Tuple["PlateMatch", float]:
+        from .plate_lookup import PlateMatch
+        plate = doc["_id"]
+        match = PlateMatch(
+            plate=doc.get("plate") or plate,
+            found=bool(doc.get("found")),
+            brand=doc.get("brand"),
+            model=doc.get("model"),
+            category=doc.get("category"),
+            source=doc.get("source") or "plate",
+            score=float(doc.get("score") or 0.0),
+        )
+        fetched = doc.get("fetched_at")
+        ts = (fetched - datetime(1970, 1, 1)).total_seconds() if isinstance(fetched, datetime) else time.time()
+        return match, ts
+
+    def _store(self, plate: str, match: "PlateMatch", ts: float) -> None:
+        coll = self._collection()
+        if coll is None:
+            return
+        fetched = datetime.utcfromtimestamp(ts)
+        doc = {
+            **asdict(match),
+            "fetched_at": fetched,
+            "expires_at": fetched + timedelta(seconds=self._ttl_for(match)),
+        }
+        try:
+            coll.update_one({"_id": plate}, {"$set": doc}, upsert=True)
+        except Exception as e:
+            logger.debug("Escritura en plate_cache falló: %s", e)
@@ -1,16 +1,18 @@
 from __future__ import annotations
 
 import re
-import threading
-import time
 from dataclasses import dataclass
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 import cv2
 import numpy as np
 
 from app.client.etecnic_client import EtecnicClient
-from app.scripts.detector import REGEX_MATRICULA, normalizar_matricula, ocr
+from app.scripts.detector import REGEX_MATRICULA, normalizar_matricula
+
+from .ocr_pool import OCRPool, shared_pool
+from .plate_cache import FetchTimeout, PlateCache
+from .plate_vote import PlateVoter
 
 
 @dataclass
@@ -27,40 +29,75 @@ class PlateMatch:
 class PlateMatcher:
     """Gestiona la detección de matrículas y su consulta en Etecnic."""
 
-    def __init__(self, client: Optional[EtecnicClient] = None, cache_ttl: int = 1800):
+    def __init__(self, client: Optional[EtecnicClient] = None, cache_ttl: int = 1800, ocr_pool: Optional[OCRPool] = None):
         self.client = client or EtecnicClient()
         self.cache_ttl = cache_ttl
-        self._cache: Dict[str, Tuple[PlateMatch, float]] = {}
-        self._lock = threading.Lock()
-        self._ocr_lock = threading.Lock()
+        self.cache = PlateCache(self._fetch, ttl=cache_ttl)
+        self.ocr_pool = ocr_pool or shared_pool()  # uno por proceso, no por matcher
         self._regex = re.compile(REGEX_MATRICULA)
 
     def lookup(self, crop_bgr: np.ndarray) -> Optional[PlateMatch]:
         plate, score = self._detect_plate(crop_bgr)
         if not plate:
             return None
+        return self.resolve(plate, score)
+
+    def read_plate(self, crop_bgr: np.ndarray) -> Tuple[Optional[str], float]:
+        """Solo OCR (sin consulta a Etecnic); para acumular votos entre frames."""
+        return self._detect_plate(crop_bgr)
+
+    def new_voter(self) -> PlateVoter:
+        return PlateVoter(validator=lambda text: bool(self._regex.match(text)))
+
+    def resolve(self, plate: str, score: float) -> PlateMatch:
+        """Consulta (con caché) la información de una matrícula ya leída."""
+        try:
+            cached = self.cache.get_or_fetch(plate)
+        except FetchTimeout:
+            # Etecnic lento: se sigue sin datos del dueño (como "no encontrada");
+            # la consulta termina en segundo plano y sirve a los siguientes frames
+            return PlateMatch(plate, False, None, None, None, "plate", score)
+        return PlateMatch(cached.plate, cached.found, cached.brand, cached.model, cached.category, cached.source, score)
 
-        cached = self._get_cached(plate)
-        if cached is not None:
-            return PlateMatch(cached.plate, cached.found, cached.brand, cached.model, cached.category, cached.source, score)
-
+    def _fetch(self, plate: str) -> PlateMatch:
         payload = self.client.obtener_dueno_sync(plate)
-        match = self._payload_to_match(plate, score, payload)
-        self._set_cached(plate, match)
-        return match
+        return self._payload_to_match(plate, 0.0, payload)
 
     def _detect_plate(self, crop_bgr: np.ndarray, min_score: float = 0.5) -> Tuple[Optional[str], float]:
-        if crop_bgr is None or crop_bgr.size == 0:
+        prepared = self._prepare_crop(crop_bgr)
+        if prepared is None:
             return None, 0.0
+        result = self.ocr_pool.predict(prepared)
+        return self._best_plate(result, min_score)
+
+    def detect_plates(self, crops: Sequence[np.ndarray], min_score: float = 0.5) -> List[Tuple[Optional[str], float]]:
+        """Lee varias matrículas repartiendo los recortes entre los workers OCR."""
+        prepared = [self._prepare_crop(c) for c in crops]
+        futures = {i: self.ocr_pool.submit(p) for i, p in enumerate(prepared) if p is not None}
+        out: List[Tuple[Optional[str], float]] = []
+        for i in range(len(prepared)):
+            fut = futures.get(i)
+            if fut is None:
+                out.append((None, 0.0))
+                continue
+            try:
+                out.append(self._best_plate(fut.result(timeout=self.ocr_pool.timeout), min_score))
+            except Exception:
+                out.append((None, 0.0))
+        return out
 
+    @staticmethod
+    def _prepare_crop(crop_bgr: np.ndarray) -> Optional[np.ndarray]:
+        if crop_bgr is None or crop_bgr.size == 0:
+            return None
         # Upscale pequeños recortes para mejorar OCR
         h, w = crop_bgr.shape[:2]
         if min(h, w) < 120:
             scale = 120.0 / max(1, min(h, w))
             crop_bgr = cv2.resize(crop_bgr, (int(w * scale), int(h * scale)))
+        return crop_bgr
 
-        with self._ocr_lock:
-            result = ocr.predict(crop_bgr)
+    def _best_plate(self, result: Any, min_score: float) -> Tuple[Optional[str], float]:
         best_plate: Optional[str] = None
         best_score = 0.0
         for item in result or []:
@@ -143,18 +180,3 @@ class PlateMatcher:
             return None
         text = str(value).strip()
         return text or None
-
-    def _get_cached(self, plate: str) -> Optional[PlateMatch]:
-        with self._lock:
-            item = self._cache.get(plate)
-            if not item:
-                return None
-            match, ts = item
-            if time.time() - ts > self.cache_ttl:
-                del self._cache[plate]
-                return None
-            return match
-
-    def _set_cached(self, plate: str, match: PlateMatch) -> None:
-        with self._lock:
-            self._cache[plate] = (match, time.time())
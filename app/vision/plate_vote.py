@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import os
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+class PlateVoter:
+    """Consenso de matrícula para un mismo vehículo a lo largo de varios frames.
+
+    Cada lectura OCR (texto normalizado + score) suma un voto ponderado.
+    El resultado es el consenso carácter a carácter entre las lecturas de la
+    longitud dominante; la confianza combina el acuerdo mínimo por posición
+    con el score medio de las lecturas que lo apoyan.
+
+    - ``max_samples`` (env ``PLATE_VOTE_MAX_SAMPLES``, default 5): frames como máximo.
+    - ``threshold`` (env ``PLATE_VOTE_CONFIDENCE``, default 0.85): corte anticipado.
+    - ``min_samples`` (env ``PLATE_VOTE_MIN_SAMPLES``, default 2): lecturas válidas
+      necesarias antes del corte anticipado; con una sola el acuerdo es 1.0 y la
+      confianza sería solo el score del OCR.
+    """
+
+    def __init__(
+        self,
+        max_samples: Optional[int] = None,
+        threshold: Optional[float] = None,
+        min_samples: Optional[int] = None,
+        validator: Optional[Callable[[str], bool]] = None,
+    ):
+        self.max_samples = max(1, max_samples if max_samples is not None else _env_int("PLATE_VOTE_MAX_SAMPLES", 5))
+        self.threshold = threshold if threshold is not None else _env_float("PLATE_VOTE_CONFIDENCE", 0.85)
+        min_samples = min_samples if min_samples is not None else _env_int("PLATE_VOTE_MIN_SAMPLES", 2)
+        self.min_samples = min(self.max_samples, max(1, min_samples))
+        self.validator = validator
+        self.samples = 0
+        self._reads: List[Tuple[str, float]] = []
+
+    def add(self, plate: Optional[str], score: float) -> None:
+        """Registra un intento de lectura; los fallos cuentan como muestra sin voto."""
+        self.samples += 1
+        if plate:
+            self._reads.append((plate, float(score or 0.0)))
+
+    def result(self) -> Tuple[Optional[str], float]:
+        if not self._reads:
+            return None, 0.0
+
+        # Longitud dominante (ponderada por score)
+        by_len: Dict[int, float] = defaultdict(float)
+        for text, score in self._reads:
+            by_len[len(text)] += score
+        length = max(by_len, key=by_len.get)
+        reads = [(t, s) for t, s in self._reads if len(t) == length]
+        total = sum(s for _, s in self._reads) or 1e-9
+
+        # Voto por posición
+        chars: List[str] = []
+        agreement = 1.0
+        for i in range(length):
+            votes: Dict[str, float] = defaultdict(float)
+            for text, score in reads:
+                votes[text[i]] += score
+            ch = max(votes, key=votes.get)
+            chars.append(ch)
+            agreement = min(agreement, votes[ch] / total)
+        consensus = "".join(chars)
+
+        if self.validator is not None and not self.validator(consensus):
+            # El consenso mezcló lecturas incompatibles: usar la cadena más votada
+            votes_str: Dict[str, float] = defaultdict(float)
+            for text, score in self._reads:
+                votes_str[text] += score
+            consensus = max(votes_str, key=votes_str.get)
+            agreement = votes_str[consensus] / total
+
+        support = [s for t, s in self._reads if t == consensus] or [s for _, s in reads]
+        confidence = agreement * (sum(support) / len(support))
+        return consensus, round(confidence, 4)
+
+    def decided(self) -> bool:
+        if self.samples >= self.max_samples:
+            return True
+        if len(self._reads) < self.min_samples:
+            return False
+        _, confidence = self.result()
+        return confidence >= self.threshold
@@ -0,0 +1,303 @@
+"""Runtime multiproceso para visión (``VISION_RUNTIME=process``).
+
+Cada cámara corre su ``Worker`` (YOLO, OCR, CLIP) en un proceso propio:
+
+- Los frames se publican en un ring de ``multiprocessing.shared_memory``;
+  el proceso de la API solo los lee para el overlay MJPEG.
+- Ingresos, cajas y contadores vuelven por una ``multiprocessing.Queue``.
+- ``ProcessWorker`` actúa de supervisor: drena eventos y reinicia el proceso
+  con backoff exponencial si muere.
+"""
+
+from __future__ import annotations
+
+import logging
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from dataclasses import asdict
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .detector import Box
+from .entry_store import EntryStore
+from .service import Entry, _DebugStream
+
+logger = logging.getLogger(__name__)
+
+ROI = Tuple[float, float, float, float]
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+class SharedFrameRing:
+    """Ring de frames BGR (uint8) en memoria compartida, un escritor y N lectores.
+
+    Cabecera int64: fila 0 = último seq publicado; fila 1+i = (seq, h, w) del slot i.
+    El escritor marca el slot con seq=-1 mientras copia; el lector verifica que
+    el seq no cambió tras copiar (seqlock) y reintenta si hubo carrera.
+    ``close`` y las lecturas del mismo proceso se excluyen con ``_lock``: un
+    stream MJPEG abierto nunca toca el segmento ya liberado.
+    """
+
+    def __init__(self, name: Optional[str] = None, slots: int = 3, max_h: int = 1080, max_w: int = 1920, create: bool = False):
+        self.slots = slots
+        self.max_h = max_h
+        self.max_w = max_w
+        header_bytes = (slots + 1) * 3 * 8
+        frame_bytes = max_h * max_w * 3
+        size = header_bytes + slots * frame_bytes
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=size if create else 0)
+        self.name = self.shm.name
+        self._lock = threading.Lock()
+        self.closed = False
+        self._header = np.ndarray((slots + 1, 3), dtype=np.int64, buffer=self.shm.buf[:header_bytes])
+        self._frames = np.ndarray((slots, max_h, max_w, 3), dtype=np.uint8, buffer=self.shm.buf[header_bytes:size])
+        if create:
+            self._header[:] = 0
+        self._seq = int(self._header[0, 0])
+
+    def write(self, frame: np.ndarray) -> None:
+        h, w = frame.shape[:2]
+        if h > self.max_h or w > self.max_w:
+            r = min(self.max_h / h, self.max_w / w)
+            frame = cv2.resize(frame, (max(1, int(w * r)), max(1, int(h * r))), interpolation=cv2.INTER_AREA)
+            h, w = frame.shape[:2]
+        self._seq += 1
+        slot = self._seq % self.slots
+        self._header[slot + 1, 0] = -1
+        self._frames[slot, :h, :w] = frame
+        self._header[slot + 1, 1:] = (h, w)
+        self._header[slot + 1, 0] = self._seq
+        self._header[0, 0] = self._seq
+
+    def read_latest(self) -> Optional[np.ndarray]:
+        with self._lock:
+            if self.closed:
+                return None
+            return self._read()
+
+    def _read(self) -> Optional[np.ndarray]:
+        for _ in range(3):
+            seq = int(self._header[0, 0])
+            if seq <= 0:
+                return None
+            slot = seq % self.slots
+            if int(self._header[slot + 1, 0]) != seq:
+                continue
+            h, w = (int(v) for v in self._header[slot + 1, 1:])
+            frame = self._frames[slot, :h, :w].copy()
+            if int(self._header[slot + 1, 0]) == seq:
+                return frame
+        return None
+
+    def close(self, unlink: bool = False) -> None:
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            # liberar vistas antes de cerrar el segmento
+            self._header = None  # type: ignore[assignment]
+            self._frames = None  # type: ignore[assignment]
+        try:
+            self.shm.close()
+            if unlink:
+                self.shm.unlink()
+        except Exception:
+            pass
+
+
+def _camera_main(url: str, rois: List[ROI], shm_name: str, shm_shape: Tuple[int, int, int], events: Any, ctrl: Any) -> None:
+    """Punto de entrada del proceso hijo: corre un Worker y publica resultados."""
+    from .ocr_pool import shared_pool
+    from .plate_lookup import PlateMatcher
+    from .service import Worker, warm_models
+
+    slots, max_h, max_w = shm_shape
+    ring = SharedFrameRing(shm_name, slots=slots, max_h=max_h, max_w=max_w)
+    # una cámara por proceso: su pool OCR se dimensiona aparte (OCR_PROCESS_WORKERS, default 1)
+    matcher = PlateMatcher(ocr_pool=shared_pool(_env_int("OCR_PROCESS_WORKERS", 1)))
+    worker = Worker(url, rois, matcher, store=EntryStore(max_entries=1))
+    last_boxes: Dict[str, Any] = {"ref": None, "stats_ts": 0.0, "dropped_entries": 0}
+
+    def on_entry(entry: Entry, box: Box) -> None:
+        # un ingreso vale más que una caja: se espera un poco, pero nunca se bloquea
+        # el bucle de la cámara si el supervisor dejó de drenar la cola
+        try:
+            events.put(("entry", asdict(entry), (int(box.x), int(box.y), int(box.w), int(box.h))), timeout=1.0)
+        except queue.Full:
+            last_boxes["dropped_entries"] += 1
+
+    def publish(msg: tuple) -> None:
+        # cajas y contadores son descartables si el supervisor va atrasado
+        try:
+            events.put_nowait(msg)
+        except queue.Full:
+            pass
+
+    def on_frame(frame, boxes: List[Box]) -> None:
+        ring.write(frame)
+        if boxes is not last_boxes["ref"]:
+            last_boxes["ref"] = boxes
+            publish(("boxes", [(int(b.x), int(b.y), int(b.w), int(b.h), float(b.conf), int(b.cls)) for b in boxes]))
+        now = time.time()
+        if now - last_boxes["stats_ts"] > 2.0:
+            last_boxes["stats_ts"] = now
+            matcher = worker.plate_matcher
+            publish(("stats", worker.frames_seen, worker.detect_runs, {
+                "ocr": matcher.ocr_pool.stats(),
+                "plate_cache": matcher.cache.stats(),
+                "dropped_entries": last_boxes["dropped_entries"],
+            }))
+
+    def warm() -> None:
+        publish(("warmup", warm_models(worker.plate_matcher.ocr_pool, [worker.det])))
+
+    def control() -> None:
+        while True:
+            msg = ctrl.get()
+            if msg[0] == "warmup":
+                threading.Thread(target=warm, name="vision-warmup", daemon=True).start()
+            elif msg[0] == "rois":
+                worker.set_rois([tuple(r) for r in msg[1]])
+            elif msg[0] == "stop":
+                worker.stop()
+                return
+
+    worker.on_entry = on_entry
+    worker.on_frame = on_frame
+    threading.Thread(target=control, daemon=True).start()
+    if os.getenv("VISION_WARMUP", "false").lower() == "true":
+        threading.Thread(target=warm, name="vision-warmup", daemon=True).start()
+    try:
+        worker.run()
+    finally:
+        ring.close()
+
+
+class ProcessWorker(_DebugStream):
+    """Proxy en el proceso de la API para un Worker que corre en otro proceso.
+
+    Expone la misma interfaz que ``Worker`` (``entries``, ``rois``,
+    ``debug_jpeg_iter``, ``set_rois``, ``stop``) y supervisa el proceso hijo.
+    OCR y caché de matrículas viven en el hijo: ``child_stats`` guarda su último
+    reporte (cada ~2 s) y ``warmup_timings`` el del último ``warmup()``.
+    """
+
+    def __init__(self, url: str, rois: Optional[List[ROI]] = None, store: Optional[EntryStore] = None):
+        self.url = url
+        self.rois = rois or []
+        self.entries = store if store is not None else EntryStore()
+        self._boxes: List[Box] = []
+        self._recent: List[Dict] = []
+        self._stop = False
+        self.frames_seen = 0
+        self.detect_runs = 0
+        self.restarts = 0
+        self.child_stats: Dict[str, Any] = {}
+        self.warmup_timings: Optional[Dict[str, Any]] = None
+        self._ctx = mp.get_context("spawn")
+        shape = (_env_int("VISION_SHM_SLOTS", 3), _env_int("VISION_SHM_MAX_H", 1080), _env_int("VISION_SHM_MAX_W", 1920))
+        self._shm_shape = shape
+        self._ring = SharedFrameRing(slots=shape[0], max_h=shape[1], max_w=shape[2], create=True)
+        self._events = self._ctx.Queue(maxsize=1000)
+        self._ctrl = None
+        self._proc = None
+        self._supervisor: Optional[threading.Thread] = None
+
+    def _spawn(self) -> None:
+        self._ctrl = self._ctx.Queue()
+        self._proc = self._ctx.Process(
+            target=_camera_main,
+            args=(self.url, list(self.rois), self._ring.name, self._shm_shape, self._events, self._ctrl),
+            name=f"vision-camera-{self.restarts}",
+            daemon=True,
+        )
+        self._proc.start()
+        self._spawned_at = time.time()
+
+    def start(self) -> None:
+        self._spawn()
+        self._supervisor = threading.Thread(target=self._supervise, name="vision-supervisor", daemon=True)
+        self._supervisor.start()
+
+    def _supervise(self) -> None:
+        backoff = 1.0
+        while not self._stop:
+            try:
+                msg = self._events.get(timeout=0.5)
+                self._handle(msg)
+            except queue.Empty:
+                pass
+            except Exception as e:
+                logger.debug("Evento de visión inválido: %s", e)
+            proc = self._proc
+            if proc is not None and not proc.is_alive() and not self._stop:
+                if time.time() - self._spawned_at > 60:
+                    backoff = 1.0
+                logger.warning("Proceso de cámara terminó (exit=%s); reinicio en %.0fs", proc.exitcode, backoff)
+                time.sleep(backoff)
+                backoff = min(30.0, backoff * 2)
+                if not self._stop:
+                    self.restarts += 1
+                    self._spawn()
+
+    def _handle(self, msg: tuple) -> None:
+        kind = msg[0]
+        if kind == "entry":
+            entry = Entry(**msg[1])
+            self.entries.append(entry)
+            x, y, w, h = msg[2]
+            self._recent.append({"x": x, "y": y, "w": w, "h": h, "cat": entry.category, "ts": time.time()})
+        elif kind == "boxes":
+            self._boxes = [Box(*b) for b in msg[1]]
+        elif kind == "stats":
+            self.frames_seen, self.detect_runs = msg[1], msg[2]
+            if len(msg) > 3:
+                self.child_stats = msg[3]
+        elif kind == "warmup":
+            self.warmup_timings = msg[1]
+
+    def _current_frame(self):
+        return self._ring.read_latest()
+
+    def set_rois(self, rois: List[ROI]) -> None:
+        self.rois = rois
+        if self._ctrl is not None:
+            self._ctrl.put(("rois", list(rois)))
+
+    def warmup(self) -> None:
+        """Pide al proceso hijo que cargue sus modelos; el resultado llega como evento."""
+        if self._ctrl is not None:
+            self._ctrl.put(("warmup",))
+
+    def stop(self) -> None:
+        """Pide la parada y espera al hijo en segundo plano (no bloquea la petición)."""
+        self._stop = True
+        if self._ctrl is not None:
+            try:
+                self._ctrl.put(("stop",))
+            except Exception:
+                pass
+        threading.Thread(target=self._shutdown, name="vision-shutdown", daemon=True).start()
+
+    def _shutdown(self) -> None:
+        proc = self._proc
+        if proc is not None:
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
+                proc.join(timeout=2)
+        if self._supervisor is not None:
+            self._supervisor.join(timeout=2)
+        self._ring.close(unlink=True)
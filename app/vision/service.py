@@ -1,15 +1,18 @@
 from __future__ import annotations
 
+import heapq
 import os
 import time
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Tuple
+from itertools import islice
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import cv2
 
-from .detector import VehicleDetector, Box
+from .detector import VehicleDetector, Box, MotionGate
 from .classifier import classifier
 from .plate_lookup import PlateMatcher, PlateMatch
+from .entry_store import EntryStore, EntryWriter
 
 
 @dataclass
@@ -24,23 +27,11 @@ class Entry:
     origin: str = "ai"
 
 
-class Worker:
-    def __init__(self, url: str, rois: Optional[List[Tuple[float,float,float,float]]] = None, plate_matcher: Optional[PlateMatcher] = None):
-        self.url = url
-        self.rois = rois or []  # normalized (x0,y0,x1,y1)
-        self.det = VehicleDetector()
-        self._stop = False
-        self.entries: List[Entry] = []
-        self._last_frame = None
-        self._boxes: List[Box] = []
-        self.plate_matcher = plate_matcher
-        # one state per ROI
-        self._states: List[Dict[str, float | bool]] = [
-            {"counted": False, "last_free": time.time()} for _ in self.rois
-        ]
-        self._min_iou = 0.12  # exigir solape mínimo con la ROI
-        self._detect_every = int(os.getenv("DETECT_EVERY", "1"))
-        self._recent: List[Dict] = []  # para overlay: cajas de ingresos recientes
+class _DebugStream:
+    """Overlay MJPEG compartido por el worker en hilo y el proxy multiproceso.
+
+    Requiere ``_stop``, ``rois``, ``_boxes``, ``_recent`` y ``_current_frame()``.
+    """
 
     @staticmethod
     def _iou(ax, ay, aw, ah, bx, by, bw, bh) -> float:
@@ -56,9 +47,87 @@ class Worker:
         area_b = bw*bh
         return inter / max(1.0, (area_a + area_b - inter))
 
+    def _current_frame(self):
+        return self._last_frame
+
+    def debug_jpeg_iter(self, maxw=960, q=90):
+        while not self._stop:
+            frame = self._current_frame()
+            if frame is None:
+                time.sleep(0.05); continue
+            h, w = frame.shape[:2]
+            draw = frame.copy()
+            # Dibujar ROIs para validar zonas
+            for r in self.rois:
+                x0=int(r[0]*w); y0=int(r[1]*h); x1=int(r[2]*w); y1=int(r[3]*h)
+                cv2.rectangle(draw, (x0,y0), (x1,y1), (0,165,255), 2)
+            # Dibujar detecciones actuales finas que están dentro de alguna ROI
+            for b in self._boxes:
+                show = False
+                for r in self.rois:
+                    x0=int(r[0]*w); y0=int(r[1]*h); x1=int(r[2]*w); y1=int(r[3]*h)
+                    rw, rh = max(1, x1-x0), max(1, y1-y0)
+                    if self._iou(x0,y0,rw,rh,b.x,b.y,b.w,b.h) >= 0.02:
+                        show = True; break
+                if show:
+                    cv2.rectangle(draw, (b.x,b.y), (b.x+b.w,b.y+b.h), (0,200,0), 1)
+            # Dibujar solo cuadros de ingresos recientes
+            now = time.time()
+            # mantener visibles 10s
+            self._recent = [it for it in self._recent if (now - it["ts"]) < 10]
+            for it in self._recent:
+                color = (60,255,120) if it["cat"] == "EV" else ((0,255,255) if it["cat"] == "PHEV" else (255,215,0))
+                cv2.rectangle(draw, (int(it["x"]), int(it["y"])), (int(it["x"]+it["w"]), int(it["y"]+it["h"])), color, 3)
+            if maxw and w>maxw:
+                nh = int(h*(maxw/w)); draw = cv2.resize(draw, (maxw, nh))
+            ok, jpg = cv2.imencode('.jpg', draw, [int(cv2.IMWRITE_JPEG_QUALITY), int(q)])
+            if ok:
+                b = jpg.tobytes()
+                yield b"--frame\r\nContent-Type: image/jpeg\r\n\r\n"+b+b"\r\n"
+            time.sleep(0.06)
+
+
+class Worker(_DebugStream):
+    def __init__(self, url: str, rois: Optional[List[Tuple[float,float,float,float]]] = None, plate_matcher: Optional[PlateMatcher] = None, store: Optional[EntryStore] = None):
+        self.url = url
+        self.rois = rois or []  # normalized (x0,y0,x1,y1)
+        self.det = VehicleDetector()
+        self._stop = False
+        self.entries = store if store is not None else EntryStore()
+        self._last_frame = None
+        self._boxes: List[Box] = []
+        self.plate_matcher = plate_matcher
+        # one state per ROI
+        self._states: List[Dict[str, Any]] = [
+            {"counted": False, "last_free": time.time()} for _ in self.rois
+        ]
+        self._min_iou = 0.12  # exigir solape mínimo con la ROI
+        # Detección adaptativa: cada DETECT_EVERY frames con actividad y cada
+        # DETECT_IDLE_EVERY frames (keepalive) tras DETECT_IDLE_AFTER s sin movimiento.
+        self._detect_every = int(os.getenv("DETECT_EVERY", "1"))
+        self._idle_every = int(os.getenv("DETECT_IDLE_EVERY", "25"))
+        self._idle_after = float(os.getenv("DETECT_IDLE_AFTER", "3"))
+        self._gate = MotionGate() if os.getenv("MOTION_GATE", "true").lower() == "true" else None
+        self._last_active = 0.0
+        self.detect_runs = 0
+        self.frames_seen = 0
+        self._recent: List[Dict] = []  # para overlay: cajas de ingresos recientes
+        # Hooks opcionales (runtime multiproceso): on_entry(entry, box), on_frame(frame, boxes)
+        self.on_entry: Optional[Callable[[Entry, Box], None]] = None
+        self.on_frame: Optional[Callable[[Any, List[Box]], None]] = None
+
     def stop(self):
         self._stop = True
 
+    def set_rois(self, rois: List[Tuple[float,float,float,float]]) -> None:
+        self.rois = rois
+        self._states = [{"counted": False, "last_free": time.time()} for _ in rois]
+
+    def _record(self, entry: Entry, box: Box) -> None:
+        self.entries.append(entry)
+        if self.on_entry is not None:
+            self.on_entry(entry, box)
+
     def run(self):
         # RTSP options for stability
         if os.getenv("OPENCV_FFMPEG_CAPTURE_OPTIONS") is None:
@@ -69,7 +138,7 @@ class Worker:
         cap = cv2.VideoCapture(self.url, cv2.CAP_FFMPEG)
         cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
         bad = 0
-        frame_index = 0
+        since_detect = None
         while not self._stop:
             ok, frame = cap.read()
             if not ok or frame is None:
@@ -81,14 +150,18 @@ class Worker:
                 continue
             bad = 0
             h, w = frame.shape[:2]
-            # Ejecutar el detector cada N frames para ganar FPS
-            if frame_index % max(1, self._detect_every) == 0:
+            now = time.time()
+            self.frames_seen += 1
+            # Ejecutar el detector solo cuando la escena cambia o hay un vehículo pendiente
+            interval = self._detect_interval(frame, now)
+            if since_detect is None or since_detect + 1 >= interval:
                 boxes = self.det.detect(frame)
                 self._boxes = boxes
+                self.detect_runs += 1
+                since_detect = 0
             else:
                 boxes = self._boxes
-            frame_index += 1
-            now = time.time()
+                since_detect += 1
             # For each ROI, check occupancy independently
             if self.rois:
                 for i, r in enumerate(self.rois):
@@ -111,9 +184,9 @@ class Worker:
                     state = self._states[i]
                     counted = bool(state.get("counted", False))
                     if best is not None and not counted:
-                        entry = self._build_entry(frame, best, now)
+                        entry = self._vote_entry(state, frame, best, now)
                         if entry is not None:
-                            self.entries.append(entry)
+                            self._record(entry, best)
                             state["counted"] = True
                             # guardar para overlay solo cuando hubo ingreso
                             self._recent.append({
@@ -124,6 +197,9 @@ class Worker:
                         # reset after a while to allow a new entry later
                         if now - float(state.get("last_free", now)) > 5:
                             state["counted"] = False
+                            state.pop("voter", None)
+                            state.pop("crop", None)
+                            state.pop("crop_score", None)
                         state["last_free"] = now
             else:
                 # No ROI ⇒ treat as a single zone
@@ -131,13 +207,28 @@ class Worker:
                 if best is not None:
                     entry = self._build_entry(frame, best, now)
                     if entry is not None:
-                        self.entries.append(entry)
+                        self._record(entry, best)
 
             self._last_frame = frame
+            if self.on_frame is not None:
+                self.on_frame(frame, boxes)
             # self._boxes ya se actualiza cuando corre el detector
         cap.release()
 
-    def _build_entry(self, frame, box: Box, ts: float) -> Optional[Entry]:
+    def _detect_interval(self, frame, now: float) -> int:
+        """Frames entre detecciones: alta frecuencia con movimiento o votos en curso, keepalive si no."""
+        fast = max(1, self._detect_every)
+        if self._gate is None:
+            return fast
+        if self._gate.update(frame):
+            self._last_active = now
+        pending = any(st.get("voter") is not None for st in self._states)
+        if pending or now - self._last_active < self._idle_after:
+            return fast
+        return max(fast, self._idle_every)
+
+    @staticmethod
+    def _crop(frame, box: Box):
         h, w = frame.shape[:2]
         margin_x = int(box.w * 0.1)
         margin_y = int(box.h * 0.1)
@@ -146,9 +237,11 @@ class Worker:
         x1 = min(w, box.x + box.w + margin_x)
         y1 = min(h, box.y + box.h + margin_y)
         if x1 <= x0 or y1 <= y0:
-            crop = frame[max(0, y0-5):min(h, y1+5), max(0, x0-5):min(w, x1+5)]
-        else:
-            crop = frame[y0:y1, x0:x1]
+            return frame[max(0, y0-5):min(h, y1+5), max(0, x0-5):min(w, x1+5)]
+        return frame[y0:y1, x0:x1]
+
+    def _build_entry(self, frame, box: Box, ts: float) -> Optional[Entry]:
+        crop = self._crop(frame, box)
 
         plate_match: Optional[PlateMatch] = None
         if self.plate_matcher is not None:
@@ -157,6 +250,46 @@ class Worker:
             except Exception:
                 plate_match = None
 
+        return self._entry_from_match(crop, plate_match, ts)
+
+    def _vote_entry(self, state: Dict[str, Any], frame, box: Box, ts: float) -> Optional[Entry]:
+        """Acumula lecturas de la matrícula del vehículo en la ROI hasta decidir.
+
+        Devuelve la entrada cuando el consenso supera el umbral o se agotan las
+        muestras; si ninguna lectura fue válida, la ROI se marca como contada
+        para no seguir gastando OCR hasta que el vehículo salga.
+        """
+        if self.plate_matcher is None:
+            return None
+        crop = self._crop(frame, box)
+        voter = state.get("voter")
+        if voter is None:
+            voter = self.plate_matcher.new_voter()
+            state["voter"] = voter
+        try:
+            plate, score = self.plate_matcher.read_plate(crop)
+        except Exception:
+            plate, score = None, 0.0
+        voter.add(plate, score)
+        if plate and score >= float(state.get("crop_score", -1.0)):
+            state["crop"], state["crop_score"] = crop, score
+        if not voter.decided():
+            return None
+
+        best_crop = state.pop("crop", None)
+        state.pop("crop_score", None)
+        state.pop("voter", None)
+        plate, confidence = voter.result()
+        if not plate:
+            state["counted"] = True
+            return None
+        try:
+            plate_match = self.plate_matcher.resolve(plate, confidence)
+        except Exception:
+            plate_match = None
+        return self._entry_from_match(best_crop if best_crop is not None else crop, plate_match, ts)
+
+    def _entry_from_match(self, crop, plate_match: Optional[PlateMatch], ts: float) -> Optional[Entry]:
         if plate_match is None:
             return None
 
@@ -176,7 +309,7 @@ class Worker:
         def ensure_cls():
             nonlocal cls, used_ai
             if cls is None:
-                cls = classifier.classify(crop)
+                cls = classifier.classify(crop, key=plate)
                 used_ai = True
             return cls
 
@@ -205,52 +338,32 @@ class Worker:
 
         return Entry(ts, self.url, brand, model, category, score, plate=plate, origin=origin)
 
-    def debug_jpeg_iter(self, maxw=960, q=90):
-        while not self._stop:
-            frame = self._last_frame
-            if frame is None:
-                time.sleep(0.05); continue
-            h, w = frame.shape[:2]
-            draw = frame.copy()
-            # Dibujar ROIs para validar zonas
-            for r in self.rois:
-                x0=int(r[0]*w); y0=int(r[1]*h); x1=int(r[2]*w); y1=int(r[3]*h)
-                cv2.rectangle(draw, (x0,y0), (x1,y1), (0,165,255), 2)
-            # Dibujar detecciones actuales finas que están dentro de alguna ROI
-            for b in self._boxes:
-                show = False
-                for r in self.rois:
-                    x0=int(r[0]*w); y0=int(r[1]*h); x1=int(r[2]*w); y1=int(r[3]*h)
-                    rw, rh = max(1, x1-x0), max(1, y1-y0)
-                    if self._iou(x0,y0,rw,rh,b.x,b.y,b.w,b.h) >= 0.02:
-                        show = True; break
-                if show:
-                    cv2.rectangle(draw, (b.x,b.y), (b.x+b.w,b.y+b.h), (0,200,0), 1)
-            # Dibujar solo cuadros de ingresos recientes
-            now = time.time()
-            # mantener visibles 10s
-            self._recent = [it for it in self._recent if (now - it["ts"]) < 10]
-            for it in self._recent:
-                color = (60,255,120) if it["cat"] == "EV" else ((0,255,255) if it["cat"] == "PHEV" else (255,215,0))
-                cv2.rectangle(draw, (int(it["x"]), int(it["y"])), (int(it["x"]+it["w"]), int(it["y"]+it["h"])), color, 3)
-            if maxw and w>maxw:
-                nh = int(h*(maxw/w)); draw = cv2.resize(draw, (maxw, nh))
-            ok, jpg = cv2.imencode('.jpg', draw, [int(cv2.IMWRITE_JPEG_QUALITY), int(q)])
-            if ok:
-                b = jpg.tobytes()
-                yield b"--frame\r\nContent-Type: image/jpeg\r\n\r\n"+b+b"\r\n"
-            time.sleep(0.06)
-
 
 class VisionService:
+    """Orquesta las cámaras activas.
+
+    Con ``VISION_RUNTIME=process`` cada cámara corre en su propio proceso
+    (ver ``runtime.ProcessWorker``) y este servicio solo supervisa; por
+    defecto (``thread``) los workers son hilos del proceso de la API.
+    """
+
     def __init__(self):
-        self.workers: Dict[str, Worker] = {}
+        self.workers: Dict[str, Any] = {}
         self.plate_matcher = PlateMatcher()
+        self.writer = EntryWriter()
+        self.runtime = os.getenv("VISION_RUNTIME", "thread").strip().lower()
 
     def start(self, url: str, rois: List[Tuple[float,float,float,float]] | None = None):
         if url in self.workers:
             return
-        w = Worker(url, rois, self.plate_matcher)
+        store = EntryStore(writer=self.writer)
+        if self.runtime == "process":
+            from .runtime import ProcessWorker
+            pw = ProcessWorker(url, rois, store=store)
+            self.workers[url] = pw
+            pw.start()
+            return
+        w = Worker(url, rois, self.plate_matcher, store=store)
         self.workers[url] = w
         import threading
         t = threading.Thread(target=w.run, daemon=True)
@@ -260,28 +373,76 @@ class VisionService:
         w = self.workers.get(url)
         if not w:
             return False
-        w.rois = rois
-        w._states = [{"counted": False, "last_free": time.time()} for _ in rois]
+        w.set_rois(rois)
         return True
 
     def stop(self, url: str):
         w = self.workers.pop(url, None)
         if w: w.stop()
 
-    def entries(self, since: float) -> List[Entry]:
-        out: List[Entry] = []
-        for w in self.workers.values():
-            out.extend([e for e in w.entries if e.ts>=since])
-        return sorted(out, key=lambda e: e.ts, reverse=True)
+    def entries(self, since: float, limit: Optional[int] = None) -> List[Entry]:
+        per_worker = [w.entries.since(since, limit) for w in list(self.workers.values())]
+        merged = heapq.merge(*per_worker, key=lambda e: e.ts, reverse=True)
+        return list(islice(merged, limit)) if limit is not None else list(merged)
 
     def summary(self, window: int = 600) -> dict:
-        import time
         since = time.time()-window
-        items = self.entries(since)
-        total = len(items)
-        ev = sum(1 for e in items if e.category=="EV")
-        phev = sum(1 for e in items if e.category=="PHEV")
+        total = ev = phev = 0
+        for w in list(self.workers.values()):
+            t, e, p = w.entries.counts(since)
+            total += t; ev += e; phev += p
         return {"window_sec": window, "total": total, "ev": ev, "phev": phev, "indeterminado": total-ev-phev}
 
+    def _matcher_stats(self, key: str, local) -> dict:
+        """En modo proceso OCR y caché viven en cada hijo: último reporte por cámara."""
+        if self.runtime != "process":
+            return local()
+        return {
+            "runtime": "process",
+            "cameras": {url: getattr(w, "child_stats", {}).get(key) for url, w in list(self.workers.items())},
+        }
+
+    def ocr_stats(self) -> dict:
+        return self._matcher_stats("ocr", self.plate_matcher.ocr_pool.stats)
+
+    def plate_cache_stats(self) -> dict:
+        return self._matcher_stats("plate_cache", self.plate_matcher.cache.stats)
+
+    def warmup(self) -> dict:
+        """Carga OCR, CLIP y los detectores YOLO de los workers; devuelve segundos por modelo.
+
+        En modo proceso los modelos viven en cada proceso de cámara: se les pide
+        que se precarguen y aquí solo se devuelve su último reporte.
+        """
+        if self.runtime == "process":
+            workers = list(self.workers.items())
+            for _, w in workers:
+                w.warmup()
+            return {
+                "runtime": "process",
+                "requested": [url for url, _ in workers],
+                "cameras": {url: w.warmup_timings for url, w in workers},
+            }
+        # Cada worker tiene su detector (torch no se comparte entre hilos). Sin cámaras
+        # activas se carga uno suelto: deja la sesión ONNX compartida lista y los pesos
+        # torch descargados para los workers que arranquen después.
+        detectors = [w.det for w in list(self.workers.values())]
+        return warm_models(self.plate_matcher.ocr_pool, detectors or [VehicleDetector()])
+
+
+def warm_models(ocr_pool, detectors: List[VehicleDetector]) -> dict:
+    """Carga OCR, CLIP y YOLO del proceso actual; segundos y disponibilidad por modelo."""
+    timings: Dict[str, Any] = {}
+    steps = (
+        ("ocr", ocr_pool.wait_ready),
+        ("clip", classifier.load),
+        ("yolo", lambda: all([d.load() for d in detectors])),
+    )
+    for name, load in steps:
+        t0 = time.perf_counter()
+        ready = load()
+        timings[name] = {"ready": ready, "seconds": round(time.perf_counter() - t0, 3)}
+    return timings
+
 
 vision_service = VisionService()
@@ -1,7 +1,7 @@
 document.addEventListener('DOMContentLoaded', () => {
   bootstrapAuth();
   const params = new URLSearchParams(window.location.search);
-  const currentStation = params.get('station') || 'all';
+  const currentStation = normalizeStation(params.get('station'));
   const filterSelect = document.getElementById('filterSelect');
   const filtersToggle = document.getElementById('filtersToggle');
   const filtersDrawer = document.getElementById('filtersDrawer');
@@ -39,11 +39,10 @@ async function bootstrapAuth(){
 
 async function loadSustainability(station, filter){
   try{
-    // Summary
-    const params = new URLSearchParams({ station, filter });
-    const summaryRes = await fetch(`/api/stats/energy/summary?${params.toString()}`);
-    if (summaryRes.ok){
-      const s = await summaryRes.json();
+    // Summary (todas las estaciones × filtros en una sola llamada)
+    const summaries = await loadSummaries();
+    const s = summaries && (summaries.stations[station] || {})[filter];
+    if (s){
       setText('totalKWh', s.energy_kWh ?? 0);
       setText('co2Red', s.co2_grid_kg ?? 0);
       setText('co2ICE', s.co2_ice_equiv_kg ?? 0);
@@ -74,6 +73,25 @@ async function loadSustainability(station, filter){
   }catch(e){ console.warn('Error cargando sostenibilidad', e); }
 }
 
+// Alias de "todas" que acepta el servidor; /energy/summary/all los devuelve bajo 'all'
+const ALL_STATION_ALIASES = ['all', 'todas', 'todas las estaciones'];
+function normalizeStation(station){
+  if (!station || ALL_STATION_ALIASES.includes(station.trim().toLowerCase())) return 'all';
+  return station;
+}
+
+// Cache del lote de resúmenes: el cambio de filtro no vuelve a pedirlo
+let __summaries = null;
+let __summariesAt = 0;
+async function loadSummaries(){
+  if (__summaries && Date.now() - __summariesAt < 55000) return __summaries;
+  const res = await fetch('/api/stats/energy/summary/all');
+  if (!res.ok) return __summaries;
+  __summaries = await res.json();
+  __summariesAt = Date.now();
+  return __summaries;
+}
+
 function setText(id, val){ const el = document.getElementById(id); if (el) el.textContent = val; }
 
 function drawEnergySeries(series, period){
@@ -0,0 +1,85 @@
+"""/drivers/loyalty: el filtro de sesiones (dict) y el alcance de user_first_seen
+(None | nombre) son cosas distintas; mezclarlos rompía cualquier consulta con rango.
+
+app.database.database conecta con Atlas al importarse, así que se sustituyen sus
+dependencias en sys.modules y se carga app/api/drivers.py directamente.
+"""
+import importlib.util
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+DRIVERS = Path(__file__).resolve().parents[1] / "app" / "api" / "drivers.py"
+
+
+@pytest.fixture
+def loyalty(monkeypatch):
+    calls = {"aggregate": [], "new_users": []}
+
+    database = types.ModuleType("app.database.database")
+
+    def aggregate_sessions(match, stages):
+        calls["aggregate"].append(match)
+        return iter([{"n": 7}])
+
+    database.aggregate_sessions = aggregate_sessions
+
+    registry = types.ModuleType("app.services.station_registry")
+    registry.is_all = lambda s: not s or s.lower() in ("all", "todas", "todas las estaciones")
+    registry.session_match = lambda s: (
+        {"station": {"$in": ["Portobelo", "Salvio"]}} if registry.is_all(s)
+        else {"station": s} if s in ("Portobelo", "Salvio") else None
+    )
+
+    first_seen = types.ModuleType("app.services.first_seen")
+
+    def count_new_users(station, start, end):
+        calls["new_users"].append(station)
+        return 3
+
+    first_seen.count_new_users = count_new_users
+    first_seen.cohort_retention = lambda station, months: []
+
+    services = types.ModuleType("app.services")
+    services.station_registry = registry
+    monkeypatch.setitem(sys.modules, "app.database.database", database)
+    monkeypatch.setitem(sys.modules, "app.services", services)
+    monkeypatch.setitem(sys.modules, "app.services.station_registry", registry)
+    monkeypatch.setitem(sys.modules, "app.services.first_seen", first_seen)
+
+    spec = importlib.util.spec_from_file_location("_drivers_under_test", DRIVERS)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.drivers_loyalty, calls
+
+
+@pytest.mark.parametrize("filter", ["mes", "diario"])
+def test_loyalty_all_stations_with_range(loyalty, filter):
+    drivers_loyalty, calls = loyalty
+    assert drivers_loyalty("all", filter) == {"nuevos": 3, "recurrentes": 4}
+    assert calls["new_users"] == [None]
+    match = calls["aggregate"][0]
+    assert match["station"] == {"$in": ["Portobelo", "Salvio"]}
+    assert set(match["session_start_at"]) == {"$gte", "$lt"}
+
+
+def test_loyalty_single_station(loyalty):
+    drivers_loyalty, calls = loyalty
+    assert drivers_loyalty("Salvio", "mes") == {"nuevos": 3, "recurrentes": 4}
+    assert calls["new_users"] == ["Salvio"]
+    assert calls["aggregate"][0]["station"] == "Salvio"
+
+
+def test_loyalty_total_has_no_recurrentes(loyalty):
+    drivers_loyalty, calls = loyalty
+    assert drivers_loyalty("Portobelo", "total") == {"nuevos": 3, "recurrentes": 0}
+    assert calls["new_users"] == ["Portobelo"]
+    assert calls["aggregate"] == []
+
+
+def test_loyalty_unknown_station(loyalty):
+    drivers_loyalty, calls = loyalty
+    assert drivers_loyalty("Nope", "mes") == {"nuevos": 0, "recurrentes": 0}
+    assert calls == {"aggregate": [], "new_users": []}
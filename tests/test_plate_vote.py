@@ -0,0 +1,59 @@
+"""PlateVoter: el corte anticipado exige ``min_samples`` lecturas (una sola no es consenso).
+
+Se carga app/vision/plate_vote.py directamente: el paquete app.vision importa
+la API y los modelos de visión.
+"""
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+_spec = importlib.util.spec_from_file_location(
+    "_plate_vote_under_test", Path(__file__).resolve().parents[1] / "app" / "vision" / "plate_vote.py"
+)
+plate_vote = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(plate_vote)
+PlateVoter = plate_vote.PlateVoter
+
+
+def test_single_high_score_read_does_not_decide():
+    voter = PlateVoter(max_samples=5, threshold=0.85)
+    voter.add("ABC123", 0.99)
+    assert voter.result() == ("ABC123", 0.99)
+    assert not voter.decided()
+
+
+def test_two_agreeing_reads_decide():
+    voter = PlateVoter(max_samples=5, threshold=0.85)
+    voter.add("ABC123", 0.95)
+    voter.add("ABC123", 0.93)
+    assert voter.decided()
+
+
+def test_failed_reads_do_not_count_towards_min_samples():
+    voter = PlateVoter(max_samples=5, threshold=0.85)
+    voter.add("ABC123", 0.99)
+    voter.add(None, 0.0)
+    assert not voter.decided()
+
+
+def test_max_samples_still_ends_the_vote():
+    voter = PlateVoter(max_samples=2, threshold=0.85, min_samples=3)
+    voter.add("ABC123", 0.99)
+    assert voter.min_samples == 2
+    assert not voter.decided()
+    voter.add(None, 0.0)
+    assert voter.decided()
+
+
+def test_min_samples_from_env(monkeypatch):
+    monkeypatch.setenv("PLATE_VOTE_MIN_SAMPLES", "1")
+    voter = PlateVoter(max_samples=5, threshold=0.85)
+    voter.add("ABC123", 0.99)
+    assert voter.decided()
+
+
+@pytest.mark.parametrize("value", ["0", "-3", "x"])
+def test_min_samples_env_is_clamped(monkeypatch, value):
+    monkeypatch.setenv("PLATE_VOTE_MIN_SAMPLES", value)
+    assert PlateVoter(max_samples=5).min_samples >= 1